@@ -0,0 +1,57 @@
+"""
+Peak RSS of myemail.send_email against attachment size, with and without stream mode.
+
+Each send runs in its own process (so that peak RSS isn't shared) against a local stand-in SMTP server.
+"""
+
+import sys, os, subprocess, tempfile
+
+import common
+
+from myPyApps import myconfig, mylogging
+from myPyApps.helpers import myemail
+from myPyApps.tests import smtpserver
+
+
+def child(filename, port, stream):
+    """
+    Send filename as attachment and print peak RSS in KB
+    """
+    config = myconfig.MyConfigParser('logging')
+    config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject')" % port)
+    mylogging.MyLogger.default_config = config
+    myemail.send_email("to@abc", "subject", text_body="report", attachements=[filename], stream=stream)
+    print(common.max_rss())
+
+
+def measure(filename, port, stream):
+    output = subprocess.check_output([sys.executable, __file__, "--child", filename, str(port), str(int(stream))], 
+                                     stderr=subprocess.DEVNULL)
+    return int(output.split()[-1])
+
+
+def run(quick=False):
+    sizes = quick and [1, 8] or [1, 16, 64, 256]
+    server = smtpserver.SMTPServer(keep=False).start()
+    results = {}
+    try:
+        for size in sizes:
+            with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as fp:
+                block = os.urandom(1024 * 1024)
+                for _ in range(size):
+                    fp.write(block)
+            try:
+                results["%d MB attachment, peak RSS KB (as_string)" % size] = measure(fp.name, server.port, False)
+                results["%d MB attachment, peak RSS KB (stream)" % size] = measure(fp.name, server.port, True)
+            finally:
+                os.remove(fp.name)
+    finally:
+        server.stop()
+    return results
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], int(sys.argv[3]), bool(int(sys.argv[4])))
+    else:
+        common.main(run, "attachment memory")
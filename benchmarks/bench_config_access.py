@@ -0,0 +1,69 @@
+"""
+Configuration value lookups: plain ConfigParser against MyConfigParser typed values cache and frozen snapshot.
+"""
+
+import shutil, tempfile
+from configparser import ConfigParser
+from os.path import join
+
+import common
+
+from myPyApps import myconfig
+
+
+def run(quick=False):
+    number = quick and 10000 or 200000
+    config_dir = tempfile.mkdtemp()
+    try:
+        with open(join(config_dir, 'bench.default'), 'w') as fp:
+            fp.write("[DEFAULT]\nroot = /var/data\n[section]\n")
+            for i in range(50):
+                fp.write("path_%d = %%(root)s/%d\nsize_%d = %d\n" % (i, i, i, i))
+        
+        plain = ConfigParser()
+        plain.read(join(config_dir, 'bench.default'))
+        config = myconfig.MyConfigParser('bench', config_dir)
+        snapshot = config.snapshot()
+        section = snapshot.section
+        
+        def lookups(get, getint):
+            def loop():
+                for _ in range(number // 100):
+                    for i in range(50):
+                        get("section", "path_%d" % i)
+                        getint("section", "size_%d" % i)
+            return loop
+        
+        def snapshot_loop():
+            for _ in range(number // 100):
+                for i in range(50):
+                    getattr(section, "path_%d" % i)
+                    int(getattr(section, "size_%d" % i))
+        
+        def snapshot_attribute():
+            for _ in range(number):
+                section.path_1
+        
+        def get_cached():
+            for _ in range(number):
+                config.get("section", "path_1")
+        
+        def get_plain():
+            for _ in range(number):
+                plain.get("section", "path_1")
+        
+        results = {
+            "ConfigParser get/getint, us per lookup": common.best_time(lookups(plain.get, plain.getint)) / number * 1e6,
+            "MyConfigParser get/getint, us per lookup": common.best_time(lookups(config.get, config.getint)) / number * 1e6,
+            "snapshot attribute + int(), us per lookup": common.best_time(snapshot_loop) / number * 1e6,
+            "ConfigParser get same option, us": common.best_time(get_plain) / number * 1e6,
+            "MyConfigParser get same option, us": common.best_time(get_cached) / number * 1e6,
+            "snapshot attribute same option, us": common.best_time(snapshot_attribute) / number * 1e6,
+        }
+    finally:
+        shutil.rmtree(config_dir)
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "config access")
@@ -0,0 +1,64 @@
+"""
+Wall-clock time to load N configurations (MyConfigs.load_all) one after another or with a thread pool.
+
+Threads only help when loading waits on I/O (e.g. NFS-backed config folders): the 'latency' results 
+simulate it by sleeping before parsing each file.
+"""
+
+import shutil, tempfile, time
+from os.path import join
+
+import common
+
+from myPyApps import myconfig
+
+SIMULATED_LATENCY = 0.002
+
+
+def run(quick=False):
+    counts = quick and [10, 50] or [10, 50, 200]
+    results = {}
+    parse_file = myconfig.MyConfigParser._parse_file
+    def slow_parse_file(self, full_path):
+        time.sleep(SIMULATED_LATENCY)
+        return parse_file(self, full_path)
+    
+    for count in counts:
+        config_dir = tempfile.mkdtemp()
+        try:
+            for i in range(count):
+                with open(join(config_dir, 'config%d.default' % i), 'w') as fp:
+                    fp.write("[DEFAULT]\nroot = /data\n")
+                    for s in range(10):
+                        fp.write("[section%d]\n" % s)
+                        for o in range(10):
+                            fp.write("opt%d = %%(root)s/%d\n" % (o, o))
+            index = myconfig.ConfigIndex(config_dir)
+            
+            def load(workers):
+                def func():
+                    configs = myconfig.MyConfigs(index=index)
+                    for name in index.names():
+                        configs.add(name)
+                    configs.load_all(workers)
+                return func
+            
+            for latency in (False, True):
+                # benchmark only: simulate I/O latency of each parsed file
+                myconfig.MyConfigParser._parse_file = slow_parse_file if latency else parse_file
+                try:
+                    for workers in (None, 4, 16):
+                        key = "%d configs, %s, %s (ms)" % (count, "%d threads" % workers if workers else "serial", 
+                                                        "%gms latency" % (SIMULATED_LATENCY * 1000) if latency else "local disk")
+                        results[key] = common.best_time(load(workers), repeat=quick and 1 or 3) * 1000
+                finally:
+                    myconfig.MyConfigParser._parse_file = parse_file
+        finally:
+            shutil.rmtree(config_dir)
+    return results
+
+
+if __name__ == "__main__":
+    import logging
+    logging.getLogger('myPyApps.myconfig').setLevel(logging.WARNING)
+    common.main(run, "config loading")
@@ -0,0 +1,63 @@
+"""
+MyConfigParser construction and reload with N sections of N options and M override files,
+then items() and check_override_all() on the loaded configuration, and ConfigValidator over all override folders.
+"""
+
+import logging, os, shutil, tempfile
+from os.path import join
+
+import common
+
+from myPyApps import myconfig
+
+
+def write_config(config_dir, sections, options, overrides):
+    """
+    Write bench.default and one bench.cfg in each of overrides sub folders. Return config_path (most important first)
+    """
+    with open(join(config_dir, 'bench.default'), 'w') as fp:
+        fp.write("[DEFAULT]\nroot = /var/data\n")
+        for s in range(sections):
+            fp.write("[section%d]\n" % s)
+            for o in range(options):
+                fp.write("opt%d = %%(root)s/%d/%d\n" % (o, s, o))
+    config_path = []
+    for m in range(overrides):
+        folder = join(config_dir, 'override%d' % m)
+        os.mkdir(folder)
+        with open(join(folder, 'bench.cfg'), 'w') as fp:
+            for s in range(m, sections, overrides):
+                fp.write("[section%d]\nopt0 = override %d\n" % (s, m))
+        config_path.append(folder)
+    return config_path + [config_dir]
+
+
+def run(quick=False):
+    sizes = quick and [(10, 10, 1), (50, 20, 3)] or [(10, 10, 1), (50, 20, 3), (200, 50, 5)]
+    number = quick and 3 or 10
+    results = {}
+    for sections, options, overrides in sizes:
+        config_dir = tempfile.mkdtemp()
+        try:
+            config_path = write_config(config_dir, sections, options, overrides)
+            config = myconfig.MyConfigParser('bench', config_path)
+            name = "%d sections x %d options, %d cfg" % (sections, options, overrides)
+
+            def items():
+                for s in range(sections):
+                    config.items("section%d" % s)
+
+            results[name + ", construction ms"] = common.best_time(lambda: myconfig.MyConfigParser('bench', config_path), number) * 1e3
+            results[name + ", reload (no change) ms"] = common.best_time(config.reload, number) * 1e3
+            results[name + ", items() all sections ms"] = common.best_time(items, number) * 1e3
+            results[name + ", check_override_all() ms"] = common.best_time(config.check_override_all, number) * 1e3
+            results[name + ", ConfigValidator.validate_path() ms"] = \
+                common.best_time(lambda: myconfig.ConfigValidator(config_path).validate_path(), number) * 1e3
+        finally:
+            shutil.rmtree(config_dir)
+    return results
+
+
+if __name__ == "__main__":
+    logging.getLogger('myPyApps.myconfig').setLevel(logging.WARNING)
+    common.main(run, "config parser")
@@ -0,0 +1,47 @@
+"""
+mylogging.configure_logging: logging.config.dictConfig from the translated configuration
+against the former StringIO round-trip through logging.config.fileConfig.
+"""
+
+import logging, shutil, tempfile
+from os.path import join
+
+import common
+
+from myPyApps import mylogging, myconfig
+
+
+def run(quick=False):
+    number = quick and 20 or 200
+    config_dir = tempfile.mkdtemp()
+    try:
+        with open(join(config_dir, 'logging.cfg'), 'w') as fp:
+            fp.write("[handler_file]\nargs=(%r, 'a', 20480, 3)\n" % join(config_dir, 'bench.log'))
+        config = myconfig.MyConfigParser('logging', myconfig.DEFAULT_PATH + [config_dir])
+        
+        def file_config():
+            mylogging.file_config(config)
+        
+        def dict_config():
+            logging.config.dictConfig(mylogging.get_dict_config(config))
+        
+        def translate():
+            mylogging.config_to_dict(config)
+        
+        def configure():
+            mylogging.configure_logging(mail=False, config_path=myconfig.DEFAULT_PATH + [config_dir])
+        
+        results = {
+            "fileConfig (StringIO round-trip), ms": common.best_time(file_config, number) * 1e3,
+            "dictConfig (cached translation), ms": common.best_time(dict_config, number) * 1e3,
+            "config_to_dict translation, ms": common.best_time(translate, number) * 1e3,
+            "configure_logging, ms": common.best_time(configure, number) * 1e3,
+        }
+    finally:
+        common.reset_logging()
+        shutil.rmtree(config_dir)
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "configure logging")
@@ -0,0 +1,81 @@
+"""
+myemail: MIME message construction, and sending against a local stand-in SMTP server
+(one send_email call per message against a send_emails batch on a pooled connection, and send_emails_async batches),
+and an Outbox: queuing a message and draining the outbox.
+"""
+
+import asyncio, os, shutil, tempfile
+
+import common
+
+from myPyApps import myconfig, mylogging
+from myPyApps.helpers import myemail
+from myPyApps.tests import smtpserver
+
+TEXT = "Hello,\n\n" + "This is the report line.\n" * 50
+HTML = "<html><body>%s</body></html>" % TEXT.replace("\n", "<br>")
+
+
+def run(quick=False):
+    number = quick and 20 or 200
+    server = smtpserver.SMTPServer(keep=False).start()
+    backup = getattr(mylogging.MyLogger, "default_config", None)
+    config = myconfig.MyConfigParser('logging')
+    config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject')" % server.port)
+    mylogging.MyLogger.default_config = config
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as fp:
+        fp.write(b"column 1,column 2\n" * 2000)
+    try:
+        def build():
+            for _ in range(number):
+                myemail.build_message("from@abc", "to@abc", "subject", TEXT, HTML)[1].as_string()
+        
+        def build_attachment():
+            for _ in range(number):
+                myemail.build_message("from@abc", "to@abc", "subject", TEXT, HTML, [fp.name])[1].as_string()
+        
+        def send():
+            for _ in range(number):
+                myemail.send_email("to@abc", "subject", TEXT, HTML, pool=myemail.SMTPPool())
+        
+        def send_pooled():
+            pool = myemail.SMTPPool()
+            myemail.send_emails([dict(to_addrs="to@abc", subject="subject", text_body=TEXT, html_body=HTML)] * number, pool=pool)
+            pool.close()
+        
+        def send_async(concurrency):
+            messages = [dict(to_addrs="to@abc", subject="subject", text_body=TEXT, html_body=HTML)] * number
+            return lambda: asyncio.run(myemail.send_emails_async(messages, concurrency))
+        
+        outbox_dir = tempfile.mkdtemp()
+        outbox = myemail.Outbox(outbox_dir, myemail.get_smtp_config(config))
+        message = myemail.build_message("from@abc", "to@abc", "subject", TEXT, HTML)[1].as_string()
+        
+        def queue():
+            for _ in range(number):
+                outbox.put("from@abc", ["to@abc"], message)
+        
+        def queue_and_drain():
+            queue()
+            outbox.deliver()
+        
+        results = {
+            "build_message text + html, us per message": common.best_time(build) / number * 1e6,
+            "build_message + 36 KB attachment, us per message": common.best_time(build_attachment) / number * 1e6,
+            "send_email new connection, us per message": common.best_time(send) / number * 1e6,
+            "send_emails pooled connection, us per message": common.best_time(send_pooled) / number * 1e6,
+            "send_emails_async 1 connection, us per message": common.best_time(send_async(1)) / number * 1e6,
+            "send_emails_async 4 connections, us per message": common.best_time(send_async(4)) / number * 1e6,
+            "Outbox.put, us per message": common.best_time(queue) / number * 1e6,
+            "Outbox.put then deliver, us per message": common.best_time(queue_and_drain) / number * 1e6,
+        }
+        shutil.rmtree(outbox_dir)
+    finally:
+        os.remove(fp.name)
+        mylogging.MyLogger.default_config = backup
+        server.stop()
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "email")
@@ -0,0 +1,49 @@
+"""
+Formatting throughput of logging.Formatter, mylogging FastFormatter and JsonFormatter with the default logging.default format,
+and of a naive JSON formatter (json.dumps of a dict built with logging.Formatter).
+"""
+
+import json, logging
+
+import common
+
+from myPyApps import mylogging
+
+FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s"
+
+
+class NaiveJsonFormatter(logging.Formatter):
+    """
+    JSON lines the usual way: format every field through logging.Formatter then json.dumps
+    """
+    def format(self, record):
+        record.message = record.getMessage()
+        return json.dumps({'asctime': self.formatTime(record, self.datefmt), 'levelname': record.levelname,
+                           'name': record.name, 'lineno': record.lineno, 'message': record.message})
+
+
+def throughput(formatter, records):
+    """
+    Return records per second formatted by formatter
+    """
+    def format_all():
+        for record in records:
+            formatter.format(record)
+    return len(records) / common.best_time(format_all)
+
+
+def run(quick=False):
+    number = quick and 10000 or 100000
+    logger = logging.getLogger("bench.formatters")
+    records = [logger.makeRecord(logger.name, logging.INFO, __file__, 42, "record %d of %s", (i, "benchmark"), None)
+               for i in range(number)]
+    return {
+        "logging.Formatter, records/s": throughput(logging.Formatter(FORMAT), records),
+        "FastFormatter, records/s": throughput(mylogging.FastFormatter(FORMAT), records),
+        "naive JSON formatter, records/s": throughput(NaiveJsonFormatter(FORMAT), records),
+        "JsonFormatter, records/s": throughput(mylogging.JsonFormatter(FORMAT), records),
+    }
+
+
+if __name__ == "__main__":
+    common.main(run, "formatters")
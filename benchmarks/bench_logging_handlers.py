@@ -0,0 +1,76 @@
+"""
+Record throughput of a logger through mylogging StreamMaxLevelHandler, BufferedStreamHandler, RotatingFileHandler and BufferedRotatingFileHandler,
+with the default logging.default format.
+"""
+
+import io, logging, logging.handlers, shutil, tempfile
+from os.path import join
+
+import common
+
+from myPyApps import mylogging
+
+FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s"
+
+
+class NullStream(io.TextIOBase):
+    """
+    Discard all writes (measure formatting and handling, not the terminal)
+    """
+    def write(self, text):
+        return len(text)
+
+
+def throughput(handler, number):
+    """
+    Return records per second logged through handler
+    """
+    handler.setFormatter(logging.Formatter(FORMAT))
+    logger = logging.getLogger("bench.%s" % handler.__class__.__name__)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    def log():
+        for i in range(number):
+            logger.info("record %d of %s", i, "benchmark")
+    # the suite runner disables logging
+    disabled = logging.root.manager.disable
+    logging.disable(logging.NOTSET)
+    try:
+        return number / common.best_time(log)
+    finally:
+        logging.disable(disabled)
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def run(quick=False):
+    number = quick and 10000 or 100000
+    log_dir = tempfile.mkdtemp()
+    try:
+        results = {
+            "logging.StreamHandler, records/s": throughput(logging.StreamHandler(NullStream()), number),
+            "StreamMaxLevelHandler, records/s": throughput(mylogging.StreamMaxLevelHandler(NullStream(), logging.INFO), number),
+            "BufferedStreamHandler, records/s": throughput(mylogging.BufferedStreamHandler(NullStream(), logging.INFO), number),
+            "StreamMaxLevelHandler to a file, records/s": 
+                throughput(mylogging.StreamMaxLevelHandler(open(join(log_dir, 'stream.log'), 'w'), logging.INFO), number),
+            "BufferedStreamHandler to a file, records/s": 
+                throughput(mylogging.BufferedStreamHandler(open(join(log_dir, 'buffered.log'), 'w'), logging.INFO), number),
+            "RotatingFileHandler (20 KB files), records/s": 
+                throughput(logging.handlers.RotatingFileHandler(join(log_dir, 'small.log'), 'a', 20480, 3), number),
+            "RotatingFileHandler (no rotation), records/s": 
+                throughput(logging.handlers.RotatingFileHandler(join(log_dir, 'big.log'), 'a', 0, 3), number),
+            "BufferedRotatingFileHandler (20 KB files), records/s": 
+                throughput(mylogging.BufferedRotatingFileHandler(join(log_dir, 'buffered_small.log'), 'a', 20480, 3), number),
+            "BufferedRotatingFileHandler (1 MB files, gzip), records/s": 
+                throughput(mylogging.BufferedRotatingFileHandler(join(log_dir, 'buffered_1mb.log'), 'a', 1048576, 3), number),
+            "BufferedRotatingFileHandler (no rotation), records/s": 
+                throughput(mylogging.BufferedRotatingFileHandler(join(log_dir, 'buffered_big.log'), 'a', 0, 3), number),
+        }
+    finally:
+        shutil.rmtree(log_dir)
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "logging handlers")
@@ -0,0 +1,71 @@
+"""
+Record throughput of N forked writer processes logging to one file: every process writing the inherited 
+file handler (the former behavior, unsafe with rotation) against the collector mode of mylogging.
+"""
+
+import logging, multiprocessing, shutil, tempfile, time
+from os.path import join
+
+import common
+
+from myPyApps import mylogging
+
+FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s"
+
+
+def write(number):
+    logger = logging.getLogger("bench.worker")
+    for i in range(number):
+        logger.info("record %d of %s", i, "benchmark")
+
+
+def throughput(filename, writers, number, collector):
+    """
+    Return records per second written by writers processes
+    """
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    backup = logging.root.handlers, logging.root.level
+    logging.root.handlers = [handler]
+    logging.root.setLevel(logging.INFO)
+    # the suite runner disables logging
+    disabled = logging.root.manager.disable
+    logging.disable(logging.NOTSET)
+    if collector:
+        mylogging._start_collector()
+    try:
+        context = multiprocessing.get_context('fork')
+        start = time.perf_counter()
+        processes = [context.Process(target=write, args=(number,)) for _ in range(writers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        mylogging.flush_logging()
+        elapsed = time.perf_counter() - start
+    finally:
+        mylogging._stop_queue()
+        logging.disable(disabled)
+        logging.root.handlers, level = backup
+        logging.root.setLevel(level)
+        handler.close()
+    with open(filename) as fp:
+        assert sum(1 for _ in fp) == writers * number
+    return writers * number / elapsed
+
+
+def run(quick=False):
+    number = quick and 2000 or 20000
+    log_dir = tempfile.mkdtemp()
+    results = {}
+    try:
+        for writers in (quick and [1, 4] or [1, 4, 8]):
+            results["%d writers, shared file handler, records/s" % writers] = throughput(join(log_dir, 'shared%d.log' % writers), writers, number, False)
+            results["%d writers, collector, records/s" % writers] = throughput(join(log_dir, 'collector%d.log' % writers), writers, number, True)
+    finally:
+        shutil.rmtree(log_dir)
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "multiprocess logging")
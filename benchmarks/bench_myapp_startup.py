@@ -0,0 +1,71 @@
+"""
+MyApp end-to-end startup: a script running an empty MyApp in a new interpreter (against bare interpreter startup
+and myapp import), and MyApp construction in process, without and with an attached configuration snapshot.
+"""
+
+import sys, subprocess, shutil, tempfile
+from os.path import join
+
+import common
+
+from myPyApps import myapp, myconfig
+
+SCRIPT = """
+import sys
+sys.path.insert(0, %(root)r)
+from myPyApps import myapp, myconfig
+
+class Bench(myapp.MyApp):
+    def main(self):
+        return 0
+
+sys.exit(Bench(config_path=[%(config_dir)r] + myconfig.DEFAULT_PATH, logging_email=False).run())
+"""
+
+
+class Bench(myapp.MyApp):
+    def main(self):
+        return 0
+
+
+def run(quick=False):
+    number = quick and 3 or 10
+    config_dir = tempfile.mkdtemp()
+    try:
+        with open(join(config_dir, 'logging.cfg'), 'w') as fp:
+            fp.write("[handler_file]\nargs=(%r, 'a', 20480, 3)\n" % join(config_dir, 'bench.log'))
+        with open(join(config_dir, 'bench.default'), 'w') as fp:
+            fp.write("[DEFAULT]\nroot = /var/data\n[section]\nopt = %(root)s/opt\n")
+        script = join(config_dir, 'bench.py')
+        with open(script, 'w') as fp:
+            fp.write(SCRIPT % {'root': common.ROOT, 'config_dir': config_dir})
+        
+        def interpreter(*args):
+            return lambda: subprocess.check_call((sys.executable,) + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        
+        def construct(config_snapshot=None):
+            Bench(config_default='bench', config_path=[config_dir] + myconfig.DEFAULT_PATH, logging_email=False, 
+                  config_workers=config_snapshot and 1, config_snapshot=config_snapshot)
+        
+        # written once, then attached by each construction
+        snapshot = join(config_dir, 'bench.snapshot')
+        construct(snapshot)
+        
+        results = {
+            "python -c pass, ms": common.best_time(interpreter("-c", "pass"), number) * 1e3,
+            "python -c 'import myPyApps.myapp', ms": common.best_time(interpreter("-c", "import sys; sys.path.insert(0, %r); import myPyApps.myapp" % common.ROOT), number) * 1e3,
+            "MyApp script end-to-end, ms": common.best_time(interpreter(script), number) * 1e3,
+            "MyApp construction in process, ms": common.best_time(construct, number) * 1e3,
+            "MyApp construction in process with config snapshot (all configs loaded), ms": common.best_time(lambda: construct(snapshot), number) * 1e3,
+            "MyApp construction in process, all configs loaded, ms": 
+                common.best_time(lambda: Bench(config_default='bench', config_path=[config_dir] + myconfig.DEFAULT_PATH, 
+                                               logging_email=False, config_workers=1), number) * 1e3,
+        }
+    finally:
+        common.reset_logging()
+        shutil.rmtree(config_dir)
+    return results
+
+
+if __name__ == "__main__":
+    common.main(run, "MyApp startup")
@@ -0,0 +1,129 @@
+"""
+Helpers shared by benchmarks.
+
+Each benchmark module has a run(quick=False) function that returns a dictionary of results, 
+and can be run as a script from a source checkout:
+
+python benchmarks/bench_<name>.py [--quick] [--json FILE] [--compare FILE]
+
+Run all of them with benchmarks/run.py.
+"""
+
+import sys, json, time, argparse
+from os.path import dirname, abspath
+
+# benchmark the source tree, not an installed version
+ROOT = dirname(dirname(abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def best_time(func, number=1, repeat=3):
+    """
+    Return the best time in seconds of one func call, over repeat measures of number calls
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def max_rss():
+    """
+    Return the peak resident set size of current process in KB
+    """
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def reset_logging():
+    """
+    Remove and close root handlers set by a benchmark
+    """
+    import logging
+    for handler in list(logging.root.handlers):
+        logging.root.removeHandler(handler)
+        handler.close()
+
+
+def print_results(name, results):
+    print("*" * 10, name, "*" * 10)
+    width = max([50] + [len(key) for key in results])
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = "%.6g" % value
+        print("%-*s %s" % (width, key, value))
+
+
+def higher_is_better(key):
+    """
+    Return True if a bigger value of result key is an improvement (throughputs)
+    """
+    return "/s" in key
+
+
+def compare(baseline, results, threshold=10):
+    """
+    Return the list of (key, baseline value, value, change in %, flag) for numeric results found in both dictionaries.
+    flag is 'REGRESSION' or 'improvement' if the change is more than threshold percent (else '').
+    """
+    rows = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        change = (value - old) * 100. / old
+        better = change > 0 if higher_is_better(key) else change < 0
+        flag = ""
+        if abs(change) > threshold:
+            flag = "improvement" if better else "REGRESSION"
+        rows.append((key, old, value, change, flag))
+    return rows
+
+
+def print_comparison(name, rows):
+    print("*" * 10, name, "(baseline -> current)", "*" * 10)
+    width = max([50] + [len(row[0]) for row in rows])
+    for key, old, value, change, flag in rows:
+        print("%-*s %10.6g -> %-10.6g %+7.1f%% %s" % (width, key, old, value, change, flag))
+
+
+def load_json(filename):
+    with open(filename) as fp:
+        return json.load(fp)
+
+
+def save_json(filename, results):
+    with open(filename, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+
+
+def main(run, name=None):
+    """
+    Parse command line, run the benchmark, print results, optionally save them as JSON and compare them with a previous run.
+    Exit with status 1 if a regression is found.
+    """
+    parser = argparse.ArgumentParser(description=name)
+    parser.add_argument("--quick", action="store_true", default=False, help="run smaller benchmark")
+    parser.add_argument("--json", help="save results into this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare results with a previous run saved with --json")
+    parser.add_argument("--threshold", type=float, default=10, help="percentage of change reported as regression or improvement (default: 10)")
+    args = parser.parse_args()
+    name = name or run.__module__
+    results = run(quick=args.quick)
+    print_results(name, results)
+    if args.json:
+        save_json(args.json, results)
+    if args.compare:
+        rows = compare(load_json(args.compare), results, args.threshold)
+        print_comparison(name, rows)
+        if any(row[4] == "REGRESSION" for row in rows):
+            sys.exit(1)
+    return results
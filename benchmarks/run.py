@@ -0,0 +1,72 @@
+"""
+Run all benchmarks (or the given ones), save results as JSON and compare them with a previous run.
+
+python benchmarks/run.py [--quick] [--json FILE] [--compare FILE] [--threshold PERCENT] [name ...]
+
+For example, to check a change for regressions:
+
+python benchmarks/run.py --json before.json
+# apply change
+python benchmarks/run.py --compare before.json
+
+Names are benchmark module names without 'bench_' prefix (e.g. config_parser). Exit with status 1 if a regression is found.
+"""
+
+import sys, glob, argparse, importlib, logging, platform, time
+from os.path import dirname, abspath, basename, join
+
+import common
+
+HERE = dirname(abspath(__file__))
+
+
+def names():
+    """
+    Return all benchmark names
+    """
+    return sorted(basename(f)[len("bench_"):-len(".py")] for f in glob.glob(join(HERE, "bench_*.py")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="myPyApps benchmark suite")
+    parser.add_argument("names", nargs="*", metavar="name", help="benchmarks to run (default: all of %s)" % ", ".join(names()))
+    parser.add_argument("--quick", action="store_true", default=False, help="run smaller benchmarks")
+    parser.add_argument("--json", help="save results into this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare results with a previous run saved with --json")
+    parser.add_argument("--threshold", type=float, default=10, help="percentage of change reported as regression or improvement (default: 10)")
+    args = parser.parse_args()
+    
+    for name in args.names:
+        if name not in names():
+            parser.error("unknown benchmark %r" % name)
+    # benchmarks log a lot while loading configurations. 
+    # mylogging replaces logging manager on import: disable logging in both managers
+    logging.disable(logging.WARNING)
+    from myPyApps import mylogging
+    logging.disable(logging.WARNING)
+    
+    results = {'_meta': {'python': platform.python_version(), 'platform': platform.platform(), 
+                         'quick': args.quick, 'date': time.strftime("%Y-%m-%d %H:%M:%S")}}
+    for name in args.names or names():
+        module = importlib.import_module("bench_" + name)
+        results[name] = module.run(quick=args.quick)
+        common.print_results(name, results[name])
+    
+    if args.json:
+        common.save_json(args.json, results)
+    
+    if args.compare:
+        baseline = common.load_json(args.compare)
+        regression = False
+        for name, values in results.items():
+            if name.startswith('_') or name not in baseline:
+                continue
+            rows = common.compare(baseline[name], values, args.threshold)
+            common.print_comparison(name, rows)
+            regression = regression or any(row[4] == "REGRESSION" for row in rows)
+        if regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 __version__ = (2, 0, 0)
 
-import os, glob, shutil
+import os
 from os.path import isfile, isdir
 
 def rm_fr(path):
+    import glob, shutil
     if not hasattr(path, '__get__'):
         paths = [path]
     
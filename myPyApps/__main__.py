@@ -0,0 +1,78 @@
+"""
+@author: Fabrice Douchant
+@contact: vamp.higher@gmail.com
+@license: GNU GPLv3 (LICENSE.txt)
+
+Command line tools of myPyApps:
+
+python -m myPyApps check-config [-c FOLDER]... [HOST_FOLDER]...
+    check that all sections and options of user configurations are in default ones. Exit with status 1 if not.
+
+python -m myPyApps drain-outbox [-c FOLDER]... OUTBOX_FOLDER
+    send due emails of an outbox (see myemail.Outbox) with logging configuration SMTP handler settings.
+    Exit with status 1 if some emails are still pending.
+"""
+
+import sys
+
+from myPyApps import myconfig
+
+
+def check_config(args):
+    validator = myconfig.ConfigValidator(args.config + myconfig.DEFAULT_PATH)
+    if args.folders:
+        problems = []
+        for folder in args.folders:
+            problems.extend(validator.validate_folder(folder))
+    else:
+        problems = validator.validate_path()
+    for problem in problems:
+        print(problem)
+    print("%d configuration problem(s)" % len(problems), file=sys.stderr)
+    return problems and 1 or 0
+
+
+def drain_outbox(args):
+    from myPyApps.helpers import myemail
+    config = myemail.get_smtp_config(myconfig.MyConfigParser('logging', args.config + myconfig.DEFAULT_PATH))
+    outbox = myemail.Outbox(args.outbox, config, max_attempts=args.max_attempts)
+    outbox.recover(args.claim_timeout)
+    try:
+        outbox.deliver()
+    finally:
+        myemail.POOL.close()
+    metrics = outbox.metrics()
+    for key in sorted(metrics):
+        print("%s: %s" % (key, metrics[key]))
+    return metrics['pending'] and 1 or 0
+
+
+def main(args=None):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog="python -m myPyApps")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    
+    check = commands.add_parser("check-config", help="check that user configurations only set sections and options of default ones")
+    check.add_argument("-c", "--config", action="append", default=[], metavar="FOLDER",
+                       help="folder of default (and user) configurations, with highest priority. Added to default config path")
+    check.add_argument("folders", nargs="*", metavar="HOST_FOLDER",
+                       help="check all user configurations of HOST_FOLDER (e.g. of a host) instead of the config path ones")
+    check.set_defaults(func=check_config)
+    
+    drain = commands.add_parser("drain-outbox", help="send due emails of an outbox folder")
+    drain.add_argument("-c", "--config", action="append", default=[], metavar="FOLDER",
+                       help="folder of logging configuration (SMTP handler), with highest priority. Added to default config path")
+    drain.add_argument("--max-attempts", type=int, default=5, metavar="N",
+                       help="move an email into dead letters after N failed attempts (default: %(default)s)")
+    drain.add_argument("--claim-timeout", type=float, default=600, metavar="SECONDS",
+                       help="send again emails claimed by a sender more than SECONDS ago (default: %(default)s)")
+    drain.add_argument("outbox", metavar="OUTBOX_FOLDER", help="the outbox folder")
+    drain.set_defaults(func=drain_outbox)
+    
+    args = parser.parse_args(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,256 @@
-import smtplib, logging, string, os
+import logging, os, time, threading, atexit, base64
 
-import mimetypes
-
-from email import encoders
-from email.mime.audio import MIMEAudio
-from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from collections import namedtuple
+from contextlib import contextmanager
+from importlib import import_module
 
 from myPyApps import mylogging
 
 LOGGER = mylogging.getLogger(__name__)
 
-def send_email(to_addrs, subject, text_body=None, html_body=None, attachements=[]):
+# smtplib, mimetypes and email packages are only imported when an email is built or sent:
+# name => (module, attribute) still available as module attributes
+_LAZY_IMPORTS = {
+    'smtplib': ('smtplib', None),
+    'mimetypes': ('mimetypes', None),
+    'encoders': ('email.encoders', None),
+    'MIMEAudio': ('email.mime.audio', 'MIMEAudio'),
+    'MIMEBase': ('email.mime.base', 'MIMEBase'),
+    'MIMEImage': ('email.mime.image', 'MIMEImage'),
+    'MIMEMultipart': ('email.mime.multipart', 'MIMEMultipart'),
+    'MIMEText': ('email.mime.text', 'MIMEText'),
+}
+
+def __getattr__(name):
+    try:
+        module, attribute = _LAZY_IMPORTS[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = import_module(module)
+    if attribute:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+# same default as logging SMTPHandler
+DEFAULT_TIMEOUT = 5.0
+
+# verify: check the server certificate and host name on STARTTLS (off by default, like SMTPHandler)
+SMTPConfig = namedtuple('SMTPConfig', 'host port from_addr username password secure timeout verify', defaults=(False, ))
+
+def get_smtp_config(config=None):
     """
-    This helper is used to send an email than may be in text or html and have attachments.
-    It uses mylogging SMTPHandler default configuration (section handler_mail, option args)
+    Return the SMTPConfig from mylogging SMTPHandler configuration (section handler_mail, options args and kwargs)
     
-    @param to_addrs: recievers addresses
-    @param subject: the email subject
-    @param text_body: an optional text body
-    @param html_body: an optional html body
-    @param attachements: an optional list of files to attach to the email 
+    @param config: the logging configuration. Default is the one loaded by mylogging.configure_logging
     """
-    
-    # needs a list even if one email address
-    if not hasattr(to_addrs, '__iter__'):
-        LOGGER.debug("convert to_addrs has string")
-        if "," in to_addrs:
-            to_addrs = map(string.strip, to_addrs.split(','))
-            LOGGER.debug("to_addrs is a string containing list of emails")
-        else:
-            to_addrs = [ to_addrs ]
-    
-    # unpack logging smtp handler configuration
-    args = LOGGER.default_config.get('handler_mail', 'args', raw=True)
+    if config is None:
+        config = LOGGER.default_config
+    args = config.get('handler_mail', 'args', raw=True)
     LOGGER.debug("using smtp configuration: " + args)
     
     eval_args = eval(args, vars(logging))
     
-    # unpack values, skip to_addrs and subject
-    host, from_addr, _, _, = eval_args[:4]
+    # unpack values like SMTPHandler, skip to_addrs and subject
+    mailhost, from_addr = eval_args[:2]
     others = eval_args[4:]
     # get host and port
-    if hasattr(others, '__iter__') and len(others) > 2:
-        host = others[0]
-        port = others[1]
+    if isinstance(mailhost, (list, tuple)):
+        host, port = mailhost
     else:
-        port = smtplib.SMTP_PORT
-        LOGGER.debug("SMTP configuration uses default port " + str(port)) 
+        from smtplib import SMTP_PORT
+        host, port = mailhost, SMTP_PORT
+        LOGGER.debug("SMTP configuration uses default port " + str(port))
     
     # get credentials if any
     username = password = None
-    if others:
+    if others and others[0]:
         username, password = others[0]
-        LOGGER.debug("found username = %s, password = %s" % (username, password))
-    # get secure if any  
+        LOGGER.debug("found username = %s" % username)
+    # get secure if any
     secure = None
     if len(others) > 1:
         secure = others[1]
         LOGGER.debug("found secure = " + str(secure))
+    timeout = others[2] if len(others) > 2 else DEFAULT_TIMEOUT
+    # MySMTPHandler 'verify' keyword argument
+    kwargs = eval(config.get('handler_mail', 'kwargs', raw=True, fallback="{}"), vars(logging))
+    verify = kwargs.get('verify', False)
+    
+    return SMTPConfig(host, port, from_addr, username, password, secure, timeout, verify)
+
+def _starttls_context(secure, verify=False):
+    """
+    Return the SSL context of STARTTLS for SMTPHandler secure: () or (keyfile,) or (keyfile, certfile).
+    
+    @param verify: check the server certificate (with default CA certificates) and host name
+    """
+    import ssl
+    keyfile, certfile = (tuple(secure) + (None, None))[:2]
+    if keyfile and not certfile:
+        raise ValueError("certfile must be specified")
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if verify:
+        context.load_default_certs()
+    else:
+        # same as smtplib.SMTP.starttls (so SMTPHandler): internal SMTP relays often have self-signed certificates
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if certfile:
+        context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+class SMTPPool(object):
+    """
+    Pool of persistent SMTP connections, keyed by host, port and credentials.
+    
+    Idle connections are closed after idle_timeout seconds. If the server dropped a pooled connection, 
+    a new one is opened and sending is tried again.
+    """
+    
+    def __init__(self, idle_timeout=60, max_idle=4):
+        """
+        @param idle_timeout: number of seconds after which an idle connection is not reused anymore
+        @param max_idle: maximum number of idle connections kept per key
+        """
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        # key => list of (smtp, last used time)
+        self._idle = {}
+        self._lock = threading.Lock()
+        
+    def _key(self, config):
+        return (config.host, config.port, config.username, config.password, config.secure, config.verify)
+    
+    def connect(self, config):
+        """
+        Open and return a new SMTP connection (with TLS and login if configured)
+        """
+        import smtplib
+        LOGGER.debug("open SMTP connection to %s:%s" % (config.host, config.port))
+        smtp = smtplib.SMTP(config.host, config.port, timeout=config.timeout)
+        if config.username:
+            LOGGER.debug("initial credentials for SMTP")
+            if config.secure is not None:
+                LOGGER.debug("start TLS")
+                smtp.ehlo()
+                smtp.starttls(context=_starttls_context(config.secure, config.verify))
+                smtp.ehlo()
+            smtp.login(config.username, config.password)
+        return smtp
+    
+    def acquire(self, config):
+        """
+        Return an idle connection for config, or a new one if there isn't any
+        """
+        expired = []
+        smtp = None
+        now = time.time()
+        with self._lock:
+            connections = self._idle.get(self._key(config), [])
+            while connections:
+                candidate, last_used = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    smtp = candidate
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            self.discard(candidate)
+        return smtp or self.connect(config)
+    
+    def release(self, config, smtp):
+        """
+        Give back a connection to the pool
+        """
+        with self._lock:
+            connections = self._idle.setdefault(self._key(config), [])
+            if len(connections) < self.max_idle:
+                connections.append((smtp, time.time()))
+                return
+        self.discard(smtp)
         
+    def discard(self, smtp):
+        """
+        Close a connection without giving it back to the pool
+        """
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+    
+    @contextmanager
+    def connection(self, config, fresh=False):
+        """
+        Context manager to use a pooled connection. The connection is discarded if an unexpected error is raised.
+        
+        @param fresh: set to True to open a new connection instead of reusing an idle one
+        """
+        import smtplib
+        smtp = self.connect(config) if fresh else self.acquire(config)
+        try:
+            yield smtp
+        except smtplib.SMTPResponseException:
+            # server replied with an error, connection is still usable
+            self.release(config, smtp)
+            raise
+        except:
+            self.discard(smtp)
+            raise
+        self.release(config, smtp)
+    
+    def sendmail(self, config, from_addr, to_addrs, msg):
+        """
+        Send msg (a string, or an iterable of SMTP DATA bytes like a StreamingMessage) with a pooled connection. 
+        Reconnect once if the server closed the connection.
         
+        Return the dictionary of refused recipients (like smtplib.SMTP.sendmail)
+        """
+        import smtplib
+        send = smtplib.SMTP.sendmail if isinstance(msg, (str, bytes)) else send_stream
+        try:
+            with self.connection(config) as smtp:
+                return send(smtp, from_addr, to_addrs, msg)
+        except smtplib.SMTPServerDisconnected:
+            LOGGER.debug("pooled SMTP connection was closed, reconnect")
+        with self.connection(config, fresh=True) as smtp:
+            return send(smtp, from_addr, to_addrs, msg)
+    
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for smtp, _ in connections:
+                self.discard(smtp)
+
+# default pool, used by send_email and send_emails
+POOL = SMTPPool()
+atexit.register(POOL.close)
+
+
+def build_message(from_addr, to_addrs, subject, text_body=None, html_body=None, attachements=[], stream=False):
+    """
+    Build an email than may be in text or html and have attachments.
+    
+    @param stream: set to True to get a StreamingMessage, whose attachments are encoded while it is sent
+    
+    Return (to_addrs, message) where to_addrs is a list of addresses.
+    """
+    # needs a list even if one email address
+    if isinstance(to_addrs, str):
+        LOGGER.debug("convert to_addrs has string")
+        if "," in to_addrs:
+            to_addrs = [addr.strip() for addr in to_addrs.split(',')]
+            LOGGER.debug("to_addrs is a string containing list of emails")
+        else:
+            to_addrs = [ to_addrs ]
+    
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    
     # create message container - the correct MIME type is multipart/alternative.
     message = MIMEMultipart('alternative')
     message['Subject'] = subject
@@ -83,26 +271,78 @@ def send_email(to_addrs, subject, text_body=None, html_body=None, attachements=[
         message.attach(part2)
         
         
+    if stream:
+        return to_addrs, StreamingMessage(message, attachements)
+    
     # add any attachements
     for attachement in attachements:
         LOGGER.debug("add attachement from file " + str(attachement))
         add_attachment(message, attachement, os.path.basename(attachement))
     
+    return to_addrs, message
+    
+
+def send_email(to_addrs, subject, text_body=None, html_body=None, attachements=[], pool=POOL, stream=False, outbox=None):
+    """
+    This helper is used to send an email than may be in text or html and have attachments.
+    It uses mylogging SMTPHandler default configuration (section handler_mail, option args)
+    
+    @param to_addrs: recievers addresses
+    @param subject: the email subject
+    @param text_body: an optional text body
+    @param html_body: an optional html body
+    @param attachements: an optional list of files to attach to the email 
+    @param pool: the SMTPPool to get connection from
+    @param stream: set to True to encode attachments by chunks straight from disk while sending (low memory usage for big attachments)
+    @param outbox: an optional Outbox to queue the email in instead of sending it (pool isn't used)
+    
+    Return the dictionary of refused recipients (empty if all were accepted), or the outbox file name if queued
+    """
+    config = get_smtp_config()
+    to_addrs, message = build_message(config.from_addr, to_addrs, subject, text_body, html_body, attachements, stream)
+    if outbox is not None:
+        return outbox.put(config.from_addr, to_addrs, message if stream else message.as_string())
+    return pool.sendmail(config, config.from_addr, to_addrs, message if stream else message.as_string())
+
+
+def send_emails(messages, pool=POOL):
+    """
+    Send many emails over pooled SMTP connections.
+    
+    @param messages: an iterable of dictionaries of send_email keyword arguments (to_addrs, subject, text_body, html_body, attachements, stream)
+    @param pool: the SMTPPool to get connections from
     
-    smtp = smtplib.SMTP(host, port)
-    if username:
-        LOGGER.debug("initial credentials for SMTP")
-        if secure is not None:
-            LOGGER.debug("start TLS")
-            smtp.ehlo()
-            smtp.starttls(*secure)
-            smtp.ehlo()
-        smtp.login(username, password)
-    smtp.sendmail(from_addr, to_addrs, message.as_string())
-    smtp.quit()
+    Return a list with, for each message, the dictionary of refused recipients (empty if all were accepted) 
+    or the exception raised while sending it.
+    """
+    config = get_smtp_config()
+    results = []
+    for kwargs in messages:
+        try:
+            to_addrs, message = build_message(config.from_addr, **kwargs)
+            if not isinstance(message, StreamingMessage):
+                message = message.as_string()
+            results.append(pool.sendmail(config, config.from_addr, to_addrs, message))
+        except Exception as e:
+            LOGGER.warning("Could not send email %r: %s" % (kwargs.get('subject'), e))
+            results.append(e)
+    return results
     
     
+def guess_type(filename):
+    """
+    Return (maintype, subtype) of the given file
+    """
+    import mimetypes
+    ctype, encoding = mimetypes.guess_type(filename)
     
+    if ctype is None or encoding is not None:
+        # No guess could be made, or the file is encoded (compressed), so
+        # use a generic bag-of-bits type.
+        ctype = 'application/octet-stream'
+    return ctype.split('/', 1)
+
+
 def add_attachment(message, filename, name=None):
     """
     Add an attachment to 'message'.
@@ -112,14 +352,13 @@ def add_attachment(message, filename, name=None):
     @param filename: the attachement file path
     @param name: an optional name for the attachment
     """
+    from email import encoders
+    from email.mime.audio import MIMEAudio
+    from email.mime.base import MIMEBase
+    from email.mime.image import MIMEImage
+    from email.mime.text import MIMEText
     
-    ctype, encoding = mimetypes.guess_type(filename)
-    
-    if ctype is None or encoding is not None:
-        # No guess could be made, or the file is encoded (compressed), so
-        # use a generic bag-of-bits type.
-        ctype = 'application/octet-stream'
-    maintype, subtype = ctype.split('/', 1)
+    maintype, subtype = guess_type(filename)
     if maintype == 'text':
         fp = open(filename)
         # Note: we should handle calculating the charset
@@ -143,3 +382,664 @@ def add_attachment(message, filename, name=None):
     # Set the filename parameter
     attachement.add_header('Content-Disposition', 'attachment', filename=name or filename)
     message.attach(attachement)
+
+
+# read attachments by multiple of 57 bytes, so that each base64 encoded line is complete (76 characters)
+STREAM_CHUNK_SIZE = 57 * 1024
+
+def _smtp_data(text):
+    """
+    Return text as SMTP DATA bytes (CRLF line endings and leading dots doubled).
+    Bytes (like smtplib.SMTP.sendmail, they must already have CRLF line endings) only get their leading dots doubled.
+    """
+    if isinstance(text, bytes):
+        import re
+        return re.sub(br'(?m)^\.', b'..', text)
+    from smtplib import quotedata
+    return quotedata(text).encode('utf_8')
+
+def iter_attachment(filename, name=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield an attachment MIME part (headers then base64 encoded content) as SMTP DATA bytes.
+    The file is read by chunks, so that it is never fully held in memory.
+    
+    @param filename: the attachement file path
+    @param name: an optional name for the attachment
+    @param chunk_size: the number of bytes read at once. Must be a multiple of 57 to get complete base64 lines
+    """
+    from email.mime.base import MIMEBase
+    maintype, subtype = guess_type(filename)
+    attachement = MIMEBase(maintype, subtype)
+    attachement['Content-Transfer-Encoding'] = 'base64'
+    attachement.add_header('Content-Disposition', 'attachment', filename=name or filename)
+    # no payload: only headers and the empty line
+    yield _smtp_data(attachement.as_string())
+    with open(filename, 'rb') as fp:
+        chunk = fp.read(chunk_size)
+        while chunk:
+            # base64 lines never start with a dot
+            yield base64.encodebytes(chunk).replace(b'\n', b'\r\n')
+            chunk = fp.read(chunk_size)
+
+
+class StreamingMessage(object):
+    """
+    A message whose attachments are encoded by chunks straight from disk while it is sent (see send_stream).
+    Neither the attachments nor the whole message string are ever held in memory.
+    
+    Iterate over it to get the message as SMTP DATA bytes. It can be iterated many times (e.g. to send it again).
+    """
+    
+    def __init__(self, message, attachements, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        @param message: a multipart message, without attachments
+        @param attachements: the list of files to attach to the message
+        @param chunk_size: the number of bytes of attachments read at once
+        """
+        self.message = message
+        self.attachements = list(attachements)
+        self.chunk_size = chunk_size
+        import uuid
+        self.message.set_boundary("===============%s==" % uuid.uuid4().hex)
+    
+    def __iter__(self):
+        boundary = self.message.get_boundary()
+        text = self.message.as_string()
+        # keep headers and body parts (without closing delimiter and the line break before it)
+        if self.message.get_payload():
+            head = text[:text.rindex("--%s--" % boundary) - 1]
+        else:
+            head = text[:text.index("--%s" % boundary) - 1]
+        yield _smtp_data(head)
+        for attachement in self.attachements:
+            LOGGER.debug("stream attachement from file " + str(attachement))
+            yield _smtp_data("\n--%s\n" % boundary)
+            for chunk in iter_attachment(attachement, os.path.basename(attachement), self.chunk_size):
+                yield chunk
+        yield _smtp_data("\n--%s--\n" % boundary)
+
+
+def send_stream(smtp, from_addr, to_addrs, msg):
+    """
+    Like smtplib.SMTP.sendmail, except message data is sent by chunks from an iterable of bytes 
+    (already CRLF terminated and dot-stuffed like a StreamingMessage).
+    
+    Return the dictionary of refused recipients
+    """
+    import smtplib
+    smtp.ehlo_or_helo_if_needed()
+    code, resp = smtp.mail(from_addr)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+    refused = {}
+    for addr in to_addrs:
+        code, resp = smtp.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(to_addrs):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, resp = smtp.docmd("data")
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    # the end of data is sent with the last chunk (a small write on its own is delayed by Nagle algorithm)
+    previous = b""
+    for chunk in msg:
+        if previous:
+            smtp.send(previous)
+        previous = chunk
+    smtp.send(previous + b".\r\n")
+    code, resp = smtp.getreply()
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+# asyncio API: same configuration and messages, sent over asyncio streams (asyncio is only imported when used)
+
+# default number of messages sent at once (so of SMTP connections) by an AsyncSMTPPool
+DEFAULT_CONCURRENCY = 4
+
+class AsyncSMTPConnection(object):
+    """
+    Minimal SMTP client over asyncio streams: EHLO, STARTTLS and AUTH PLAIN (if configured like SMTPPool.connect), 
+    MAIL, RCPT, DATA and QUIT. Errors are smtplib exceptions. 
+    
+    The connection is closed on any error but server error replies (then it is still usable).
+    """
+    
+    def __init__(self, config):
+        """
+        @param config: the SMTPConfig to connect with
+        """
+        self.config = config
+        self.reader = self.writer = None
+    
+    @property
+    def closed(self):
+        return self.writer is None
+    
+    async def reply(self):
+        """
+        Read a (possibly multi-line) reply and return (code, message)
+        """
+        import smtplib
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                break
+        try:
+            code = int(line[:3])
+        except ValueError:
+            code = -1
+        return code, b"\n".join(lines)
+    
+    async def command(self, command):
+        """
+        Send a command line and return its reply (code, message)
+        """
+        self.writer.write(command.encode('ascii') + b"\r\n")
+        await self.writer.drain()
+        return await self.reply()
+    
+    async def connect(self):
+        import asyncio, smtplib
+        LOGGER.debug("open asyncio SMTP connection to %s:%s" % (self.config.host, self.config.port))
+        self.reader, self.writer = await asyncio.open_connection(self.config.host, self.config.port)
+        try:
+            code, message = await self.reply()
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, message)
+            await self.ehlo()
+            if self.config.username:
+                if self.config.secure is not None:
+                    LOGGER.debug("start TLS")
+                    code, message = await self.command("STARTTLS")
+                    if code != 220:
+                        raise smtplib.SMTPNotSupportedError("STARTTLS refused: %d %s" % (code, message))
+                    await self.writer.start_tls(_starttls_context(self.config.secure, self.config.verify), server_hostname=self.config.host)
+                    await self.ehlo()
+                credentials = ("\0%s\0%s" % (self.config.username, self.config.password)).encode('utf_8')
+                code, message = await self.command("AUTH PLAIN " + base64.b64encode(credentials).decode('ascii'))
+                if code != 235:
+                    raise smtplib.SMTPAuthenticationError(code, message)
+        except BaseException:
+            self.close()
+            raise
+        return self
+    
+    async def ehlo(self):
+        import smtplib
+        code, message = await self.command("EHLO localhost")
+        if code != 250:
+            code, message = await self.command("HELO localhost")
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, message)
+    
+    async def sendmail(self, from_addr, to_addrs, msg):
+        """
+        Like smtplib.SMTP.sendmail, for msg a string or a StreamingMessage. Return the dictionary of refused recipients
+        """
+        import smtplib
+        try:
+            code, message = await self.command("MAIL FROM:%s" % smtplib.quoteaddr(from_addr))
+            if code != 250:
+                await self.command("RSET")
+                raise smtplib.SMTPSenderRefused(code, message, from_addr)
+            refused = {}
+            for addr in to_addrs:
+                code, message = await self.command("RCPT TO:%s" % smtplib.quoteaddr(addr))
+                if code not in (250, 251):
+                    refused[addr] = (code, message)
+            if len(refused) == len(to_addrs):
+                await self.command("RSET")
+                raise smtplib.SMTPRecipientsRefused(refused)
+            code, message = await self.command("DATA")
+            if code != 354:
+                await self.command("RSET")
+                raise smtplib.SMTPDataError(code, message)
+            if isinstance(msg, StreamingMessage):
+                for chunk in msg:
+                    self.writer.write(chunk)
+                    await self.writer.drain()
+            else:
+                data = _smtp_data(msg)
+                self.writer.write(data if data.endswith(b"\r\n") else data + b"\r\n")
+            self.writer.write(b".\r\n")
+            await self.writer.drain()
+            code, message = await self.reply()
+            if code != 250:
+                await self.command("RSET")
+                raise smtplib.SMTPDataError(code, message)
+            return refused
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise
+        except BaseException:
+            self.close()
+            raise
+    
+    async def quit(self):
+        try:
+            await self.command("QUIT")
+        except Exception:
+            pass
+        self.close()
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class AsyncSMTPPool(object):
+    """
+    asyncio counterpart of SMTPPool: at most concurrency messages are sent at once, over persistent connections 
+    keyed by host, port and credentials. Each message has a timeout. 
+    
+    It must only be used within a single event loop, close it before the loop ends.
+    """
+    
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, idle_timeout=60):
+        """
+        @param concurrency: maximum number of messages sent at once (so of open connections)
+        @param idle_timeout: number of seconds after which an idle connection is not reused anymore
+        """
+        self.concurrency = concurrency
+        self.idle_timeout = idle_timeout
+        # key => list of (connection, last used time)
+        self._idle = {}
+        self._semaphore = None
+    
+    def _key(self, config):
+        return (config.host, config.port, config.username, config.password, config.secure, config.verify)
+    
+    def _acquire(self, config):
+        now = time.time()
+        connections = self._idle.get(self._key(config), [])
+        while connections:
+            connection, last_used = connections.pop()
+            if now - last_used < self.idle_timeout and not connection.closed:
+                return connection
+            connection.close()
+        return None
+    
+    def _release(self, config, connection):
+        connections = self._idle.setdefault(self._key(config), [])
+        if len(connections) < self.concurrency:
+            connections.append((connection, time.time()))
+        else:
+            connection.close()
+    
+    async def sendmail(self, config, from_addr, to_addrs, msg, timeout=None):
+        """
+        Send msg (a string or a StreamingMessage) with a pooled connection. Reconnect once if the server closed the connection.
+        
+        @param timeout: number of seconds to send the message (connection included). Default is config timeout. 
+        On timeout, asyncio.TimeoutError is raised
+        
+        Return the dictionary of refused recipients (like smtplib.SMTP.sendmail)
+        """
+        import asyncio
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await asyncio.wait_for(self._sendmail(config, from_addr, to_addrs, msg), 
+                                          config.timeout if timeout is None else timeout)
+    
+    async def _sendmail(self, config, from_addr, to_addrs, msg):
+        import smtplib
+        connection = self._acquire(config)
+        if connection is not None:
+            try:
+                return await self._send(config, connection, from_addr, to_addrs, msg)
+            except smtplib.SMTPServerDisconnected:
+                LOGGER.debug("pooled SMTP connection was closed, reconnect")
+        connection = await AsyncSMTPConnection(config).connect()
+        return await self._send(config, connection, from_addr, to_addrs, msg)
+    
+    async def _send(self, config, connection, from_addr, to_addrs, msg):
+        try:
+            return await connection.sendmail(from_addr, to_addrs, msg)
+        finally:
+            # still usable after server error replies
+            if not connection.closed:
+                self._release(config, connection)
+    
+    async def close(self):
+        """
+        Close all idle connections
+        """
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                await connection.quit()
+
+
+async def send_email_async(to_addrs, subject, text_body=None, html_body=None, attachements=[], pool=None, stream=False, timeout=None):
+    """
+    asyncio counterpart of send_email. It uses mylogging SMTPHandler default configuration (section handler_mail, option args)
+    
+    @param pool: the AsyncSMTPPool to get connection from. Default is a new connection, closed once sent
+    @param timeout: number of seconds to send the message. Default is SMTPHandler timeout
+    (other parameters: see send_email)
+    
+    Return the dictionary of refused recipients (empty if all were accepted)
+    """
+    config = get_smtp_config()
+    to_addrs, message = build_message(config.from_addr, to_addrs, subject, text_body, html_body, attachements, stream)
+    if pool is not None:
+        return await pool.sendmail(config, config.from_addr, to_addrs, message if stream else message.as_string(), timeout)
+    pool = AsyncSMTPPool(1)
+    try:
+        return await pool.sendmail(config, config.from_addr, to_addrs, message if stream else message.as_string(), timeout)
+    finally:
+        await pool.close()
+
+
+async def send_emails_async(messages, concurrency=DEFAULT_CONCURRENCY, timeout=None, pool=None):
+    """
+    asyncio counterpart of send_emails: send many emails concurrently over pooled SMTP connections.
+    Messages are only built when they are about to be sent.
+    
+    @param messages: an iterable of dictionaries of send_email keyword arguments (to_addrs, subject, text_body, html_body, attachements, stream)
+    @param concurrency: number of messages sent at once (if pool is set, its own concurrency limit applies too)
+    @param timeout: number of seconds to send each message. Default is SMTPHandler timeout
+    @param pool: the AsyncSMTPPool to get connections from. Default is a new pool, closed once all messages are sent
+    
+    Return a list with, for each message (in the same order), the dictionary of refused recipients (empty if all were accepted) 
+    or the exception raised while sending it (asyncio.TimeoutError on timeout).
+    """
+    import asyncio
+    config = get_smtp_config()
+    # message index => result
+    results = {}
+    # shared by all senders: each takes the next message when it is done with its previous one
+    todo = enumerate(messages)
+    
+    async def sender():
+        for i, kwargs in todo:
+            try:
+                to_addrs, message = build_message(config.from_addr, **kwargs)
+                if not isinstance(message, StreamingMessage):
+                    message = message.as_string()
+                results[i] = await current_pool.sendmail(config, config.from_addr, to_addrs, message, timeout)
+            except Exception as e:
+                LOGGER.warning("Could not send email %r: %s" % (kwargs.get('subject'), str(e) or e.__class__.__name__))
+                results[i] = e
+    
+    current_pool = pool or AsyncSMTPPool(concurrency)
+    try:
+        await asyncio.gather(*[sender() for _ in range(concurrency)])
+    finally:
+        if pool is None:
+            await current_pool.close()
+    return [results[i] for i in range(len(results))]
+
+
+# outbox: messages are spooled to disk then delivered by a background thread (or 'python -m myPyApps drain-outbox')
+
+# seconds between two delivery rounds of the outbox sender thread
+DEFAULT_OUTBOX_INTERVAL = 1.0
+
+class SpooledMessage(object):
+    """
+    Message data (SMTP DATA bytes) of an outbox file, read by chunks each time it is iterated
+    """
+    
+    def __init__(self, filename, offset, chunk_size=65536):
+        self.filename = filename
+        self.offset = offset
+        self.chunk_size = chunk_size
+    
+    def __iter__(self):
+        with open(self.filename, 'rb') as fp:
+            fp.seek(self.offset)
+            chunk = fp.read(self.chunk_size)
+            while chunk:
+                yield chunk
+                chunk = fp.read(self.chunk_size)
+
+
+class Outbox(object):
+    """
+    Persistent maildir-like spool of emails: put() writes a message in tmp/ then atomically moves it into new/, 
+    so it takes no SMTP round trip and a message survives the process. deliver() (or the sender thread, see start) 
+    claims due messages by moving them into cur/, sends them and removes them. 
+    
+    A failed message goes back into new/ with its number of attempts and next attempt time in its name 
+    (exponential backoff). After max_attempts, or on a permanent error (5xx reply), it is moved into dead/.
+    
+    Several processes may deliver the same outbox: a message is only claimed by one of them.
+    """
+    
+    def __init__(self, directory, config=None, pool=POOL, max_attempts=5, backoff=30, max_backoff=3600, fsync=False):
+        """
+        @param directory: the outbox folder (created if missing)
+        @param config: the SMTPConfig to deliver with. Default is mylogging SMTPHandler configuration (see get_smtp_config)
+        @param pool: the SMTPPool to get connections from
+        @param max_attempts: number of delivery attempts before a message is moved into dead/
+        @param backoff: seconds before the first retry, doubled at each attempt
+        @param max_backoff: maximum number of seconds between two attempts
+        @param fsync: set to True to sync message files to disk before they are queued (slower, survives a system crash)
+        """
+        self.directory = directory
+        self.config = config
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fsync = fsync
+        for folder in ('tmp', 'new', 'cur', 'dead'):
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # delivery metrics of this instance
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+    
+    def _path(self, folder, name=''):
+        return os.path.join(self.directory, folder, name)
+    
+    def _unique_name(self):
+        import socket
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        host = socket.gethostname().replace('/', '_').replace('#', '_')
+        return "%d.%d_%d.%s" % (time.time_ns(), os.getpid(), counter, host)
+    
+    @staticmethod
+    def parse_name(name):
+        """
+        Return (queued time, number of attempts, next attempt time) of a message file name
+        """
+        parts = name.split('#')
+        queued = int(parts[0].split('.', 1)[0]) / 1e9
+        if len(parts) < 3:
+            return queued, 0, queued
+        return queued, int(parts[1]), int(parts[2]) / 1e3
+    
+    def put(self, from_addr, to_addrs, msg):
+        """
+        Queue a message. Return its file name.
+        
+        @param msg: a string, bytes (with CRLF line endings, like email.policy.SMTP) or a StreamingMessage
+        """
+        import json
+        name = self._unique_name()
+        tmp_path = self._path('tmp', name)
+        with open(tmp_path, 'wb') as fp:
+            fp.write(json.dumps({'from': from_addr, 'to': list(to_addrs)}).encode('utf_8') + b"\n")
+            if isinstance(msg, (str, bytes)):
+                data = _smtp_data(msg)
+                fp.write(data if data.endswith(b"\r\n") else data + b"\r\n")
+            else:
+                for chunk in msg:
+                    fp.write(chunk)
+            if self.fsync:
+                fp.flush()
+                os.fsync(fp.fileno())
+        os.rename(tmp_path, self._path('new', name))
+        self._wake.set()
+        return name
+    
+    def read(self, filename):
+        """
+        Return (from address, to addresses, SpooledMessage) of a message file
+        """
+        import json
+        with open(filename, 'rb') as fp:
+            envelope = json.loads(fp.readline().decode('utf_8'))
+            offset = fp.tell()
+        return envelope['from'], envelope['to'], SpooledMessage(filename, offset)
+    
+    def pending(self):
+        """
+        Return the file names of queued messages (not claimed by a sender), oldest first
+        """
+        return sorted(os.listdir(self._path('new')))
+    
+    def dead_letters(self):
+        """
+        Return the file names of messages that couldn't be delivered
+        """
+        return sorted(os.listdir(self._path('dead')))
+    
+    def recover(self, claim_timeout=600):
+        """
+        Queue again messages claimed more than claim_timeout seconds ago (by a sender that died)
+        """
+        limit = time.time() - claim_timeout
+        for name in os.listdir(self._path('cur')):
+            try:
+                if os.stat(self._path('cur', name)).st_mtime < limit:
+                    LOGGER.debug("recover outbox message %r" % name)
+                    os.rename(self._path('cur', name), self._path('new', name))
+            except FileNotFoundError:
+                pass
+    
+    def deliver(self):
+        """
+        Try to send all due messages once. Return the number of delivered messages
+        """
+        delivered = 0
+        now = time.time()
+        for name in self.pending():
+            if self._stop.is_set() and self._thread is not None:
+                break
+            queued, attempts, next_attempt = self.parse_name(name)
+            if next_attempt > now:
+                continue
+            claimed = self._path('cur', name)
+            try:
+                os.rename(self._path('new', name), claimed)
+            except FileNotFoundError:
+                # claimed by another sender
+                continue
+            os.utime(claimed)
+            if self._send(name, claimed, queued, attempts + 1):
+                delivered += 1
+        return delivered
+    
+    def _send(self, name, claimed, queued, attempt):
+        try:
+            from_addr, to_addrs, message = self.read(claimed)
+            refused = self.pool.sendmail(self.config or get_smtp_config(), from_addr, to_addrs, message)
+        except Exception as e:
+            self._failed(name, claimed, attempt, e)
+            return False
+        os.remove(claimed)
+        if refused:
+            LOGGER.warning("Outbox message %r refused recipients: %r" % (name, refused))
+        latency = time.time() - queued
+        with self._lock:
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        return True
+    
+    def _failed(self, name, claimed, attempt, error):
+        import smtplib
+        base = name.split('#', 1)[0]
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            codes = [code for code, _ in error.recipients.values()]
+        else:
+            codes = [getattr(error, 'smtp_code', 0)]
+        # warning only: an error could be sent by email again
+        if attempt >= self.max_attempts or all(code >= 500 for code in codes):
+            LOGGER.warning("Outbox message %r moved to dead letters after %d attempt(s): %s" % (base, attempt, error))
+            os.rename(claimed, self._path('dead', "%s#%d" % (base, attempt)))
+            with self._lock:
+                self.dead += 1
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        LOGGER.warning("Outbox message %r not sent (attempt %d), retry in %d seconds: %s" % (base, attempt, delay, error))
+        os.rename(claimed, self._path('new', "%s#%d#%d" % (base, attempt, (time.time() + delay) * 1e3)))
+        with self._lock:
+            self.retried += 1
+    
+    def metrics(self):
+        """
+        Return a dictionary of outbox metrics: pending (queued and claimed messages), dead (dead letters), 
+        oldest (age in seconds of the oldest pending message), and delivery metrics of this instance: 
+        sent, retried, dead_lettered, latency_avg and latency_max (seconds from put to delivery)
+        """
+        now = time.time()
+        pending = self.pending() + sorted(os.listdir(self._path('cur')))
+        with self._lock:
+            return {
+                'pending': len(pending),
+                'dead': len(self.dead_letters()),
+                'oldest': max([now - self.parse_name(name)[0] for name in pending] or [0]),
+                'sent': self.sent,
+                'retried': self.retried,
+                'dead_lettered': self.dead,
+                'latency_avg': self.sent and self.latency_total / self.sent,
+                'latency_max': self.latency_max,
+            }
+    
+    def start(self, interval=DEFAULT_OUTBOX_INTERVAL):
+        """
+        Start delivering messages in a background thread: every interval seconds, and as soon as a message is queued.
+        Return self
+        """
+        if self._thread is None:
+            self.recover()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval, ), name="Outbox-%s" % os.path.basename(self.directory))
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        """
+        Stop the sender thread once its current message is handled. Queued messages stay in the outbox.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self, interval):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.deliver()
+            except Exception:
+                LOGGER.warning("Outbox delivery failed", exc_info=True)
+            self._wake.wait(interval)
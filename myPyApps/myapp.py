@@ -18,13 +18,30 @@ if __name__ == "__main__":
 """
 
 
-import os, glob, sys
+import sys, os
 from os.path import basename, splitext, join, dirname
 
-from myPyApps import myconfig, mylogging, myargparse
+from myPyApps import myconfig, mylogging, myoptions, myprofile
 
 LOGGER = mylogging.getLogger(__name__)
 
+# application of a MyApp.map worker process (set once by the pool initializer)
+_worker_app = None
+
+def _init_worker(app):
+    global _worker_app
+    _worker_app = app
+    # pool workers exit without logging shutdown: write buffered records
+    from multiprocessing.util import Finalize
+    Finalize(None, mylogging.flush_logging, exitpriority=10)
+
+def _call_worker(task):
+    func, item = task
+    # application methods are sent by name, the worker has its own copy of the application
+    if isinstance(func, str):
+        func = getattr(_worker_app, func)
+    return func(item)
+
 class MyApp():
     """
     Parent class to construct my application from.
@@ -37,7 +54,10 @@ class MyApp():
                  config_path=myconfig.DEFAULT_PATH, 
                  config_filter=[],
                  logging_email=True, 
-                 options={}):
+                 options={},
+                 config_cache=None,
+                 config_workers=None,
+                 config_snapshot=None):
         """
         This initialize the application by getting all configuration files
         
@@ -50,72 +70,146 @@ class MyApp():
             - a dictionary (empty for default values).
             - a Namespace instance. Tipicaly  using myargumentparser (e.g myargumentparser.MyArgumentParser.parse_args())
             Handled keys/options are: 'quiet' (default: False), 'verbose' (default: False) and 'config' (default: []). If a key/option is missing, default will be used
+        @param config_cache: an optional myconfig.ConfigCache used to load all configurations (logging included)
+        @param config_workers: if set, all configurations are loaded at startup by this number of threads. Default is 'config-workers' option.
+        @param config_snapshot: a myconfig.SharedSnapshot file name. If it exists, configurations are read from it instead of parsing 
+        their files (it replaces config_cache). Else all configurations are loaded and written into it (and again when they are reloaded).
+        Default is 'config-snapshot' option.
+        
+        Configurations are only loaded on first access to self.CONFIGS (except the default one). Use self.CONFIGS.load_all() to load all of them.
+        
+        Startup phases (and configuration loads, handlers construction) are timed in self.profile (a myprofile.Profile): 
+        it is the active profile until the end of the constructor, then again while run() calls init().
         """
         
+        self.profile = myprofile.Profile().start()
         self.config_default = config_default
         self.options = options
+        self.config_cache = config_cache
+        self.config_workers = config_workers or self.get_option(myoptions.CONFIG_WORKERS, None, warn=False)
+        self.profile_startup = self.get_option(myoptions.PROFILE_STARTUP, False, warn=False)
+        self.workers = self.get_option(myoptions.WORKERS, None, warn=False)
+        self.config_snapshot = config_snapshot or self.get_option(myoptions.CONFIG_SNAPSHOT, None, warn=False)
+        self.snapshot = None
+        self.cprofile = None
+        if self.profile_startup:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        
+        with self.profile.span("find configuration files"):
+            # use options to initialize config_path
+            self.config_path = self.get_option(myoptions.CONFIG, [], warn=False)
+            # add all other config_path
+            self.config_path.extend(config_path)
+            module_path = join(dirname(__import__(self.__module__).__file__), 'config')
+            LOGGER.debug("add module configuration folder %r" % module_path)
+            self.config_path.append(module_path)
+            LOGGER.debug("remove duplicate configuration path")
+            self.config_path = myconfig.unique_paths(self.config_path)
+            LOGGER.debug("index configuration files")
+            self.config_index = myconfig.ConfigIndex(self.config_path)
         
-        # use options to initialize config_path
-        self.config_path = self.get_option(myargparse.CONFIG, [])
-        # add all other config_path
-        self.config_path.extend(config_path)
-        module_path = join(dirname(__import__(self.__module__).__file__), 'config')
-        LOGGER.debug("add module configuration folder %r" % module_path)
-        self.config_path.append(module_path)
-        LOGGER.debug("remove duplicate configuration path")
-        self.config_path = list(set(self.config_path))
+        if self.config_snapshot and os.path.isfile(self.config_snapshot):
+            with self.profile.span("attach configuration snapshot"):
+                try:
+                    self.snapshot = myconfig.SharedSnapshot(self.config_snapshot)
+                    self.config_cache = self.snapshot
+                except myconfig.MyConfigParserException as e:
+                    LOGGER.warn("Ignore configuration snapshot: %s" % e)
         
         # init logging. To send emails, quiet must be false AND logging_email param must be true 
         LOGGER.info("Logging configuration")
-        mylogging.configure_logging(mail=not self.get_option(myargparse.QUIET, False) and logging_email, verbose=self.get_option(myargparse.VERBOSE, False), config_path=self.config_path)
+        with self.profile.span("configure logging"):
+            mylogging.configure_logging(mail=not self.get_option(myoptions.QUIET, False, warn=False) and logging_email, verbose=self.get_option(myoptions.VERBOSE, False, warn=False), 
+                                        config_path=self.config_path, config_cache=self.config_cache, config_index=self.config_index)
         
         LOGGER.info("Application configuration")
         LOGGER.debug("initialize application with config_default %r, config_path %r and config_filter %r" % (self.config_default, self.config_path, config_filter))
-        self.CONFIGS = {}
+        # configurations are loaded on first access
+        self.CONFIGS = myconfig.MyConfigs(self.config_path, cache=self.config_cache, index=self.config_index)
         self.CONFIG = None
         self.DEFAULTS = None
 
         LOGGER.debug("get all configuration names that have a default file")        
-        names = []
-        for path in self.config_path:
-            for f in glob.glob(os.path.join(path, '*' + myconfig.DEFAULT_DEFAULT_EXT)):
-                conf = os.path.splitext(os.path.basename(f))[0]
-                if conf in config_filter:
-                    LOGGER.info("Skip config %r" % conf)
-                    continue
-                if conf in names:
-                    LOGGER.warn("Duplicate default configuration for %r from %r" % (conf, f))
-                    continue
-                LOGGER.debug("found configuration %r from %r" % (conf, f))
-                names.append(conf)
-        
-        LOGGER.debug("load configurations")        
-        for name in names:
-            self.CONFIGS[name] = myconfig.MyConfigParser(name, config_path=self.config_path)
-            if name == config_default:
-                LOGGER.debug("%r is the default configuration" % conf)
-                self.CONFIG = self.CONFIGS[name]
-                self.DEFAULTS = self.CONFIG.defaults()
+        for conf in self.config_index.names():
+            if conf in config_filter:
+                LOGGER.info("Skip config %r" % conf)
+                continue
+            default_files = self.config_index.default_files(conf)
+            for f in default_files[1:]:
+                LOGGER.warn("Duplicate default configuration for %r from %r" % (conf, f))
+            LOGGER.debug("found configuration %r from %r" % (conf, default_files[0]))
+            self.CONFIGS.add(conf)
+        
+        if self.config_workers:
+            LOGGER.debug("load all configurations with %d threads" % self.config_workers)
+            with self.profile.span("load all configurations"):
+                self.CONFIGS.load_all(self.config_workers)
+        
+        if self.config_snapshot and self.snapshot is None:
+            with self.profile.span("write configuration snapshot"):
+                self.write_config_snapshot()
+            for config in self.CONFIGS.values():
+                config.add_callback(lambda config, changes: self.write_config_snapshot())
+        
+        if config_default in self.CONFIGS:
+            LOGGER.debug("%r is the default configuration" % config_default)
+            with self.profile.span("load default configuration"):
+                self.CONFIG = self.CONFIGS[config_default]
+            self.DEFAULTS = self.CONFIG.defaults()
                 
         if not self.CONFIGS:
             LOGGER.warn("No configuration loaded")
         if not self.CONFIG:
             LOGGER.warn("No default configuration loaded")
             self.DEFAULTS = {}
+        
+        # startup is done (run() makes the profile active again while init() runs)
+        self.profile.stop()
             
-        if self.get_option(myargparse.DUMP_CONFIG):
-            for key, config in self.CONFIGS.iteritems():
+        if self.get_option(myoptions.DUMP_CONFIG, None, warn=False):
+            for key, config in self.CONFIGS.load_all(self.config_workers).items():
                 stars = "*" * 10
                 print("%s %s %s\n" % (stars, key, stars))
                 print(config, "")
             sys.exit(1)
+        
+        if self.get_option(myoptions.CHECK_CONFIG, None, warn=False):
+            problems = self.CONFIGS.validate(self.config_workers)
+            for problem in problems:
+                print(problem)
+            # stdout only gets problems
+            print("%d configuration problem(s)" % len(problems), file=sys.stderr)
+            sys.exit(problems and 1 or 0)
+    
+    def write_config_snapshot(self):
+        """
+        Load all configurations and write them into the 'config_snapshot' file. Return the snapshot generation
+        """
+        LOGGER.debug("write configuration snapshot %r" % self.config_snapshot)
+        return myconfig.SharedSnapshot.write(self.config_snapshot, self.CONFIGS.load_all(self.config_workers).values())
     
-    def get_option(self, key, default=None):
+    def refresh_configs(self):
+        """
+        If configurations are read from a snapshot that has a new generation, attach it and reload loaded configurations.
+        Return True if they were reloaded
+        """
+        if self.snapshot is None or not self.snapshot.refresh():
+            return False
+        LOGGER.debug("reload configurations from snapshot generation %d" % self.snapshot.generation)
+        for name in self.CONFIGS:
+            if self.CONFIGS.is_loaded(name):
+                self.CONFIGS[name].reload()
+        return True
+    
+    def get_option(self, key, default=None, warn=True):
         """
         Get the option value for the given key.
         
         @param key: the key to look for
         @param default: the default value if key is not found. If set to None and the option it will throw an AttributeError exception
+        @param warn: log a warning if the key is not found (framework options are optional, they are read with warn=False)
         @raise AttributeError: if the key is not found and default is None
         
         Returns the value for key or default if not found (default is None by default) 
@@ -129,7 +223,8 @@ class MyApp():
             if hasattr(self.options, '__getitem__'):
                 return self.options.__getitem__(key)
         except KeyError:
-            LOGGER.warn('Could not find option %r, use default %r' % (key, default))
+            if warn:
+                LOGGER.warn('Could not find option %r, use default %r' % (key, default))
             return default
         # if couldn't find anything
         raise Exception("options type %s doesn't support any getter method" % self.options.__class__)
@@ -148,11 +243,90 @@ class MyApp():
     
     def run(self, *args, **kwargs):
         """
-        The function run the main() function with its arguments and log unhandled exceptions
+        The function run the main() function with its arguments and log unhandled exceptions.
+        Logging is flushed before returning (all queued records are handled in queue mode).
+        
+        With 'profile-startup' option, it displays startup phases timing once init() is done and exits without calling main().
         """
         try:
-            self.init()
+            # init() is the last startup phase
+            self.profile.start()
+            try:
+                with self.profile.span("init"):
+                    self.init()
+            finally:
+                self.profile.stop()
+            if self.profile_startup:
+                self.print_startup_profile()
+                sys.exit(0)
             return self.main(*args, **kwargs)
         except Exception as e:
             LOGGER.exception("Exception raised: " + str(e))
-            raise e
\ No newline at end of file
+            raise e
+        finally:
+            mylogging.flush_logging()
+    
+    def map(self, func, items, workers=None, chunksize=None, ordered=True):
+        """
+        Call func on each item in a pool of worker processes and return the list of results.
+        
+        Workers are started once per call. They are forked from this process, so they already have the loaded 
+        configurations (self.CONFIGS) and logging setup (use mylogging collector mode to have a single process writing logs).
+        On platforms without fork, the application must be picklable.
+        An exception raised by func is raised again here at once (so run() logs it, with the worker traceback): 
+        workers are terminated and remaining items are not handled.
+        
+        @param func: a function of one argument, or a method of this application (only its name is sent to workers)
+        @param items: an iterable of items
+        @param workers: number of worker processes. Default is 'workers' option, else the number of CPUs. 
+        If 1, items are handled in this process.
+        @param chunksize: number of items sent to a worker at once. Default is to split items in about 4 chunks per worker.
+        @param ordered: set to False to get results in completion order
+        """
+        workers = workers or self.workers or os.cpu_count() or 1
+        name = getattr(func, '__name__', repr(func))
+        if workers == 1:
+            with myprofile.span("map %s" % name):
+                return [func(item) for item in items]
+        
+        import multiprocessing
+        if getattr(func, '__self__', None) is self:
+            func = func.__name__
+        if chunksize is None:
+            if not hasattr(items, '__len__'):
+                items = list(items)
+            chunksize, extra = divmod(len(items), workers * 4)
+            chunksize = chunksize + 1 if extra else chunksize or 1
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        # forked workers must not write records buffered by this process again
+        mylogging.flush_logging()
+        LOGGER.debug("map %s with %d processes" % (name, workers))
+        with myprofile.span("map %s" % name):
+            pool = context.Pool(workers, initializer=_init_worker, initargs=(self,))
+            try:
+                tasks = ((func, item) for item in items)
+                if ordered:
+                    results = list(pool.imap(_call_worker, tasks, chunksize))
+                else:
+                    results = list(pool.imap_unordered(_call_worker, tasks, chunksize))
+                # let workers exit normally (and flush their logging)
+                pool.close()
+            except:
+                # remaining items are not handled. A worker killed while sending records to the collector 
+                # can't hang this process: flushing logging is bounded by a timeout
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        return results
+    
+    def print_startup_profile(self):
+        """
+        Print startup phases timing. If 'profile-startup' option is a file name, save the cProfile dump into it.
+        """
+        print(self.profile.format())
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            if isinstance(self.profile_startup, str):
+                self.cprofile.dump_stats(self.profile_startup)
+                print("cProfile dump saved into %r" % self.profile_startup)
\ No newline at end of file
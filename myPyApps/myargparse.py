@@ -16,15 +16,11 @@ namespace = parser.parse_args()
 
 from argparse import ArgumentParser
 from myPyApps import mylogging
+from myPyApps.myoptions import QUIET, VERBOSE, CONFIG, DUMP_CONFIG, CHECK_CONFIG, CONFIG_WORKERS, PROFILE_STARTUP, WORKERS, CONFIG_SNAPSHOT
 import os
 
 LOGGER = mylogging.getLogger(__name__)
 
-QUIET = "quiet"
-VERBOSE = "verbose"
-CONFIG = "config"
-DUMP_CONFIG = "dump-config"
-
 
 class MyArgumentParser(ArgumentParser):
     
@@ -35,6 +31,12 @@ class MyArgumentParser(ArgumentParser):
             - quiet: disable logging emails
             - verbose: set stdout to debug
             - config: set a new path to the config path (with highest priority)
+            - dump-config: display all configurations and exit
+            - check-config: display all options and sections of user configurations that are not in default ones and exit
+            - config-workers: load all configurations at startup with this number of threads
+            - profile-startup: display startup phases timing (and optionally save a cProfile dump in FILE) and exit
+            - workers: number of worker processes used by MyApp.map
+            - config-snapshot: read configurations from this snapshot file, or write them into it if it doesn't exist
         
         Return (options, args) or exit if there is an issue
         """
@@ -48,13 +50,23 @@ class MyArgumentParser(ArgumentParser):
                         help="run in dry mode. In case of use as myapp init parser parameter, it sets a new path to the config path (with highest priority)")
         self.add_argument("--dump-config", action="store_true", dest=DUMP_CONFIG, default=False,
                         help="display all configurations and exit")
+        self.add_argument("--check-config", action="store_true", dest=CHECK_CONFIG, default=False,
+                        help="display all options and sections of user configurations that are not in default ones and exit (with status 1 if any)")
+        self.add_argument("--config-workers", type=int, dest=CONFIG_WORKERS, default=None, metavar="N",
+                        help="load all configurations at startup with N threads")
+        self.add_argument("--profile-startup", nargs="?", const=True, dest=PROFILE_STARTUP, default=False, metavar="FILE",
+                        help="display startup phases timing (until init() is done) and exit. If FILE is set, also save a cProfile dump into it")
+        self.add_argument("--workers", type=int, dest=WORKERS, default=None, metavar="N",
+                        help="number of worker processes used by MyApp.map (default: number of CPUs)")
+        self.add_argument("--config-snapshot", dest=CONFIG_SNAPSHOT, default=None, metavar="FILE",
+                        help="read configurations from FILE without parsing them. If FILE doesn't exist, write all configurations into it")
         
         # parse
-        args = ArgumentParser.parse_args(self, args=None, namespace=None)
+        args = ArgumentParser.parse_args(self, args=args, namespace=namespace)
         
         # validate
         for config in args.config:
             if not os.path.isdir(config):
                 self.error("config options must be valid folders. %r is not" % config)
                 
-        return args
\ No newline at end of file
+        return args
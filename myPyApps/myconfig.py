@@ -8,9 +8,14 @@ It is based on convention over configuration.
 """
 
 
-from configparser import ConfigParser
-import os, sys, io
-from os.path import dirname, abspath, join, isfile
+from configparser import ConfigParser, SectionProxy, NoSectionError, NoOptionError, DEFAULTSECT
+from configparser import Error as ConfigParserError
+from collections import namedtuple
+from collections.abc import MutableMapping
+import os, sys, io, marshal, struct, threading
+from os.path import dirname, abspath, join, isfile, isdir
+
+from myPyApps import myprofile
 
 # will be used before mylogging initialization
 import logging
@@ -30,13 +35,336 @@ class MyConfigParserException(Exception):
 DEFAULT_PATH = [join(os.getenv('USERPROFILE') or os.getenv('HOME'), '.config'), join(abspath(dirname(sys.argv[0])), "config"), join(dirname(__file__), "config")]
 DEFAULT_CFG_EXT = '.cfg'
 DEFAULT_DEFAULT_EXT = '.default'
+DEFAULT_CACHE_DIR = join(os.getenv('XDG_CACHE_HOME') or join(os.getenv('USERPROFILE') or os.getenv('HOME'), '.cache'), 'myPyApps')
+
+DEFAULT_WATCH_INTERVAL = 1.0
+
+# marker for missing fallback argument
+_UNSET = object()
+
+def diff_data(old, new):
+    """
+    Return the differences between two raw configuration data (dictionaries of section => dictionary of option => value)
+    as a dictionary of changed section => set of changed options (added, removed or modified)
+    """
+    changes = {}
+    for section in set(old) | set(new):
+        old_options = old.get(section, {})
+        new_options = new.get(section, {})
+        options = set(option for option in set(old_options) | set(new_options) if old_options.get(option) != new_options.get(option))
+        if options or (section in old) != (section in new):
+            changes[section] = options
+    return changes
+
+class ConfigProblem(namedtuple('ConfigProblem', 'name source section option message')):
+    """
+    A configuration problem found by validation: configuration name, user file (None if unknown), section and option
+    (None if the problem isn't about a section or an option) and message
+    """
+    __slots__ = ()
+    
+    def __str__(self):
+        where = []
+        if self.source:
+            where.append(self.source)
+        if self.option is not None:
+            where.append("option %r of section %r" % (self.option, self.section))
+        elif self.section is not None:
+            where.append("section %r" % self.section)
+        return "[%s] %s%s" % (self.name, "".join(w + ": " for w in where), self.message)
+
+def check_data(name, default_data, data, source=None, default_section=DEFAULTSECT):
+    """
+    Return the list of ConfigProblem of all sections and options of raw configuration data that are not in default_data
+    (both dictionaries of section => dictionary of option => value), in data order
+    
+    @param name: the configuration name
+    @param source: the file data comes from, if any
+    """
+    problems = []
+    default_options = default_data.get(default_section, {})
+    for section, options in data.items():
+        if section != default_section and section not in default_data:
+            problems.append(ConfigProblem(name, source, section, None, "not in default"))
+            continue
+        section_options = default_data.get(section, {})
+        for option in options:
+            if option not in section_options and option not in default_options:
+                problems.append(ConfigProblem(name, source, section, option, "not in default"))
+    return problems
+
+def read_raw(full_path, strict=True, default_section=DEFAULTSECT, optionxform=None):
+    """
+    Parse a single file and return its raw (not interpolated) values as dictionaries of section => dictionary of option => value
+    """
+    parser = ConfigParser(interpolation=None, strict=strict, default_section=default_section)
+    if optionxform is not None:
+        parser.optionxform = optionxform
+    # use read_file to raise Exception if error while loading
+    with open(full_path) as fp:
+        parser.read_file(fp)
+    data = {default_section: dict(parser._defaults)}
+    for section in parser.sections():
+        data[section] = dict(parser._sections[section])
+    return data
+
+def unique_paths(paths):
+    """
+    Return paths without duplicates, keeping the first occurrence of each path (so the order of importance)
+    """
+    result = []
+    for path in paths:
+        if path not in result:
+            result.append(path)
+    return result
+
+
+class ConfigCache(object):
+    """
+    On-disk cache of merged configurations. A cached configuration is only used if its source files 
+    (ordered list of paths with their modification time and size) are unchanged.
+    
+    Number of valid and invalid (or missing) cache lookups are counted in self.hits and self.misses. 
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        @param cache_dir: the folder to store cache files in. Default is myPyApps in user cache folder.
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+    
+    def _filename(self, key):
+        import hashlib
+        digest = hashlib.sha1(repr(key).encode('utf_8')).hexdigest()
+        return join(self.cache_dir, "%s-%s.cache" % (key[0], digest[:16]))
+    
+    def get(self, key, sources):
+        """
+        Return data cached for key if it was stored with the same sources, else None
+        """
+        try:
+            with open(self._filename(key), 'rb') as fp:
+                cached_sources, data = marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            cached_sources = data = None
+        if data is not None and cached_sources == sources:
+            self.hits += 1
+            return data
+        self.misses += 1
+        return None
+    
+    def set(self, key, sources, data):
+        """
+        Store data for key and sources. Failures (e.g. read-only cache folder) are only logged.
+        """
+        filename = self._filename(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write then rename, so that readers never see a partial file
+            tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+            with open(tmp_filename, 'wb') as fp:
+                marshal.dump((sources, data), fp)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            LOGGER.debug("Couldn't write config cache %r: %s" % (filename, e))
+
+class SharedSnapshot(object):
+    """
+    Read-only, memory-mapped file of loaded configurations, written once by a parent process (see write) and
+    attached by its workers or other applications of the host: use it as the cache of MyConfigParser (or MyConfigs, MyApp)
+    and configurations are built without parsing any file, as long as their files didn't change since the snapshot.
+    Each configuration is only unmarshalled on first use, and the mapped pages are shared by all processes.
+
+    Each write increments the snapshot generation and atomically replaces the file. Attached processes keep the mapped
+    generation until refresh(), changed() tells if a new one has been written.
+
+    Number of valid and invalid (or missing) lookups are counted in self.hits and self.misses.
+    """
+    # magic, generation, index length
+    HEADER = struct.Struct('<8sQQ')
+    MAGIC = b'MYPYCFG1'
+
+    def __init__(self, filename):
+        """
+        @param filename: the snapshot file
+        @raise MyConfigParserException: if it isn't a valid snapshot file
+        """
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self._map = None
+        self._index = {}
+        self.refresh()
+
+    @classmethod
+    def read_generation(cls, filename):
+        """
+        Return the generation of snapshot file (0 if it doesn't exist or isn't a snapshot)
+        """
+        try:
+            with open(filename, 'rb') as fp:
+                magic, generation, _ = cls.HEADER.unpack(fp.read(cls.HEADER.size))
+        except (OSError, struct.error):
+            return 0
+        return generation if magic == cls.MAGIC else 0
+
+    @classmethod
+    def write(cls, filename, configs):
+        """
+        Write loaded configurations into snapshot file filename. Return its new generation.
+
+        @param configs: an iterable of MyConfigParser
+        """
+        generation = cls.read_generation(filename) + 1
+        index = {}
+        blobs = []
+        offset = 0
+        for config in configs:
+            blob = marshal.dumps((config.sources, config._raw_data()))
+            index[config._cache_key()] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+        index_blob = marshal.dumps(index)
+        # write then rename, so that attached processes keep a valid mapping and readers never see a partial file
+        tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as fp:
+            fp.write(cls.HEADER.pack(cls.MAGIC, generation, len(index_blob)))
+            fp.write(index_blob)
+            for blob in blobs:
+                fp.write(blob)
+        os.replace(tmp_filename, filename)
+        LOGGER.debug("write %d configurations into snapshot %r (generation %d)" % (len(index), filename, generation))
+        return generation
+
+    def changed(self):
+        """
+        Return True if a new generation has been written since the attached one
+        """
+        return self.read_generation(self.filename) != self.generation
+
+    def refresh(self):
+        """
+        Attach the current generation of the snapshot file. Return True if it changed.
+
+        @raise MyConfigParserException: if it isn't a valid snapshot file
+        """
+        import mmap
+        try:
+            with open(self.filename, 'rb') as fp:
+                snapshot_map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, generation, index_length = self.HEADER.unpack_from(snapshot_map)
+            if magic != self.MAGIC:
+                raise ValueError("bad magic %r" % magic)
+            index = marshal.loads(snapshot_map[self.HEADER.size:self.HEADER.size + index_length])
+        except (OSError, ValueError, EOFError, TypeError, struct.error) as e:
+            raise MyConfigParserException(self.filename, "Couldn't attach config snapshot: %s" % e)
+        if generation == self.generation:
+            snapshot_map.close()
+            return False
+        # previous mapping is released once no data refers to it
+        self._map = snapshot_map
+        self._index = dict((key, (self.HEADER.size + index_length + offset, length)) for key, (offset, length) in index.items())
+        self.generation = generation
+        return True
+
+    def get(self, key, sources):
+        """
+        Return data of key if it was written with the same sources, else None (same as ConfigCache.get)
+        """
+        position = self._index.get(key)
+        if position is not None:
+            offset, length = position
+            snapshot_sources, data = marshal.loads(self._map[offset:offset + length])
+            if snapshot_sources == sources:
+                self.hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    def set(self, key, sources, data):
+        """
+        Do nothing: the snapshot is read-only (see write)
+        """
+        pass
+
+class ConfigIndex(object):
+    """
+    Index of configuration files by name, built with a single scan of each config path folder.
+    It can be shared by all MyConfigParser of an application to avoid probing each file of each path.
+    
+    Files added or removed later are only seen after refresh().
+    """
+    
+    def __init__(self, config_path=DEFAULT_PATH, cfg_ext=DEFAULT_CFG_EXT, default_ext=DEFAULT_DEFAULT_EXT):
+        """
+        @param config_path: path where to find the config files. Sort by order of importance.
+        @param cfg_ext: extension for the user configuration files.
+        @param default_ext: extension for the default configuration files.
+        """
+        if isinstance(config_path, str):
+            config_path = (config_path, )
+        self.config_path = unique_paths(config_path)
+        self.cfg_ext = cfg_ext
+        self.default_ext = default_ext
+        self.refresh()
+    
+    def refresh(self):
+        """
+        Scan config path folders again
+        """
+        # name => ([default files], [cfg files]) in path order
+        index = {}
+        for path in self.config_path:
+            try:
+                with os.scandir(path) as entries:
+                    filenames = sorted(entry.name for entry in entries if entry.is_file())
+            except OSError:
+                LOGGER.debug("skip missing configuration folder %r" % path)
+                continue
+            for filename in filenames:
+                name, ext = os.path.splitext(filename)
+                if ext == self.default_ext:
+                    index.setdefault(name, ([], []))[0].append(join(path, filename))
+                elif ext == self.cfg_ext:
+                    index.setdefault(name, ([], []))[1].append(join(path, filename))
+        # swap at once for readers in other threads
+        self._index = index
+    
+    def names(self):
+        """
+        Return the names of configurations that have a default file, in discovery order
+        """
+        return [name for name, (defaults, _) in self._index.items() if defaults]
+    
+    def default_files(self, name):
+        """
+        Return all default files of configuration name, in path order (only the first one is used)
+        """
+        return list(self._index.get(name, ((), ()))[0])
+    
+    def default_file(self, name):
+        """
+        Return the default file of configuration name, None if there isn't any
+        """
+        defaults = self._index.get(name, ((), ()))[0]
+        return defaults[0] if defaults else None
+    
+    def cfg_files(self, name):
+        """
+        Return the user cfg files of configuration name, in path order (the first one is the most important)
+        """
+        return list(self._index.get(name, ((), ()))[1])
+
 
 class MyConfigParser(ConfigParser, object):
     """
     Main class to build your configuration. It is an extension of SafeConfigParser. 
     """
     
-    def __init__(self, name, config_path=DEFAULT_PATH, cfg_ext=DEFAULT_CFG_EXT, default_ext=DEFAULT_DEFAULT_EXT):
+    def __init__(self, name, config_path=DEFAULT_PATH, cfg_ext=DEFAULT_CFG_EXT, default_ext=DEFAULT_DEFAULT_EXT, cache=None, index=None):
         """
         Create new MyConfigParser that extends ConfigParser.SafeConfigParser
         
@@ -46,80 +374,329 @@ class MyConfigParser(ConfigParser, object):
         Then it will load all user configurations in the respecting order of the list. Overriding default and previous user configuration.   
         @param cfg_ext: extension for the user configuration file.
         @param default_ext: extension for the default configuration file.
+        @param cache: an optional ConfigCache. If set, the merged configuration is loaded from cache when its files didn't change.
+        @param index: an optional ConfigIndex to find files in. If set, config_path, cfg_ext and default_ext are the index ones.
         
         @raise MyConfigParserException: if no default configuration found. 
         """
+        # typed values cache, see _cached
+        self._values = {}
+        self._generation = 0
         ConfigParser.__init__(self)
         
+        if index is not None:
+            config_path, cfg_ext, default_ext = index.config_path, index.cfg_ext, index.default_ext
         self.name = name
         self.cfg_filename = name + cfg_ext
         self.default_filename = name + default_ext
+        self.cache = cache
+        self.index = index
+        # full path => ((modification time, size), raw values) of each loaded file
+        self._files_data = {}
+        self._reload_lock = threading.RLock()
+        self.sources = ()
+        self.callbacks = []
+        self.watcher = None
         self.config_path = config_path
-        if not hasattr(self.config_path, "__iter__"):
-            LOGGER.debug("[%s] convert single config_path to set" % self.name)
+        if isinstance(self.config_path, str):
+            LOGGER.debug("[%s] convert single config_path to list" % self.name)
             self.config_path = (config_path, )
         
         LOGGER.debug("[%s] remove duplicate configuration path" % self.name)
-        self.config_path = list(set(self.config_path))
+        self.config_path = unique_paths(self.config_path)
         
         LOGGER.debug("[%s] find and load default cfg file" % self.name)
-        # in list order to respect path importance
-        for path in self.config_path:
-            full_path = join(path, self.default_filename)
-            if isfile(full_path):
-                self.default_path = full_path
-                LOGGER.debug("[%s] default_path = %s" % (self.name, self.default_path))
-                break
+        if self.index is not None:
+            self.default_path = self.index.default_file(self.name)
         else:
+            # in list order to respect path importance
+            for path in self.config_path:
+                full_path = join(path, self.default_filename)
+                if isfile(full_path):
+                    self.default_path = full_path
+                    break
+            else:
+                self.default_path = None
+        if self.default_path is None:
             raise MyConfigParserException(self.name, "Couldn't find default config file")
+        LOGGER.debug("[%s] default_path = %s" % (self.name, self.default_path))
 
         # call reload
         self.reload()
                 
-    def reload(self):
+    def get_sources(self):
+        """
+        Return the files to load, in loading order (default file then user cfg files), as a tuple of (path, modification time, size)
+        """
+        if self.index is not None:
+            cfg_files = self.index.cfg_files(self.name)
+        else:
+            cfg_files = [join(path, self.cfg_filename) for path in self.config_path]
+        sources = []
+        # in reverse order to respect path importance order
+        for full_path in [self.default_path] + cfg_files[::-1]:
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            sources.append((full_path, stat.st_mtime_ns, stat.st_size))
+        return tuple(sources)
+    
+    def _cache_key(self):
+        return (self.name, self.cfg_filename, self.default_filename, tuple(self.config_path))
+    
+    def _raw_data(self):
         """
-        Reload configuration
+        Return the raw (not interpolated) values of all sections, including default one, as dictionaries
         """
-        LOGGER.debug("[%s] clean config" % self.name)
+        data = {self.default_section: dict(self._defaults)}
         for section in self.sections():
-            if not self.remove_section(section):
-                raise MyConfigParserException(self.name, "Couldn't clean section %r" % section)
+            data[section] = dict(self._sections[section])
+        return data
+    
+    def _parse_file(self, full_path):
+        """
+        Parse a single file and return its raw values as dictionaries (like _raw_data)
+        """
+        return read_raw(full_path, self._strict, self.default_section, self.optionxform)
+    
+    def _file_data(self, full_path):
+        """
+        Return the raw values of a loaded file: the ones parsed by the last reload if it didn't change since, else parse it
+        (and keep it for next reload)
+        """
+        with self._reload_lock:
+            for path, mtime, size in self.sources:
+                if path == full_path:
+                    signature, data = self._files_data.get(full_path, (None, None))
+                    if signature != (mtime, size):
+                        data = self._parse_file(full_path)
+                        self._files_data[full_path] = ((mtime, size), data)
+                    return data
+        return self._parse_file(full_path)
+    
+    def _swap_state(self, data):
+        """
+        Replace all sections (default one included) by the given raw values at once
+        """
+        defaults = self._dict(data.get(self.default_section, {}))
+        sections = self._dict()
+        proxies = self._dict()
+        proxies[self.default_section] = SectionProxy(self, self.default_section)
+        for section, options in data.items():
+            if section != self.default_section:
+                sections[section] = self._dict(options)
+                proxies[section] = SectionProxy(self, section)
+        # a single dict update (atomic for other threads), so that readers never see a partially loaded parser
+        self.__dict__.update(_defaults=defaults, _sections=sections, _proxies=proxies)
+        self._invalidate()
+    
+    def _invalidate(self):
+        """
+        Clear typed values cache
+        """
+        self._generation += 1
+        self._values = {}
+    
+    def _cached(self, kind, getter, section, option, raw, vars, fallback, kwargs):
+        """
+        Return getter(self, section, option, raw=raw) from typed values cache, or compute and cache it.
+        Calls with vars or extra arguments are not cached.
+        """
+        if vars is not None or kwargs:
+            if fallback is not _UNSET:
+                kwargs['fallback'] = fallback
+            return getter(self, section, option, raw=raw, vars=vars, **kwargs)
+        key = (kind, section, option, raw)
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        generation = self._generation
+        try:
+            value = getter(self, section, option, raw=raw)
+        except (NoSectionError, NoOptionError):
+            if fallback is _UNSET:
+                raise
+            return fallback
+        # don't cache a value computed before an invalidation
+        if generation == self._generation:
+            self._values[key] = value
+        return value
+    
+    def get(self, section, option, *, raw=False, vars=None, fallback=_UNSET, **kwargs):
+        """
+        Like ConfigParser.get, but values are cached until the configuration changes
+        """
+        return self._cached('str', ConfigParser.get, section, option, raw, vars, fallback, kwargs)
+    
+    def getint(self, section, option, *, raw=False, vars=None, fallback=_UNSET, **kwargs):
+        """
+        Like ConfigParser.getint, but values are cached until the configuration changes
+        """
+        return self._cached('int', ConfigParser.getint, section, option, raw, vars, fallback, kwargs)
+    
+    def getfloat(self, section, option, *, raw=False, vars=None, fallback=_UNSET, **kwargs):
+        """
+        Like ConfigParser.getfloat, but values are cached until the configuration changes
+        """
+        return self._cached('float', ConfigParser.getfloat, section, option, raw, vars, fallback, kwargs)
+    
+    def getboolean(self, section, option, *, raw=False, vars=None, fallback=_UNSET, **kwargs):
+        """
+        Like ConfigParser.getboolean, but values are cached until the configuration changes
+        """
+        return self._cached('boolean', ConfigParser.getboolean, section, option, raw, vars, fallback, kwargs)
+    
+    def set(self, section, option, value=None):
+        ConfigParser.set(self, section, option, value)
+        self._invalidate()
+    
+    def remove_option(self, section, option):
+        try:
+            return ConfigParser.remove_option(self, section, option)
+        finally:
+            self._invalidate()
+    
+    def remove_section(self, section):
+        try:
+            return ConfigParser.remove_section(self, section)
+        finally:
+            self._invalidate()
+    
+    def read_file(self, f, source=None):
+        try:
+            ConfigParser.read_file(self, f, source)
+        finally:
+            self._invalidate()
+    
+    def read(self, filenames, encoding=None):
+        try:
+            return ConfigParser.read(self, filenames, encoding)
+        finally:
+            self._invalidate()
+    
+    def snapshot(self):
+        """
+        Return a frozen read-only copy (ConfigSnapshot) of all interpolated values, for fast attribute access:
+        snapshot.section.option (or snapshot['section']['option'] if names aren't valid identifiers).
         
-        # use readfp to raise Exception if error while loading
-        LOGGER.info("[%s] Load DEFAULT file %r" % (self.name, self.default_path))
-        self.readfp(open(self.default_path))
-
-        LOGGER.debug("[%s] find and load user cfg files" % self.name)
-        # in reverse order to respect path importance order
-        for path in reversed(self.config_path):
-            full_path = join(path, self.cfg_filename)
-            if isfile(full_path):
-                LOGGER.info("[%s] Load config file %r" % (self.name, full_path))
-                self.read(full_path)
+        Like get, each section includes default section values. The snapshot doesn't follow configuration changes.
+        """
+        sections = {}
+        for section in [self.default_section] + self.sections():
+            sections[section] = FrozenSection(ConfigParser.items(self, section))
+        return ConfigSnapshot(sections)
+    
+    def reload(self):
+        """
+        Reload configuration. Only files that changed since last reload are parsed again, then all sections 
+        are replaced at once.
+        
+        Return changes as a dictionary of changed section => set of changed options. If not empty, it is also given to 
+        all callbacks registered with add_callback (or watch).
+        """
+        with self._reload_lock:
+            sources = self.get_sources()
+            if not sources or sources[0][0] != self.default_path:
+                raise MyConfigParserException(self.name, "Couldn't find default config file %r" % self.default_path)
+            
+            data = None
+            if self.cache is not None:
+                data = self.cache.get(self._cache_key(), sources)
+                if data is not None:
+                    LOGGER.debug("[%s] Load from cache" % self.name)
+            
+            if data is None:
+                files_data = {}
+                for full_path, mtime, size in sources:
+                    signature, file_data = self._files_data.get(full_path, (None, None))
+                    if signature != (mtime, size):
+                        LOGGER.info("[%s] Load %s file %r" % (self.name, "DEFAULT" if full_path == self.default_path else "config", full_path))
+                        file_data = self._parse_file(full_path)
+                    files_data[full_path] = ((mtime, size), file_data)
+                
+                LOGGER.debug("[%s] merge files in loading order" % self.name)
+                data = {}
+                for full_path, _, _ in sources:
+                    for section, options in files_data[full_path][1].items():
+                        data.setdefault(section, {}).update(options)
+                self._files_data = files_data
+                
+                if self.cache is not None:
+                    self.cache.set(self._cache_key(), sources, data)
+            
+            changes = diff_data(self._raw_data(), data)
+            self._swap_state(data)
+            self.sources = sources
         LOGGER.debug("[%s] done reload" % self.name)
+        
+        if changes:
+            LOGGER.debug("[%s] changes: %r" % (self.name, changes))
+            for callback in list(self.callbacks):
+                try:
+                    callback(self, changes)
+                except Exception:
+                    LOGGER.exception("[%s] Configuration change callback %r failed" % (self.name, callback))
+        return changes
+    
+    def add_callback(self, callback):
+        """
+        Register a function called as callback(config, changes) after each reload that changed something.
+        changes is a dictionary of changed section => set of changed options
+        """
+        self.callbacks.append(callback)
+    
+    def watch(self, callback=None, interval=DEFAULT_WATCH_INTERVAL, inotify=None):
+        """
+        Start watching configuration files in a background thread and reload when they change (see ConfigWatcher).
+        
+        @param callback: an optional function to register (see add_callback)
+        @param interval: number of seconds between checks
+        @param inotify: set to True to force, or False to prevent, using inotify. Default is to use it where available.
+        
+        Return the ConfigWatcher
+        """
+        if callback is not None:
+            self.add_callback(callback)
+        if self.watcher is None:
+            self.watcher = ConfigWatcher(self, interval, inotify).start()
+        return self.watcher
+    
+    def stop_watching(self):
+        """
+        Stop watching configuration files
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
                 
+    def validate(self):
+        """
+        Return the list of ConfigProblem of all sections and options of the configuration that are not in the default file.
+        The default file is only parsed if it changed since last reload. Each problem source is the most important user file 
+        that sets it (None if it was set in memory or loaded from cache).
+        """
+        problems = check_data(self.name, self._file_data(self.default_path), self._raw_data(), default_section=self.default_section)
+        if problems:
+            # most important first
+            cfg_data = [(path, self._files_data.get(path, (None, {}))[1]) for path, _, _ in self.sources[:0:-1]]
+            for i, problem in enumerate(problems):
+                for path, data in cfg_data:
+                    options = data.get(problem.section, {})
+                    if problem.section in data and (problem.option is None or problem.option in options):
+                        problems[i] = problem._replace(source=path)
+                        break
+        return problems
+    
     def check_override_all(self):
         """
-        Return true if user config override properly the default on (no extra variables).
+        Return true if user config override properly the default on (no extra variables). All problems are logged.
         """
-        default_cfg = ConfigParser()
-        default_cfg.read_file(open(self.default_path))
-        
-        LOGGER.debug("[%s] test section differences" % self.name)
-        diff_sections = set(self.sections()) - set(default_cfg.sections())
-        # should not have more section in user config
-        if diff_sections:
-            LOGGER.warn("[%s] %r sections are not in default" % (self.name, diff_sections))
-            return False
-        LOGGER.debug("[%s] for each section, test option differences" % self.nam)
-        for section in self.sections():
-            diff_options = set(self.options(section)) - set(default_cfg.options(section))
-            # should not have more options in user config
-            if diff_options:
-                LOGGER.warn("[%s] %r options are not in default section %r" % (self.name, diff_options, section))
-                return False
-        # all good
-        return True
+        problems = self.validate()
+        for problem in problems:
+            LOGGER.warning(str(problem))
+        return not problems
 
     def items(self, section, with_default=False):
         """
@@ -127,14 +704,374 @@ class MyConfigParser(ConfigParser, object):
         
         @section: the section to get options from.
         @param with_default: if with_default is True then items from default will be used in result (same behavior than configParser)
-        If false, default items will be skipped
+        If false, only options set in the section are returned (in file order), default items are skipped
         """
-        all_items = ConfigParser.items(self, section)
         if with_default:
-            return all_items
-        return list(set(all_items)-set(self.defaults().items()))
+            return ConfigParser.items(self, section)
+        return list(self.iter_items(section))
+    
+    def iter_items(self, section):
+        """
+        Iterate over (name, value) pairs of options set in the given section (not inherited from default), in file order.
+        Values are interpolated on demand and cached like get.
+        
+        @raise NoSectionError: if section doesn't exist
+        """
+        if section == self.default_section:
+            return
+        try:
+            # names are copied, so that a reload or set meanwhile doesn't break iteration
+            options = list(self._sections[section])
+        except KeyError:
+            raise NoSectionError(section)
+        for option in options:
+            yield option, self.get(section, option)
+    
+    def inherited_options(self, section):
+        """
+        Return names of default options that the given section doesn't override, in default order
+        
+        @raise NoSectionError: if section doesn't exist
+        """
+        if section == self.default_section:
+            return list(self._defaults)
+        try:
+            options = self._sections[section]
+        except KeyError:
+            raise NoSectionError(section)
+        return [option for option in self._defaults if option not in options]
 
     def __str__(self):
         result = io.StringIO()
         self.write(result)
         return result.getvalue()
+
+
+class FrozenSection(object):
+    """
+    Read-only values by name, available as attributes or items
+    """
+    
+    def __init__(self, values):
+        self.__dict__.update(values)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+    
+    def __delattr__(self, name):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+    
+    def __getitem__(self, name):
+        return self.__dict__[name]
+    
+    def __contains__(self, name):
+        return name in self.__dict__
+    
+    def __iter__(self):
+        return iter(self.__dict__)
+    
+    def __len__(self):
+        return len(self.__dict__)
+    
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.__dict__)
+
+
+class ConfigSnapshot(FrozenSection):
+    """
+    Read-only FrozenSection by section name (see MyConfigParser.snapshot)
+    """
+
+
+class Inotify(object):
+    """
+    Minimal inotify binding (Linux only) to wait for changes of files in some folders
+    
+    @raise OSError: if inotify isn't available
+    """
+    # IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+    
+    def __init__(self, folders):
+        import ctypes, ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_init1, inotify_add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError("inotify is not available: %s" % e)
+        self.fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for folder in folders:
+            # missing folders can't be watched
+            if isdir(folder) and inotify_add_watch(self.fd, os.fsencode(folder), self.MASK) < 0:
+                LOGGER.debug("Couldn't watch %r with inotify" % folder)
+    
+    def wait(self, timeout):
+        """
+        Return True if a file changed within timeout seconds
+        """
+        import select
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        # events are only used as a hint that something changed, discard them
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher(object):
+    """
+    Background thread that reloads a MyConfigParser when its files change (see MyConfigParser.reload).
+    Changes are detected with inotify where available, else by checking files modification time and size every interval seconds.
+    """
+    
+    def __init__(self, config, interval=DEFAULT_WATCH_INTERVAL, inotify=None):
+        """
+        @param config: the MyConfigParser to watch
+        @param interval: number of seconds between checks (or between stop checks with inotify)
+        @param inotify: set to True to force, or False to prevent, using inotify. Default is to use it where available.
+        """
+        self.config = config
+        self.interval = interval
+        self.inotify = None
+        if inotify or inotify is None and sys.platform.startswith('linux'):
+            try:
+                self.inotify = Inotify(config.config_path)
+            except OSError as e:
+                if inotify:
+                    raise
+                LOGGER.debug("[%s] use stat polling: %s" % (config.name, e))
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ConfigWatcher-%s" % self.config.name)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+    
+    def check(self):
+        """
+        Reload configuration if any of its files changed. Errors are logged and the previous configuration is kept.
+        """
+        try:
+            if self.config.index is not None:
+                self.config.index.refresh()
+            if self.config.get_sources() != self.config.sources:
+                self.config.reload()
+        except Exception:
+            LOGGER.exception("[%s] Couldn't reload configuration" % self.config.name)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            if self.inotify is not None:
+                changed = self.inotify.wait(self.interval)
+            else:
+                changed = not self._stop.wait(self.interval)
+            if changed and not self._stop.is_set():
+                self.check()
+
+
+class ConfigValidator(object):
+    """
+    Check user cfg files against the default files of a config path: each sections and options of a cfg file must be in 
+    its default file. Each default file is parsed only once, so many folders (e.g. of several hosts) are checked quickly.
+    """
+    
+    def __init__(self, config_path=DEFAULT_PATH, cfg_ext=DEFAULT_CFG_EXT, default_ext=DEFAULT_DEFAULT_EXT, index=None):
+        """
+        @param config_path: path where to find the config files (see MyConfigParser)
+        @param cfg_ext: extension for the user configuration files.
+        @param default_ext: extension for the default configuration files.
+        @param index: an optional ConfigIndex. If set, config_path, cfg_ext and default_ext are the index ones.
+        """
+        self.index = index if index is not None else ConfigIndex(config_path, cfg_ext, default_ext)
+        # name => raw default data
+        self._defaults = {}
+    
+    def default_data(self, name):
+        """
+        Return the raw data of name default file (None if there isn't any)
+        """
+        try:
+            return self._defaults[name]
+        except KeyError:
+            pass
+        default_file = self.index.default_file(name)
+        data = self._defaults[name] = default_file and read_raw(default_file)
+        return data
+    
+    def validate_file(self, full_path):
+        """
+        Return the list of ConfigProblem of a user cfg file (its name is the configuration name)
+        """
+        name = os.path.splitext(os.path.basename(full_path))[0]
+        try:
+            default_data = self.default_data(name)
+        except (OSError, ConfigParserError) as e:
+            return [ConfigProblem(name, self.index.default_file(name), None, None, "Couldn't read default file: %s" % e)]
+        if default_data is None:
+            return [ConfigProblem(name, full_path, None, None, "no default configuration")]
+        try:
+            data = read_raw(full_path)
+        except (OSError, ConfigParserError) as e:
+            return [ConfigProblem(name, full_path, None, None, "Couldn't read file: %s" % e)]
+        return check_data(name, default_data, data, full_path)
+    
+    def validate_folder(self, folder):
+        """
+        Return the list of ConfigProblem of all user cfg files of folder (files without default file included)
+        """
+        problems = []
+        for filename in sorted(os.listdir(folder)):
+            full_path = join(folder, filename)
+            if filename.endswith(self.index.cfg_ext) and isfile(full_path):
+                problems.extend(self.validate_file(full_path))
+        return problems
+    
+    def validate_path(self):
+        """
+        Return the list of ConfigProblem of user cfg files of the config path that have a default file 
+        (config path folders may hold other programs files)
+        """
+        problems = []
+        for name in self.index.names():
+            for full_path in self.index.cfg_files(name):
+                problems.extend(self.validate_file(full_path))
+        return problems
+
+
+class MyConfigs(MutableMapping):
+    """
+    Dictionary of configurations by name. Configurations are registered by name (see add) 
+    and their MyConfigParser is only created on first access.
+    """
+    
+    def __init__(self, config_path=DEFAULT_PATH, cache=None, index=None):
+        """
+        @param config_path: path where to find the config files (see MyConfigParser)
+        @param cache: an optional ConfigCache (see MyConfigParser)
+        @param index: an optional ConfigIndex (see MyConfigParser)
+        """
+        self.config_path = config_path
+        self.cache = cache
+        self.index = index
+        # names in registration order
+        self._names = []
+        self._configs = {}
+    
+    def add(self, name):
+        """
+        Register a configuration name. It will be loaded on first access.
+        """
+        if name not in self._names:
+            self._names.append(name)
+    
+    def is_loaded(self, name):
+        """
+        Return True if configuration name has already been loaded
+        """
+        return name in self._configs
+    
+    def load_all(self, workers=None):
+        """
+        Load all registered configurations that are not loaded yet.
+        
+        @param workers: number of threads loading configurations concurrently. Default is to load them one after another.
+        @raise Exception: the error of the first configuration that couldn't be loaded (in registration order). 
+        When loading concurrently, it is raised once all other configurations are loaded, and all errors are logged.
+        """
+        names = [name for name in self if not self.is_loaded(name)]
+        if not workers or workers < 2 or len(names) < 2:
+            for name in names:
+                self[name]
+            return self
+        
+        LOGGER.debug("load %d configurations with %d threads" % (len(names), workers))
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(name, executor.submit(self._load, name)) for name in names]
+        # in registration order, so that errors are deterministic
+        errors = []
+        for name, future in futures:
+            error = future.exception()
+            if error is not None:
+                LOGGER.error("Couldn't load configuration %r: %s" % (name, error))
+                errors.append(error)
+            else:
+                self._configs.setdefault(name, future.result())
+        if errors:
+            raise errors[0]
+        return self
+    
+    def validate(self, workers=None):
+        """
+        Load all registered configurations and return the list of ConfigProblem of all of them 
+        (see MyConfigParser.validate), configurations that couldn't be loaded included.
+        
+        @param workers: number of threads loading configurations concurrently (see load_all)
+        """
+        try:
+            self.load_all(workers)
+        except Exception:
+            # reported below
+            pass
+        problems = []
+        for name in self:
+            try:
+                config = self[name]
+            except Exception as e:
+                problems.append(ConfigProblem(name, None, None, None, "Couldn't load configuration: %s" % e))
+                continue
+            problems.extend(config.validate())
+        return problems
+    
+    def _load(self, name):
+        LOGGER.debug("load configuration %r" % name)
+        with myprofile.span("load config %r" % name):
+            return MyConfigParser(name, config_path=self.config_path, cache=self.cache, index=self.index)
+    
+    def __getitem__(self, name):
+        try:
+            return self._configs[name]
+        except KeyError:
+            if name not in self._names:
+                raise
+        # if another thread loaded it meanwhile, keep the first one
+        return self._configs.setdefault(name, self._load(name))
+    
+    def __setitem__(self, name, config):
+        self.add(name)
+        self._configs[name] = config
+    
+    def __delitem__(self, name):
+        self._names.remove(name)
+        self._configs.pop(name, None)
+    
+    def __contains__(self, name):
+        return name in self._names
+    
+    def __iter__(self):
+        return iter(list(self._names))
+    
+    def __len__(self):
+        return len(self._names)
+    
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join("%s%s" % (name, "" if self.is_loaded(name) else " (not loaded)") for name in self._names))
@@ -12,9 +12,30 @@ from myPyApps import mylogging
 mylogging.configure_logging()
 """
 
-import logging.handlers, logging.config, io, sys
+import logging.handlers, io, os, re, sys, atexit, itertools, keyword, threading, time, weakref, configparser
+from collections import OrderedDict
+from queue import Queue, Full
 
-from myPyApps import myconfig
+from myPyApps import myconfig, myprofile
+
+# section of logging configuration dedicated to mylogging options
+MYLOGGING_SECTION = 'mylogging'
+
+# queue overflow policies
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_DEBUG_FIRST = 'drop-debug-first'
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_DEBUG_FIRST)
+DEFAULT_QUEUE_SIZE = 10000
+# seconds flush_logging waits for the listener to handle queued records
+FLUSH_TIMEOUT = 10
+
+# listener handling records in queue or collector mode (None if both are off)
+_listener = None
+# queue shared with worker processes in collector mode (None if collector mode is off)
+_collector_queue = None
+# rate limit filters, flushed at exit
+_rate_limit_filters = weakref.WeakSet()
 
 # add new classes to logging
 
@@ -33,6 +54,266 @@ class MaxLevelFilter(logging.Filter):
             return True
 
 
+class RateLimitFilter(logging.Filter):
+    """
+    Rate limit records by (logger name, level, message template) with a token bucket: each key may pass burst records 
+    at once then rate records per second. Suppressed records are counted and reported every summary_interval seconds 
+    by a "Suppressed N similar messages" record sent to the handlers the filter is attached to.
+    At most max_keys keys are tracked (least recently used ones are forgotten).
+    
+    Example in logging.cfg:
+    
+    [filters]
+    keys=ratelimit
+    
+    [filter_ratelimit]
+    class=myPyApps.mylogging.RateLimitFilter
+    kwargs={'rate': 1, 'burst': 10}
+    
+    [handler_mail]
+    filters=ratelimit
+    """
+    def __init__(self, rate=1.0, burst=10, max_keys=1000, summary_interval=60):
+        """
+        @param rate: records per second allowed for a key (once its burst is spent)
+        @param burst: records of a key allowed at once
+        @param max_keys: maximum number of tracked keys
+        @param summary_interval: seconds between reports of suppressed records. If 0, they are only reported by flush() 
+        (and at exit), except those of forgotten keys that are reported at once
+        """
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.summary_interval = summary_interval
+        # key => [tokens, last update time, suppressed count], least recently used first
+        self.buckets = OrderedDict()
+        # (key, suppressed count) of forgotten keys, not reported yet
+        self.forgotten = []
+        self.handlers = []
+        self.lock = threading.Lock()
+        self.summary_thread = None
+        _rate_limit_filters.add(self)
+    
+    def attach(self, handler):
+        """
+        Filter records of handler and send it suppressed records summaries
+        """
+        if self not in handler.filters:
+            handler.addFilter(self)
+        if handler not in self.handlers:
+            self.handlers.append(handler)
+    
+    def filter(self, record):
+        if getattr(record, 'rate_limit_summary', False):
+            return True
+        # in queue mode, msg is already merged with args: use the template kept by MyQueueHandler
+        template = getattr(record, '_template', None)
+        key = (record.name, record.levelno, str(record.msg) if template is None else template)
+        now = time.time()
+        forgotten = []
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now, 0]
+                if len(self.buckets) > self.max_keys:
+                    old_key, old_bucket = self.buckets.popitem(last=False)
+                    if old_bucket[2]:
+                        forgotten.append((old_key, old_bucket[2]))
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            allowed = bucket[0] >= 1
+            if allowed:
+                bucket[0] -= 1
+            else:
+                bucket[2] += 1
+            if self.summary_interval:
+                self.forgotten.extend(forgotten)
+                forgotten = []
+                if not allowed and self.summary_thread is None:
+                    # the thread doesn't keep the filter alive
+                    self.summary_thread = threading.Thread(target=RateLimitFilter._summary_loop, args=(weakref.ref(self),), 
+                                                           name="RateLimitFilter summary")
+                    self.summary_thread.daemon = True
+                    self.summary_thread.start()
+        # without periodic summaries, report forgotten keys now (they would pile up)
+        self.report(forgotten)
+        return allowed
+    
+    @staticmethod
+    def _summary_loop(ref):
+        while True:
+            rate_filter = ref()
+            if rate_filter is None:
+                break
+            interval = rate_filter.summary_interval
+            del rate_filter
+            time.sleep(interval)
+            rate_filter = ref()
+            if rate_filter is None:
+                break
+            rate_filter.flush()
+            del rate_filter
+    
+    def flush(self):
+        """
+        Send a summary record of suppressed records (if any) of each key to attached handlers
+        """
+        with self.lock:
+            suppressed = self.forgotten
+            self.forgotten = []
+            for key, bucket in self.buckets.items():
+                if bucket[2]:
+                    suppressed.append((key, bucket[2]))
+                    bucket[2] = 0
+        self.report(suppressed)
+    
+    def report(self, suppressed):
+        """
+        Send a summary record of each (key, suppressed count) to attached handlers
+        """
+        for (name, levelno, msg), count in suppressed:
+            record = logging.LogRecord(name, levelno, "", 0, "Suppressed %d similar messages: %s", (count, msg), None)
+            record.rate_limit_summary = True
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+# %(name)s fields of a %-style format (flags, width, precision and conversion are kept)
+_FORMAT_FIELD = re.compile(r'%\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])')
+
+class FastFormatter(logging.Formatter):
+    """
+    Same output as logging.Formatter for %-style formats, but the format is compiled once into a render function:
+    only attributes used by the format are read, asctime is computed once per second (and only if used).
+    Other styles ('{' and '$') are formatted by logging.Formatter.
+
+    Example in logging.cfg:
+
+    [formatter_myformatter]
+    class=myPyApps.mylogging.FastFormatter
+    format=%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s
+    """
+    def __init__(self, fmt=None, datefmt=None, style='%', validate=True, **kwargs):
+        logging.Formatter.__init__(self, fmt, datefmt, style, validate, **kwargs)
+        # (second, datefmt, formatted time) of the last formatted time
+        self._time_cache = (None, None, None)
+        self._render = None
+        self.fields = []
+        if style == '%':
+            template, self.fields = self.parse(self._fmt)
+            self._render = self.compile("%r %% (%s)" % (template, "".join(self.expression(field) + ", " for field in self.fields)))
+        self._uses_time = 'asctime' in self.fields
+
+    @staticmethod
+    def parse(fmt):
+        """
+        Return (fmt with unnamed fields, list of field names) of a %-style format
+        """
+        fields = []
+        def replace(match):
+            fields.append(match.group(1))
+            return '%' + match.group(2)
+        return _FORMAT_FIELD.sub(replace, fmt), fields
+
+    @staticmethod
+    def expression(field):
+        """
+        Return the python expression of field value in render function
+        """
+        if field in ('message', 'asctime'):
+            return field
+        if field.isidentifier() and not keyword.iskeyword(field):
+            return "record." + field
+        return "getattr(record, %r)" % field
+
+    @staticmethod
+    def compile(expression):
+        """
+        Return a render function (record, message, asctime) that returns expression
+        """
+        return eval("lambda record, message, asctime: " + expression, {})
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached = self._time_cache
+        if cached[0] != second or cached[1] != datefmt:
+            text = time.strftime(datefmt or self.default_time_format, self.converter(record.created))
+            self._time_cache = cached = (second, datefmt, text)
+        if datefmt or not self.default_msec_format:
+            return cached[2]
+        return self.default_msec_format % (cached[2], record.msecs)
+
+    def formatExtra(self, record):
+        """
+        Cache exception text in record and return (exception text, stack text), None if missing
+        """
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        return record.exc_text or None, record.stack_info and self.formatStack(record.stack_info)
+
+    def format(self, record):
+        if self._render is None:
+            return logging.Formatter.format(self, record)
+        record.message = message = record.getMessage()
+        try:
+            s = self._render(record, message, self._uses_time and self.formatTime(record, self.datefmt) or None)
+        except AttributeError:
+            # field missing in record: let logging.Formatter raise its error
+            return logging.Formatter.format(self, record)
+        exc_text, stack_text = self.formatExtra(record)
+        if exc_text:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + exc_text
+        if stack_text:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + stack_text
+        return s
+
+
+class JsonFormatter(FastFormatter):
+    """
+    Format records as JSON lines: one object whose keys are the format fields (numbers stay numbers),
+    plus exc_info and stack_info texts when present. Missing fields are null.
+    It has the same optimizations as FastFormatter.
+
+    Example in logging.cfg:
+
+    [formatter_json]
+    class=myPyApps.mylogging.JsonFormatter
+    format=%(asctime)s %(levelname)s %(name)s %(lineno)d %(message)s
+    """
+    def __init__(self, fmt=None, datefmt=None, style='%', validate=True, **kwargs):
+        import json
+        FastFormatter.__init__(self, fmt or "%(asctime)s %(levelname)s %(name)s %(message)s", datefmt, style, validate, **kwargs)
+        if not self.fields:
+            self.fields = ['asctime', 'levelname', 'name', 'message']
+            self._uses_time = True
+        self._render = self.compile("{%s}" % ", ".join("%r: %s" % (field, self.expression(field)) for field in self.fields))
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+    @staticmethod
+    def expression(field):
+        if field in ('message', 'asctime'):
+            return field
+        return "getattr(record, %r, None)" % field
+
+    def format(self, record):
+        record.message = message = record.getMessage()
+        data = self._render(record, message, self._uses_time and self.formatTime(record, self.datefmt) or None)
+        exc_text, stack_text = self.formatExtra(record)
+        if exc_text:
+            data['exc_info'] = exc_text
+        if stack_text:
+            data['stack_info'] = stack_text
+        return self.encoder.encode(data)
+
+
 class StreamMaxLevelHandler(logging.StreamHandler):
     """
     Emit logs only in range [level, maxlevel]
@@ -42,14 +323,313 @@ class StreamMaxLevelHandler(logging.StreamHandler):
         self.addFilter(MaxLevelFilter('maxlevelfilter', max_level))
         
 
+class BufferedStreamHandler(StreamMaxLevelHandler):
+    """
+    Like a StreamMaxLevelHandler but formatted records are buffered and written at once. 
+    The buffer is flushed when it holds buffer_size characters, flush_interval seconds after the first buffered record, 
+    on records of flush_level or higher and at exit.
+    
+    Example in logging.cfg:
+    
+    [handler_stdout]
+    class=myPyApps.mylogging.BufferedStreamHandler
+    args=(sys.stdout, INFO)
+    kwargs={'buffer_size': 65536, 'flush_interval': 0.5}
+    """
+    def __init__(self, stream=None, max_level=None, buffer_size=8192, flush_interval=1.0, flush_level=logging.WARNING):
+        """
+        @param stream: the stream to write to. Default is sys.stderr
+        @param max_level: the highest level of handled records. Default is None (no limit)
+        @param buffer_size: flush when the buffer holds this number of characters
+        @param flush_interval: flush this number of seconds after the first buffered record. 0 to only flush on size, level and exit
+        @param flush_level: flush on records of this level or higher
+        """
+        # range check is done inline in handle (no MaxLevelFilter)
+        logging.StreamHandler.__init__(self, stream)
+        self.max_level = max_level
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self.buffer = []
+        self.buffered = 0
+        # flushes every flush_interval seconds, started with the first record
+        self.flush_thread = None
+        self.closed = threading.Event()
+    
+    def handle(self, record):
+        if self.max_level and record.levelno > self.max_level:
+            return False
+        return logging.StreamHandler.handle(self, record)
+    
+    def emit(self, record):
+        """
+        Add the formatted record to the buffer (called with handler lock held)
+        """
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        self.append(msg, record.levelno)
+    
+    def append(self, msg, levelno):
+        """
+        Add a formatted message of level levelno to the buffer and flush if needed
+        """
+        self.buffer.append(msg)
+        self.buffered += len(msg)
+        if self.buffered >= self.buffer_size or levelno >= self.flush_level:
+            self.flush()
+        elif self.flush_interval and self.flush_thread is None:
+            self.flush_thread = threading.Thread(target=self._flush_loop, name="BufferedStreamHandler flush")
+            self.flush_thread.daemon = True
+            self.flush_thread.start()
+    
+    def _flush_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """
+        Write buffered records and flush the stream
+        """
+        # thread safe (also called from flush thread)
+        self.acquire()
+        try:
+            if self.buffer and self.stream is not None:
+                text = "".join(self.buffer)
+                self.buffer = []
+                self.buffered = 0
+                self.stream.write(text)
+            if self.stream and hasattr(self.stream, "flush"):
+                self.stream.flush()
+        except Exception:
+            # no record to report: mimic handleError without one
+            if logging.raiseExceptions and sys.stderr:
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+        finally:
+            self.release()
+    
+    def close(self):
+        self.closed.set()
+        self.flush()
+        logging.StreamHandler.close(self)
+
+
+class BufferedRotatingFileHandler(BufferedStreamHandler):
+    """
+    A buffered file handler (see BufferedStreamHandler) that rotates the log file by size and/or time.
+    The file size is tracked in memory (in characters) instead of asking the file on each record.
+    
+    Rotated files are renamed with a timestamp (e.g. myscript.log.20121030-120000), then gzip compressed 
+    and old ones removed by a background thread, so that emitting records never waits for it.
+    
+    Example in logging.cfg (same args as RotatingFileHandler):
+    
+    [handler_file]
+    class=myPyApps.mylogging.BufferedRotatingFileHandler
+    args=('myscript.log', 'a', 1048576, 10)
+    kwargs={'interval': 86400}
+    """
+    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, interval=0, compress=True, 
+                 buffer_size=65536, flush_interval=1.0, flush_level=logging.WARNING):
+        """
+        @param filename: the log file
+        @param mode: the open mode of the log file
+        @param maxBytes: rotate before the file gets bigger than this size. 0 for no size limit
+        @param backupCount: number of rotated files to keep. 0 to keep all of them
+        @param encoding: the log file encoding
+        @param interval: rotate every interval seconds. 0 for no time limit
+        @param compress: gzip rotated files
+        @param buffer_size, flush_interval, flush_level: see BufferedStreamHandler
+        """
+        self.baseFilename = os.path.abspath(filename)
+        self.mode = mode
+        self.encoding = encoding
+        BufferedStreamHandler.__init__(self, self._open(), None, buffer_size, flush_interval, flush_level)
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.interval = interval
+        self.compress = compress
+        self.size = self.stream.tell()
+        self.rollover_at = time.time() + interval if interval else None
+        # rotated files to compress and prune (None stops the worker)
+        self.rotated = Queue()
+        self.worker = None
+        # (timestamp, counter) of the last rotated file name
+        self.last_rotation = (None, 0)
+    
+    def _open(self):
+        return open(self.baseFilename, self.mode, encoding=self.encoding)
+    
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.shouldRollover(len(msg)):
+                self.doRollover()
+        except Exception:
+            self.handleError(record)
+            return
+        self.size += len(msg)
+        self.append(msg, record.levelno)
+    
+    def shouldRollover(self, length=0):
+        """
+        Return True if the file should be rotated before writing length more characters
+        """
+        if self.maxBytes and self.size and self.size + length > self.maxBytes:
+            return True
+        return self.rollover_at is not None and time.time() >= self.rollover_at
+    
+    def rotation_filename(self):
+        """
+        Return an unused name for the file being rotated now
+        """
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        name = "%s.%s" % (self.baseFilename, timestamp)
+        # names of this second already pruned must not be used again, they would sort before newer files
+        count = self.last_rotation[1] + 1 if self.last_rotation[0] == timestamp else 0
+        rotated = "%s.%d" % (name, count) if count else name
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            count += 1
+            rotated = "%s.%d" % (name, count)
+        self.last_rotation = (timestamp, count)
+        return rotated
+    
+    def doRollover(self):
+        """
+        Write pending records, rename current file with a timestamp then open a new one. 
+        Compression and removal of old files are left to the background worker.
+        """
+        self.acquire()
+        try:
+            self.flush()
+            self.stream.close()
+            if self.size or os.path.getsize(self.baseFilename):
+                rotated = self.rotation_filename()
+                os.rename(self.baseFilename, rotated)
+                if self.worker is None:
+                    self.worker = threading.Thread(target=self._work, name="BufferedRotatingFileHandler worker")
+                    self.worker.daemon = True
+                    self.worker.start()
+                self.rotated.put(rotated)
+            self.stream = self._open()
+            self.size = 0
+            if self.interval:
+                self.rollover_at = time.time() + self.interval
+        finally:
+            self.release()
+    
+    def _work(self):
+        while True:
+            rotated = self.rotated.get()
+            if rotated is None:
+                break
+            try:
+                # may already be pruned if many files were rotated meanwhile
+                if self.compress and os.path.exists(rotated):
+                    self.compress_file(rotated)
+                self.prune()
+            except Exception:
+                if logging.raiseExceptions and sys.stderr:
+                    import traceback
+                    traceback.print_exc(file=sys.stderr)
+    
+    def compress_file(self, filename):
+        """
+        Replace filename by filename.gz
+        """
+        import gzip, shutil
+        with open(filename, 'rb') as src, gzip.open(filename + ".gz.tmp", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(filename + ".gz.tmp", filename + ".gz")
+        os.remove(filename)
+    
+    def get_rotated_files(self):
+        """
+        Return rotated files (compressed or not), oldest first
+        """
+        folder, base = os.path.split(self.baseFilename)
+        rotated = []
+        for f in os.listdir(folder):
+            if not f.startswith(base + "."):
+                continue
+            # timestamp, optional counter and .gz
+            suffix = f[len(base) + 1:]
+            if suffix.endswith(".gz"):
+                suffix = suffix[:-3]
+            timestamp, _, count = suffix.partition(".")
+            if len(timestamp) == 15 and timestamp.replace("-", "").isdigit() and (not count or count.isdigit()):
+                rotated.append(((timestamp, int(count or 0)), os.path.join(folder, f)))
+        return [f for _, f in sorted(rotated)]
+    
+    def prune(self):
+        """
+        Remove oldest rotated files to keep only backupCount of them
+        """
+        if self.backupCount:
+            for f in self.get_rotated_files()[:-self.backupCount]:
+                os.remove(f)
+    
+    def close(self):
+        self.acquire()
+        try:
+            BufferedStreamHandler.close(self)
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+        if self.worker is not None:
+            # let the worker finish pending compressions
+            self.rotated.put(None)
+            self.worker.join()
+            self.worker = None
+
+
 class MySMTPHandler(logging.handlers.SMTPHandler):
     """
     Like a SMTPHandler except if connect to SMTP fails, it will only alert once and
     will log into a lower level (not just displaying the error like in SMTPHandler)
+    
+    It also has a digest mode (enabled with digest_size and/or digest_interval keyword arguments): records are collected 
+    and sent as a single email when digest_size records are pending or digest_interval seconds after the first one. 
+    Identical messages are grouped with their number of occurrences, first and last times.
+    
+    With an outbox folder (outbox keyword argument), emails are queued on disk and sent by a background thread 
+    (started by the first email) with retries (see myemail.Outbox), so a slow or down SMTP server never blocks logging.
     """
     def __init__(self, *args, **kwargs):
+        """
+        Same arguments as SMTPHandler plus:
+        
+        @param digest_size: send the digest when this number of records are pending. Default is 0 (no size limit)
+        @param digest_interval: send the digest this number of seconds after the first pending record. Default is 0 (no time limit)
+        If both are 0, digest mode is off and each record is sent in its own email.
+        @param outbox: an outbox folder to queue emails in. Default is to send them immediately
+        @param verify: check the SMTP server certificate and host name on STARTTLS (secure argument). Default is False, like SMTPHandler
+        """
+        self.digest_size = kwargs.pop('digest_size', 0)
+        self.digest_interval = kwargs.pop('digest_interval', 0)
+        outbox = kwargs.pop('outbox', None)
+        self.verify = kwargs.pop('verify', False)
         logging.handlers.SMTPHandler.__init__(self, *args, **kwargs)
+        self.outbox = None
+        self.smtp_config = None
+        if outbox or self.verify:
+            from myPyApps.helpers import myemail
+            import smtplib
+            self.smtp_config = myemail.SMTPConfig(self.mailhost, self.mailport or smtplib.SMTP_PORT, self.fromaddr, self.username, 
+                                                  getattr(self, 'password', None), self.secure, self.timeout, self.verify)
+        if outbox:
+            # its sender thread is started by the first email
+            self.outbox = myemail.Outbox(outbox, self.smtp_config)
         self.first_error = True
+        # (level, logger name, message) => [count, formatted first record, first time, last time]
+        self.digest = OrderedDict()
+        self.digest_count = 0
+        self.digest_timer = None
     
     def handleError(self, *args, **kwargs):
         # don't spam in logs
@@ -57,16 +637,111 @@ class MySMTPHandler(logging.handlers.SMTPHandler):
             # just try to use lowest level
             logging.handlers.SMTPHandler.handleError(self, *args, **kwargs)
             try:
-                import sys, traceback
-                print >> sys.stderr, ("Error with SMTP handler. Please check your configuration file. "
-                                  "Or disable email 'mylogging.configure_logging(mail=False)'.\n"), traceback.format_exc()
+                import traceback
+                print("Error with SMTP handler. Please check your configuration file. "
+                      "Or disable email 'mylogging.configure_logging(mail=False)'.\n", traceback.format_exc(), file=sys.stderr)
             except:
                 pass
         self.first_error = False
+    
+    def emit(self, record):
+        """
+        Send the record in its own email, or add it to the digest in digest mode
+        """
+        if not (self.digest_size or self.digest_interval):
+            return self.send(record)
+        
+        try:
+            key = (record.levelno, record.name, record.getMessage())
+            entry = self.digest.get(key)
+            if entry is None:
+                self.digest[key] = [1, self.format(record), record.created, record.created]
+            else:
+                entry[0] += 1
+                entry[3] = record.created
+            self.digest_count += 1
+        except Exception:
+            self.handleError(record)
+            return
+        
+        if self.digest_size and self.digest_count >= self.digest_size:
+            self.send_digest()
+        elif self.digest_interval and self.digest_timer is None:
+            self.digest_timer = threading.Timer(self.digest_interval, self.send_digest)
+            self.digest_timer.daemon = True
+            self.digest_timer.start()
+    
+    def send_digest(self):
+        """
+        Send all pending records (if any) in a single email
+        """
+        # thread safe (also called from digest timer)
+        self.acquire()
+        try:
+            if self.digest_timer is not None:
+                self.digest_timer.cancel()
+                self.digest_timer = None
+            if not self.digest:
+                return
+            digest, count = self.digest, self.digest_count
+            self.digest = OrderedDict()
+            self.digest_count = 0
+            
+            lines = []
+            for occurrences, text, first, last in digest.values():
+                lines.append("%d occurrence(s) from %s to %s" % (occurrences, self._format_time(first), self._format_time(last)))
+                lines.append(text)
+                lines.append("")
+            level = max(key[0] for key in digest)
+            record = logging.LogRecord(__name__, level, None, None, "\n".join(lines), None, None)
+            self.emit_email(record, "%s (digest of %d records)" % (self.subject, count))
+        finally:
+            self.release()
+    
+    def _format_time(self, created):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+    
+    def flush(self):
+        """
+        Send pending digest
+        """
+        self.send_digest()
+    
+    def close(self):
+        self.send_digest()
+        if self.outbox is not None:
+            self.outbox.stop()
+        logging.handlers.SMTPHandler.close(self)
+    
+    def send(self, record):
+        """
+        Send an email of record (or queue it in outbox)
+        """
+        if self.smtp_config is None:
+            return logging.handlers.SMTPHandler.emit(self, record)
+        try:
+            from email.message import EmailMessage
+            import email.policy, email.utils
+            # same message as SMTPHandler, but 7bit clean (8BITMIME isn't negotiated, and outbox emails are sent later)
+            msg = EmailMessage(policy=email.policy.SMTP.clone(cte_type='7bit'))
+            msg['From'] = self.fromaddr
+            msg['To'] = ','.join(self.toaddrs)
+            msg['Subject'] = self.getSubject(record)
+            msg['Date'] = email.utils.localtime()
+            msg.set_content(self.format(record))
+            if self.outbox is None:
+                # SMTPHandler can't verify the server
+                from myPyApps.helpers import myemail
+                myemail.POOL.sendmail(self.smtp_config, self.fromaddr, self.toaddrs, msg.as_bytes())
+            else:
+                self.outbox.put(self.fromaddr, self.toaddrs, msg.as_bytes())
+                self.outbox.start()
+        except Exception:
+            self.handleError(record)
         
     def emit_email(self, record, subject=None):
         """
-        Send an email with record text and subject
+        Send an email with record text and subject. It is always sent immediately (even in digest mode).
         """
         # thread safe
         self.acquire()
@@ -78,21 +753,162 @@ class MySMTPHandler(logging.handlers.SMTPHandler):
         self.subject = subject
         self.formatter = logging.Formatter("%(message)s")
         try:
-            self.emit(record)
+            self.send(record)
         finally:
             self.subject = bkp_subject
             self.formatter = bkp_formatter
             self.release()
      
+
+class OverflowQueue(Queue):
+    """
+    Bounded queue of log records that applies an overflow policy when full:
+        - block: wait until the listener makes room (standard Queue behavior)
+        - drop-oldest: drop the oldest pending record
+        - drop-debug-first: drop the oldest pending record of the lowest level (DEBUG first), 
+        or the new record if none has a lower level
+    """
+    def __init__(self, maxsize=0, overflow=BLOCK):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown queue overflow policy %r, use one of %r" % (overflow, OVERFLOW_POLICIES))
+        Queue.__init__(self, maxsize)
+        self.overflow = overflow
+        self.dropped = 0
+    
+    def put(self, item, block=True, timeout=None):
+        # the listener sentinel (None) must never be dropped
+        if self.overflow == BLOCK or item is None:
+            return Queue.put(self, item, block, timeout)
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self.dropped += 1
+                if self._evict(item) is item:
+                    return
+                # the new record takes the place of the evicted one, so unfinished_tasks is unchanged
+                self._put(item)
+            else:
+                self._put(item)
+                self.unfinished_tasks += 1
+            self.not_empty.notify()
+    
+    def _evict(self, item):
+        """
+        Remove a pending record according to overflow policy and return it. Return item if the new one should be dropped instead.
+        """
+        if self.overflow == DROP_OLDEST:
+            if self.queue[0] is None:
+                return item
+            return self.queue.popleft()
+        # drop-debug-first: oldest record having the lowest level
+        victim = item
+        for record in self.queue:
+            if record is not None and record.levelno < victim.levelno:
+                victim = record
+        if victim is not item:
+            self.queue.remove(victim)
+        return victim
+
+
+class MyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Like a QueueHandler except it lets the queue apply its overflow policy (instead of raising when full)
+    and it keeps the message template (before args are merged) in record._template, for RateLimitFilter
+    """
+    def enqueue(self, record):
+        self.queue.put(record)
+    
+    def prepare(self, record):
+        template = str(record.msg)
+        record = logging.handlers.QueueHandler.prepare(self, record)
+        record._template = template
+        return record
+
+
+class FlushMarker(object):
+    """
+    Put in the queue by MyQueueListener.flush: the listener reports it reached the marker (so handled all records queued before it)
+    """
+    # never the record dropped first by drop-debug-first policy
+    levelno = sys.maxsize
+    _ids = itertools.count()
+    
+    def __init__(self):
+        self.id = next(self._ids)
+
+
+class MyQueueListener(logging.handlers.QueueListener):
+    """
+    Like a QueueListener except the stop sentinel waits for room in a full queue, and it can be flushed
+    """
+    def __init__(self, queue, *handlers, **kwargs):
+        logging.handlers.QueueListener.__init__(self, queue, *handlers, **kwargs)
+        # flush marker id => event set when the listener reaches the marker
+        self.flushes = {}
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+    
+    def stop(self, timeout=None):
+        """
+        Stop the listener once it handled all queued records
+        
+        @param timeout: maximum seconds to wait for it. Default is to wait forever
+        Return False if the timeout expired (the listener thread is left running)
+        """
+        self.enqueue_sentinel()
+        self._thread.join(timeout)
+        stopped = not self._thread.is_alive()
+        self._thread = None
+        return stopped
+    
+    def handle(self, record):
+        if isinstance(record, FlushMarker):
+            event = self.flushes.pop(record.id, None)
+            if event is not None:
+                event.set()
+            return
+        if getattr(record, 'send_email', False):
+            # email request of a worker process (see MyLogger.send_email)
+            for h in self.handlers:
+                if hasattr(h, 'emit_email'):
+                    h.emit_email(record, record.email_subject)
+            return
+        logging.handlers.QueueListener.handle(self, record)
+    
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Wait until the listener handled all records queued by this process. 
+        It doesn't rely on the queue task accounting, which never settles if a worker process dies while putting records.
         
+        @param timeout: maximum seconds to wait
+        Return False if the timeout expired
+        """
+        marker = FlushMarker()
+        event = self.flushes[marker.id] = threading.Event()
+        try:
+            self.queue.put(marker, True, timeout)
+        except Full:
+            pass
+        if not event.wait(timeout):
+            self.flushes.pop(marker.id, None)
+            return False
+        return True
+
+
 class MyLogger(logging.Logger):
     
     def send_email(self, msg, subject=None):
         """
         Send an email to all SMTP handlers. Precisely to all handlers having emit_email method.    
+        In a worker process of a collector, the request is sent to the collector that sends the email.
         """
         record = logging.LogRecord(self.name, logging.INFO, None, None, msg, None, None)
-        for h in logging.root.handlers:
+        if _listener is None and _collector_queue is not None:
+            record.send_email = True
+            record.email_subject = subject
+            _collector_queue.put(record)
+            return
+        for h in get_handlers():
             if hasattr(h, 'emit_email'):
                 h.emit_email(record, subject)
 
@@ -107,8 +923,244 @@ def getLogger(name=None):
     @param name: the name of the logger. If none, will be 'root'
     """
     return logging.getLogger(name)
+
+def get_handlers():
+    """
+    Return the handlers that actually handle root records. In queue mode, those are the listener's handlers.
+    """
+    if _listener is not None:
+        return list(_listener.handlers)
+    return logging.root.handlers
+
+def flush_logging(timeout=FLUSH_TIMEOUT):
+    """
+    Wait until all queued records are handled (queue or collector mode) then flush all handlers.
+    
+    @param timeout: maximum seconds to wait for queued records
+    """
+    if _listener is not None and not _listener.flush(timeout):
+        print("Logging records still queued after %s seconds, flush handlers anyway" % timeout, file=sys.stderr)
+    for h in get_handlers():
+        h.flush()
+
+def _start_queue(maxsize, overflow):
+    """
+    Move all root handlers behind a single queue drained by a background listener thread
+    """
+    global _listener
+    LOGGER.debug("handle logging records through a queue (size %d, overflow %r)" % (maxsize, overflow))
+    records = OverflowQueue(maxsize, overflow)
+    _listener = MyQueueListener(records, *logging.root.handlers, respect_handler_level=True)
+    logging.root.handlers = [MyQueueHandler(records)]
+    _listener.start()
+
+def _start_collector():
+    """
+    Move all root handlers behind a collector: a background listener thread draining a multiprocessing queue
+    that this process and its worker processes send records to
+    """
+    global _listener, _collector_queue
+    import multiprocessing
+    LOGGER.debug("handle logging records of all processes through a collector")
+    _collector_queue = multiprocessing.Queue()
+    _listener = MyQueueListener(_collector_queue, *logging.root.handlers, respect_handler_level=True)
+    logging.root.handlers = [MyQueueHandler(_collector_queue)]
+    _listener.start()
+
+def get_collector_queue():
+    """
+    Return the queue of the collector (None if collector mode is off). 
+    Give it to configure_logging(collector=...) in spawned worker processes (forked ones use it already).
+    """
+    return _collector_queue
+
+def _configure_worker(collector_queue):
+    """
+    Send all records of this worker process to the collector of its parent process
+    """
+    global _collector_queue
+    _collector_queue = collector_queue
+    logging.root.handlers = [MyQueueHandler(collector_queue)]
+    logging.root.setLevel(logging.NOTSET)
+
+def _stop_queue(timeout=FLUSH_TIMEOUT):
+    """
+    Stop the listener (after it handled all queued records) and give its handlers back to root
+    
+    @param timeout: maximum seconds to wait for queued records
+    """
+    global _listener, _collector_queue
+    if _listener is not None:
+        listener, _listener = _listener, None
+        if not listener.stop(timeout):
+            print("Logging records still queued after %s seconds, stop anyway" % timeout, file=sys.stderr)
+            # a worker process died while sending records: don't wait for the queue at exit either
+            if _collector_queue is not None:
+                _collector_queue.cancel_join_thread()
+        logging.root.handlers = list(listener.handlers)
+    _collector_queue = None
+
+def _after_fork_in_child():
+    """
+    The listener thread isn't forked: in collector mode, records keep going to the parent collector.
+    In queue mode, root handlers are given back so that the child handles its records.
+    """
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        if _collector_queue is None:
+            logging.root.handlers = list(listener.handlers)
+
+def _flush_rate_limit_filters():
+    for rate_filter in list(_rate_limit_filters):
+        rate_filter.flush()
+
+# stop queue before logging shutdown (atexit is LIFO) so that every queued record gets handled
+atexit.register(_stop_queue)
+# report suppressed records before that
+atexit.register(_flush_rate_limit_filters)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+LOGGER = getLogger(__name__)
+
+def _keys(config, section):
+    """
+    Return the list of names of a 'keys' option
+    """
+    return [key.strip() for key in config.get(section, 'keys').split(',') if key.strip()]
+
+def _names(config, section, option):
+    """
+    Return the list of names of a comma separated option (empty if missing)
+    """
+    return [name.strip() for name in config.get(section, option, fallback='').split(',') if name.strip()]
+
+def _create(klass, args, kwargs):
+    """
+    Create an object like fileConfig creates handlers: class name, args and kwargs are evaluated in logging namespace
+    """
+    namespace = vars(logging)
+    try:
+        klass = eval(klass, namespace)
+    except (AttributeError, NameError):
+        from logging.config import _resolve
+        klass = _resolve(klass)
+    return klass(*eval(args, namespace), **eval(kwargs, namespace))
+
+def _create_handler(klass, args, kwargs, handler=None):
+    """
+    dictConfig factory of handlers
+    """
+    with myprofile.span("create handler %r" % (handler or klass)):
+        return _create(klass, args, kwargs)
+
+def _create_filter(klass, args, kwargs):
+    """
+    dictConfig factory of filters
+    """
+    return _create(klass, args, kwargs)
+
+def _compile(config, section, option, default):
+    return compile(config.get(section, option, fallback=default), '[%s] %s' % (section, option), 'eval')
+
+def config_to_dict(config):
+    """
+    Translate a logging configuration in fileConfig format (like logging.default) into a logging.config.dictConfig dictionary.
+    Handlers args and kwargs are compiled, they are evaluated when handlers are created.
+    
+    Unlike fileConfig, handlers may have filters: 'filters' option of a handler lists names of [filters] keys, 
+    each one defined in a [filter_<name>] section by class, args and kwargs options.
+    
+    @param config: the ConfigParser to translate
+    @raise configparser.Error, ValueError, SyntaxError: if the configuration can't be translated
+    """
+    formatters = {}
+    for name in _keys(config, 'formatters'):
+        section = 'formatter_' + name
+        formatter = {'format': config.get(section, 'format', raw=True, fallback=None),
+                     'datefmt': config.get(section, 'datefmt', raw=True, fallback=None),
+                     'style': config.get(section, 'style', raw=True, fallback='%')}
+        klass = config.get(section, 'class', raw=True, fallback=None)
+        if klass:
+            formatter['class'] = klass
+        formatters[name] = formatter
+    
+    filters = {}
+    if config.has_section('filters'):
+        for name in _keys(config, 'filters'):
+            section = 'filter_' + name
+            filters[name] = {'()': _create_filter, 
+                             'klass': config.get(section, 'class'),
+                             'args': _compile(config, section, 'args', '()'),
+                             'kwargs': _compile(config, section, 'kwargs', '{}')}
+    
+    handlers = {}
+    for name in _keys(config, 'handlers'):
+        section = 'handler_' + name
+        if config.has_option(section, 'target'):
+            raise ValueError("handler %r target is not supported" % name)
+        handler = {'()': _create_handler, 
+                   'handler': name,
+                   'klass': config.get(section, 'class'),
+                   'args': _compile(config, section, 'args', '()'),
+                   'kwargs': _compile(config, section, 'kwargs', '{}')}
+        if config.has_option(section, 'level'):
+            handler['level'] = config.get(section, 'level')
+        if config.get(section, 'formatter', fallback=''):
+            handler['formatter'] = config.get(section, 'formatter')
+        if _names(config, section, 'filters'):
+            handler['filters'] = _names(config, section, 'filters')
+        handlers[name] = handler
+    
+    loggers = {}
+    root = None
+    for name in _keys(config, 'loggers'):
+        section = 'logger_' + name
+        logger = {'handlers': _names(config, section, 'handlers')}
+        if config.has_option(section, 'level'):
+            logger['level'] = config.get(section, 'level')
+        if name == 'root':
+            root = logger
+        else:
+            logger['propagate'] = bool(config.getint(section, 'propagate', fallback=1))
+            loggers[config.get(section, 'qualname')] = logger
+    if root is None:
+        raise ValueError("root logger is missing")
+    
+    return {'version': 1, 'disable_existing_loggers': False, 
+            'formatters': formatters, 'filters': filters, 'handlers': handlers, 'root': root, 'loggers': loggers}
+
+def _copy_dict(value):
+    return dict((k, _copy_dict(v)) for k, v in value.items()) if isinstance(value, dict) else value
+
+# last translated configuration: (raw values, dictConfig dictionary)
+_dict_config = (None, None)
+
+def get_dict_config(config):
+    """
+    Return config_to_dict(config). The translation is cached: it is only done again if configuration values changed.
+    """
+    global _dict_config
+    data = config._raw_data()
+    if _dict_config[0] != data:
+        _dict_config = (data, config_to_dict(config))
+    # dictConfig modifies the dictionary it configures from
+    return _copy_dict(_dict_config[1])
+
+def file_config(config):
+    """
+    Configure logging from config with logging.config.fileConfig (which parses it again)
+    """
+    import logging.config
+    result = io.StringIO()
+    config.write(result)
+    # rewind io
+    result.seek(0)
+    logging.config.fileConfig(result, disable_existing_loggers=False)
         
-def configure_logging(mail=True, verbose=False, config_path=None):
+def configure_logging(mail=True, verbose=False, config_path=None, queue=None, config_cache=None, config_index=None, rollover=None,
+                      collector=None):
     """
     Method to use to init logging, then you may use logging usually.
     
@@ -116,16 +1168,44 @@ def configure_logging(mail=True, verbose=False, config_path=None):
     @param verbose: set to True to force stdout to log DEBUG messages
     @param config: to give another way to find logging configuration. 
     Default is to take logging.default and user defined logging.cfg in HOME, script, module dir
+    @param queue: set to True to handle records in a background thread through a bounded queue, False to handle them inline.
+    Default is to use 'queue' option of the [mylogging] section. Queue size and overflow policy ('block', 'drop-oldest' 
+    or 'drop-debug-first') are set by 'queue_size' and 'queue_overflow' options.
+    @param config_cache: an optional myconfig.ConfigCache to load logging configuration from
+    @param config_index: an optional myconfig.ConfigIndex to find logging configuration files in (instead of config_path)
+    @param rollover: set to False to keep appending to existing log files instead of rotating them at startup.
+    Default is to use 'rollover' option of the [mylogging] section.
+    @param collector: set to True to make this process the collector of its worker processes records: handlers 
+    (files, streams, emails) are owned by a background thread of this process, forked workers send their records to it.
+    Default is to use 'collector' option of the [mylogging] section (it takes precedence over queue mode).
+    In a spawned worker process, give the collector queue (get_collector_queue() in the parent): it only installs 
+    a handler that sends records to the parent collector.
     """
+    import logging.config
+    
+    # handlers are about to be replaced, handle pending records first
+    _stop_queue()
+    
     # override default config for further use
-    MyLogger.default_config = myconfig.MyConfigParser('logging', config_path=config_path or myconfig.DEFAULT_PATH)
+    with myprofile.span("load config 'logging'"):
+        MyLogger.default_config = myconfig.MyConfigParser('logging', config_path=config_path or myconfig.DEFAULT_PATH, cache=config_cache, 
+                                                          index=config_index)
+    
+    if collector not in (None, True, False):
+        LOGGER.debug("send logging records to the parent collector")
+        _configure_worker(collector)
+        return
     
-    result = io.StringIO()
-    MyLogger.default_config.write(result)
-    # rewind io
-    result.seek(0)
     try:
-        logging.config.fileConfig(result, disable_existing_loggers=False)
+        try:
+            dict_config = get_dict_config(MyLogger.default_config)
+        except (configparser.Error, ValueError, SyntaxError) as e:
+            LOGGER.debug("Couldn't translate logging configuration for dictConfig (%s), use fileConfig" % e)
+            with myprofile.span("fileConfig"):
+                file_config(MyLogger.default_config)
+        else:
+            with myprofile.span("dictConfig"):
+                logging.config.dictConfig(dict_config)
     except IOError as e:
         logging.exception("Error configuring mylogging: %s. Please check that log folder exists." % e)
         raise e
@@ -134,10 +1214,20 @@ def configure_logging(mail=True, verbose=False, config_path=None):
         logging.exception("Error configuring mylogging: " + str(e))
         raise e
     
-    for h in filter(lambda h: isinstance(h, logging.handlers.RotatingFileHandler), logging.root.handlers):
+    # rate limit filters send their summaries to the handlers they filter
+    for h in set(h for logger in [logging.root] + list(logging.root.manager.loggerDict.values()) for h in getattr(logger, 'handlers', [])):
+        for f in h.filters:
+            if isinstance(f, RateLimitFilter):
+                f.attach(h)
+    
+    if rollover is None:
+        rollover = MyLogger.default_config.getboolean(MYLOGGING_SECTION, 'rollover', fallback=True)
+    rotating = (logging.handlers.RotatingFileHandler, BufferedRotatingFileHandler)
+    for h in filter(lambda h: rollover and isinstance(h, rotating), logging.root.handlers):
         try:
-            h.doRollover()
-        except WindowsError:
+            with myprofile.span("rollover %r" % h.baseFilename):
+                h.doRollover()
+        except OSError:
             logging.error("Could not rollover " + str(h))
             pass
     
@@ -150,4 +1240,15 @@ def configure_logging(mail=True, verbose=False, config_path=None):
     # disable mail
     if not mail:
         logging.info("Disable SMTP")
-        logging.root.handlers = filter(lambda h: not isinstance(h, logging.handlers.SMTPHandler), logging.root.handlers)
+        logging.root.handlers = [h for h in logging.root.handlers if not isinstance(h, logging.handlers.SMTPHandler)]
+    
+    config = MyLogger.default_config
+    if collector is None:
+        collector = config.getboolean(MYLOGGING_SECTION, 'collector', fallback=False)
+    if queue is None:
+        queue = config.getboolean(MYLOGGING_SECTION, 'queue', fallback=False)
+    if collector:
+        _start_collector()
+    elif queue:
+        _start_queue(config.getint(MYLOGGING_SECTION, 'queue_size', fallback=DEFAULT_QUEUE_SIZE), 
+                     config.get(MYLOGGING_SECTION, 'queue_overflow', fallback=BLOCK))
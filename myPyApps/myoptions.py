@@ -0,0 +1,18 @@
+"""
+@author: Fabrice Douchant
+@contact: vamp.higher@gmail.com
+@license: GNU GPLv3 (LICENSE.txt)
+
+myoptions holds the names of the framework options (MyApp options keys, myargparse.MyArgumentParser destinations).
+It imports nothing, so that myapp reads options without importing argparse.
+"""
+
+QUIET = "quiet"
+VERBOSE = "verbose"
+CONFIG = "config"
+DUMP_CONFIG = "dump-config"
+CHECK_CONFIG = "check-config"
+CONFIG_WORKERS = "config-workers"
+PROFILE_STARTUP = "profile-startup"
+WORKERS = "workers"
+CONFIG_SNAPSHOT = "config-snapshot"
@@ -0,0 +1,126 @@
+"""
+@author: Fabrice Douchant
+@contact: vamp.higher@gmail.com
+@license: GNU GPLv3 (LICENSE.txt)
+
+myprofile records timing spans of the framework phases (configuration discovery, logging configuration,
+configuration loads, handlers construction, ...) into the active profile.
+
+Example:
+
+from myPyApps import myprofile
+
+profile = myprofile.Profile().start()
+with myprofile.span("my phase"):
+    # my code here
+profile.stop()
+print(profile.format())
+"""
+
+import threading, time
+from contextlib import contextmanager
+
+# profile that records spans (None if no profile is active)
+_active = None
+
+
+class Span(object):
+    """
+    A named phase: start (seconds since profile start), duration in seconds, depth (number of enclosing spans) and thread name
+    """
+    __slots__ = ('name', 'start', 'duration', 'depth', 'thread')
+
+    def __init__(self, name, start, depth, thread):
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.depth = depth
+        self.thread = thread
+
+    def as_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+    def __repr__(self):
+        return "Span(%r, duration=%r)" % (self.name, self.duration)
+
+
+class Profile(object):
+    """
+    Collect spans while it is the active profile. Spans may be recorded from several threads.
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._local = threading.local()
+
+    def start(self):
+        """
+        Make it the active profile. Return self
+        """
+        global _active
+        _active = self
+        return self
+
+    def stop(self):
+        """
+        Stop recording spans (if it is the active profile)
+        """
+        global _active
+        if _active is self:
+            _active = None
+
+    @contextmanager
+    def span(self, name):
+        """
+        Record the duration of the with block as a span called name
+        """
+        depth = getattr(self._local, 'depth', 0)
+        s = Span(name, time.perf_counter() - self.origin, depth, threading.current_thread().name)
+        self.spans.append(s)
+        self._local.depth = depth + 1
+        try:
+            yield s
+        finally:
+            self._local.depth = depth
+            s.duration = time.perf_counter() - self.origin - s.start
+
+    def report(self):
+        """
+        Return all spans as a list of dictionaries (name, start, duration, depth, thread) ordered by start time
+        """
+        return [s.as_dict() for s in sorted(self.spans, key=lambda s: s.start)]
+
+    def format(self):
+        """
+        Return a text breakdown of spans, nested spans are indented
+        """
+        lines = ["%10s %10s  %s" % ("start ms", "time ms", "phase")]
+        for s in self.report():
+            duration = "running" if s['duration'] is None else "%.3f" % (s['duration'] * 1e3)
+            name = "  " * s['depth'] + s['name']
+            if s['thread'] != 'MainThread':
+                name += " [%s]" % s['thread']
+            lines.append("%10.3f %10s  %s" % (s['start'] * 1e3, duration, name))
+        return "\n".join(lines)
+
+
+@contextmanager
+def _no_span():
+    yield None
+
+def span(name):
+    """
+    Record the with block as a span of the active profile. Do nothing if there is no active profile
+
+    @param name: the span name
+    """
+    profile = _active
+    if profile is None:
+        return _no_span()
+    return profile.span(name)
+
+def get_profile():
+    """
+    Return the active profile or None
+    """
+    return _active
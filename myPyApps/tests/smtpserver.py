@@ -0,0 +1,264 @@
+"""
+Local stand-in SMTP servers for tests and benchmarks. They accept every message and keep it in memory.
+
+server = SMTPServer().start()
+# send to ('localhost', server.port)
+server.stop()
+
+or within an event loop:
+
+server = await AsyncSMTPServer().start()
+# send to ('localhost', server.port)
+await server.stop()
+
+With a certificate (certfile), they support STARTTLS. AUTH is always accepted.
+"""
+
+import asyncio, socketserver, threading
+from os.path import dirname, join
+
+# self-signed certificate (and its key) of localhost
+CERTFILE = join(dirname(__file__), 'keycert.pem')
+
+def server_context(server, certfile):
+    """
+    Return the SSL context of a server for STARTTLS. Server names sent by clients (SNI) are kept in server.server_names
+    """
+    import ssl
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile)
+    def sni_callback(sslobject, server_name, context):
+        server.server_names.append(server_name)
+    context.sni_callback = sni_callback
+    return context
+
+
+class SMTPRequestHandler(socketserver.StreamRequestHandler):
+    
+    def reply(self, code, text):
+        self.wfile.write(("%d %s\r\n" % (code, text)).encode('ascii'))
+    
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply(220, "localhost stand-in SMTP")
+        mail_from, rcpt_tos, sent = None, [], 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode('ascii', 'replace').strip()
+            verb, _, arg = command.partition(' ')
+            verb = verb.upper()
+            if verb == 'EHLO':
+                self.wfile.write(b"250-localhost\r\n")
+                extensions = server.extensions()
+                for extension in extensions[:-1]:
+                    self.wfile.write(("250-%s\r\n" % extension).encode('ascii'))
+                self.reply(250, extensions[-1])
+            elif verb == 'HELO':
+                self.reply(250, "localhost")
+            elif verb == 'MAIL':
+                mail_from, rcpt_tos = arg, []
+                self.reply(250, "OK")
+            elif verb == 'RCPT':
+                rcpt_tos.append(arg)
+                self.reply(250, "OK")
+            elif verb == 'DATA':
+                self.reply(354, "End data with <CR><LF>.<CR><LF>")
+                size, data = 0, []
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    if line.startswith(b'.'):
+                        line = line[1:]
+                    size += len(line)
+                    if server.keep:
+                        data.append(line)
+                with server.lock:
+                    server.messages.append((mail_from, rcpt_tos, b''.join(data) if server.keep else size))
+                self.reply(250, "OK")
+                sent += 1
+                if server.close_after and sent >= server.close_after:
+                    # simulate a server dropping the connection
+                    break
+            elif verb == 'STARTTLS' and server.ssl_context is not None:
+                self.reply(220, "Ready to start TLS")
+                self.connection = server.ssl_context.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile('rb')
+                self.wfile = self.connection.makefile('wb', 0)
+            elif verb == 'AUTH':
+                with server.lock:
+                    server.logins.append(arg)
+                self.reply(235, "Authentication successful")
+            elif verb in ('RSET', 'NOOP'):
+                self.reply(250, "OK")
+            elif verb == 'QUIT':
+                self.reply(221, "Bye")
+                break
+            else:
+                self.reply(502, "Command not implemented")
+    
+    def finish(self):
+        socketserver.StreamRequestHandler.finish(self)
+        # the TLS socket (if any) isn't the request closed by the server
+        self.connection.close()
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """
+    @param port: the port to listen to. Default is any free port (see self.port)
+    @param keep: keep message data. If False, only its size is kept
+    @param close_after: close connection after this number of messages
+    @param certfile: the certificate (and its key) of STARTTLS. Default is no STARTTLS
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self, port=0, keep=True, close_after=None, certfile=None):
+        socketserver.ThreadingTCPServer.__init__(self, ('localhost', port), SMTPRequestHandler)
+        self.port = self.server_address[1]
+        self.keep = keep
+        self.close_after = close_after
+        self.messages = []
+        self.connections = 0
+        self.logins = []
+        self.server_names = []
+        self.ssl_context = server_context(self, certfile) if certfile else None
+        self.lock = threading.Lock()
+
+    def extensions(self):
+        """
+        Return ESMTP extensions announced in EHLO reply
+        """
+        return ["AUTH PLAIN"] + (["STARTTLS"] if self.ssl_context is not None else [])
+    
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class AsyncSMTPServer(object):
+    """
+    asyncio counterpart of SMTPServer.
+    
+    @param port: the port to listen to. Default is any free port (see self.port once started)
+    @param keep: keep message data. If False, only its size is kept
+    @param close_after: close connection after this number of messages
+    @param delay: number of seconds to wait before accepting each message data
+    @param certfile: the certificate (and its key) of STARTTLS. Default is no STARTTLS
+    """
+    
+    def __init__(self, port=0, keep=True, close_after=None, delay=0, certfile=None):
+        self.port = port
+        self.keep = keep
+        self.close_after = close_after
+        self.delay = delay
+        self.messages = []
+        self.connections = 0
+        self.logins = []
+        self.server_names = []
+        self.ssl_context = server_context(self, certfile) if certfile else None
+        # current and maximum number of connections at once
+        self.sessions = 0
+        self.max_sessions = 0
+        self.server = None
+    
+    def extensions(self):
+        """
+        Return ESMTP extensions announced in EHLO reply
+        """
+        return ["AUTH PLAIN"] + (["STARTTLS"] if self.ssl_context is not None else [])
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, 'localhost', self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+    
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+    
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.sessions += 1
+        self.max_sessions = max(self.max_sessions, self.sessions)
+        try:
+            await self.session(reader, writer)
+        except (ConnectionError, asyncio.CancelledError):
+            # client gave up or server stopped
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+    
+    async def session(self, reader, writer):
+        def reply(code, text):
+            writer.write(("%d %s\r\n" % (code, text)).encode('ascii'))
+        reply(220, "localhost stand-in SMTP")
+        mail_from, rcpt_tos, sent = None, [], 0
+        while True:
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode('ascii', 'replace').strip()
+            verb, _, arg = command.partition(' ')
+            verb = verb.upper()
+            if verb == 'EHLO':
+                writer.write(b"250-localhost\r\n")
+                extensions = self.extensions()
+                for extension in extensions[:-1]:
+                    writer.write(("250-%s\r\n" % extension).encode('ascii'))
+                reply(250, extensions[-1])
+            elif verb == 'HELO':
+                reply(250, "localhost")
+            elif verb == 'MAIL':
+                mail_from, rcpt_tos = arg, []
+                reply(250, "OK")
+            elif verb == 'RCPT':
+                rcpt_tos.append(arg)
+                reply(250, "OK")
+            elif verb == 'DATA':
+                reply(354, "End data with <CR><LF>.<CR><LF>")
+                await writer.drain()
+                size, data = 0, []
+                while True:
+                    line = await reader.readline()
+                    if not line or line == b'.\r\n':
+                        break
+                    if line.startswith(b'.'):
+                        line = line[1:]
+                    size += len(line)
+                    if self.keep:
+                        data.append(line)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                self.messages.append((mail_from, rcpt_tos, b''.join(data) if self.keep else size))
+                reply(250, "OK")
+                sent += 1
+                if self.close_after and sent >= self.close_after:
+                    # simulate a server dropping the connection
+                    await writer.drain()
+                    break
+            elif verb == 'STARTTLS' and self.ssl_context is not None:
+                reply(220, "Ready to start TLS")
+                await writer.drain()
+                await writer.start_tls(self.ssl_context)
+            elif verb == 'AUTH':
+                self.logins.append(arg)
+                reply(235, "Authentication successful")
+            elif verb in ('RSET', 'NOOP'):
+                reply(250, "OK")
+            elif verb == 'QUIT':
+                reply(221, "Bye")
+                await writer.drain()
+                break
+            else:
+                reply(502, "Command not implemented")
@@ -0,0 +1,52 @@
+import unittest
+import os, sys, subprocess
+from os.path import dirname, abspath
+
+import myPyApps
+
+# myPyApps folder parent
+ROOT = dirname(dirname(abspath(myPyApps.__file__)))
+
+# cumulative import time budget in milliseconds (per module)
+BUDGET = float(os.getenv("MYPYAPPS_IMPORT_BUDGET", 150))
+
+# only imported on first use
+HEAVY_MODULES = ("argparse", "smtplib", "ssl", "mimetypes", "email.mime.base", "email.mime.multipart",
+                 "logging.config", "concurrent.futures", "hashlib", "glob", "uuid", "asyncio")
+
+
+def import_times(module):
+    """
+    Import module in a new interpreter with -X importtime and return {imported module: cumulative time in ms}
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                             env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1000.
+    return times
+
+
+class TestImports(unittest.TestCase):
+
+    def check_import(self, module):
+        times = import_times(module)
+        self.assertIn(module, times)
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, times, "%s imports %s" % (module, heavy))
+        self.assertLess(times[module], BUDGET, "%s import took %.1f ms" % (module, times[module]))
+
+    def test_myapp(self):
+        self.check_import("myPyApps.myapp")
+
+    def test_myemail(self):
+        self.check_import("myPyApps.helpers.myemail")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,14 @@
 import unittest
+import os, io, sys, time, shutil, tempfile, logging, contextlib
 
 import mypackage
 
-from myPyApps import myapp, mylogging
+from myPyApps import myapp, myconfig, mylogging, myargparse, myprofile
 import optparse
 
+# default logging configuration writes into the logs folder of the script (not versioned)
+os.makedirs(os.path.join(sys.path[0], 'logs'), exist_ok=True)
+
 class TestMyApp(unittest.TestCase):
 	
 	def setUp(self):
@@ -46,6 +50,112 @@ class TestMyApp(unittest.TestCase):
 		test = MyTest()
 		self.assertEqual(test.run("Hello world !"), "Hello world !")
 		
+	def test_no_warning(self):
+		# missing framework options are not worth a warning
+		with self.assertNoLogs('myPyApps', logging.WARNING):
+			self.test_class(config_default="myconfig", logging_email=False)
+		
+	def test_lazy_configs(self):
+		self.assertIn("myconfig", self.test_instance.CONFIGS)
+		self.assertFalse(self.test_instance.CONFIGS.is_loaded("myconfig"))
+		self.assertEqual(self.test_instance.CONFIGS["myconfig"].get("section1", "opt_11"), "val_11_user")
+		self.assertTrue(self.test_instance.CONFIGS.is_loaded("myconfig"))
+		self.assertEqual(len(self.test_instance.CONFIGS.load_all()), len(list(self.test_instance.CONFIGS.values())))
+		
+	def test_startup_profile(self):
+		names = [span['name'] for span in self.test_instance.profile.report()]
+		for name in ("find configuration files", "configure logging", "load config 'logging'", "create handler 'stdout'"):
+			self.assertIn(name, names)
+		self.assertTrue(all(span['duration'] is not None for span in self.test_instance.profile.report()))
+		
+	def test_profile_stopped(self):
+		class MyTest(myapp.MyApp):
+			def main(self):
+				self.CONFIGS["myconfig"]
+				return myprofile._active
+		test = MyTest(logging_email=False)
+		self.assertIsNone(myprofile._active)
+		# only startup is profiled
+		self.assertIsNone(test.run())
+		self.assertNotIn("load config 'myconfig'", [span['name'] for span in test.profile.report()])
+		self.assertIn("init", [span['name'] for span in test.profile.report()])
+		
+	def test_profile_startup_option(self):
+		class MyTest(myapp.MyApp):
+			def main(self):
+				raise AssertionError("main must not be called")
+		options = myargparse.MyArgumentParser().parse_args(["--profile-startup"])
+		test = MyTest(logging_email=False, options=options)
+		self.assertRaises(SystemExit, test.run)
+		self.assertIn("init", [span['name'] for span in test.profile.report()])
+		
+	def test_map(self):
+		class MyTest(myapp.MyApp):
+			def square(self, item):
+				return item * item + len(self.CONFIGS)
+			def main(self):
+				return self.map(self.square, range(20), workers=2), self.map(abs, [-1, -2, -3], workers=2, ordered=False)
+		test = MyTest(logging_email=False)
+		squares, absolutes = test.run()
+		self.assertEqual(squares, [i * i + len(test.CONFIGS) for i in range(20)])
+		self.assertEqual(sorted(absolutes), [1, 2, 3])
+		
+	def test_map_exception(self):
+		class MyTest(myapp.MyApp):
+			def fail(self, item):
+				raise ValueError("item %d" % item)
+			def main(self):
+				return self.map(self.fail, range(4), workers=2)
+		test = MyTest(logging_email=False)
+		self.assertRaises(ValueError, test.run)
+		
+	def test_map_exception_collector(self):
+		class MyTest(myapp.MyApp):
+			def fail(self, item):
+				if item == 0:
+					mylogging.getLogger("worker").info("item %d", item)
+					raise ValueError("item %d" % item)
+				time.sleep(0.05)
+			def main(self):
+				return self.map(self.fail, range(200), workers=2, chunksize=1)
+		test = MyTest(logging_email=False)
+		mylogging._start_collector()
+		try:
+			start = time.time()
+			self.assertRaises(ValueError, test.run)
+			# remaining items (5 seconds of work) are not handled
+			self.assertLess(time.time() - start, 2)
+		finally:
+			mylogging._stop_queue()
+		
+	def test_config_snapshot(self):
+		snapshot_dir = tempfile.mkdtemp()
+		try:
+			filename = os.path.join(snapshot_dir, 'configs.snapshot')
+			parent = self.test_class(logging_email=False, config_snapshot=filename)
+			self.assertIsNone(parent.snapshot)
+			self.assertEqual(myconfig.SharedSnapshot.read_generation(filename), 1)
+			worker = self.test_class(logging_email=False, config_snapshot=filename)
+			self.assertEqual(worker.CONFIGS["myconfig"].get("section1", "opt_11"), "val_11_user")
+			self.assertEqual(worker.snapshot.misses, 0)
+			self.assertFalse(worker.refresh_configs())
+			parent.CONFIGS["myconfig"].set("section1", "opt_11", "parent")
+			parent.write_config_snapshot()
+			self.assertTrue(worker.refresh_configs())
+			self.assertEqual(worker.CONFIGS["myconfig"].get("section1", "opt_11"), "parent")
+		finally:
+			shutil.rmtree(snapshot_dir)
+		
+	def test_check_config_option(self):
+		options = myargparse.MyArgumentParser().parse_args(["--check-config"])
+		stdout, stderr = io.StringIO(), io.StringIO()
+		with self.assertRaises(SystemExit) as context, contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+			self.test_class(logging_email=False, options=options)
+		# tests configuration has extra options and sections
+		self.assertEqual(context.exception.code, 1)
+		self.assertNotIn("configuration problem(s)", stdout.getvalue())
+		self.assertIn("configuration problem(s)", stderr.getvalue())
+		
 	def test_options_fail(self):
 		try:
 			self.assertRaises(Exception, self.test_class(options="won't work"))
@@ -1,4 +1,5 @@
 import unittest
+import os, sys, shutil, tempfile, threading, configparser
 
 from os.path import dirname, join
 from myPyApps import myconfig
@@ -43,6 +44,312 @@ opt_3 = val_3
         
         self.config.remove_option("section1", "opt_13")
         self.assertTrue(self.config.check_override_all())
+
+    def test_validate(self):
+        cfg_file = join(dirname(self.config.default_path), "myconfig.cfg")
+        self.assertEqual(self.config.validate(), [
+            myconfig.ConfigProblem("myconfig", cfg_file, "section1", "opt_13", "not in default"),
+            myconfig.ConfigProblem("myconfig", cfg_file, "section3_fail", None, "not in default")])
+        self.config.set("DEFAULT", "opt", "memory")
+        self.assertEqual(self.config.validate()[0], myconfig.ConfigProblem("myconfig", None, "DEFAULT", "opt", "not in default"))
+        self.assertEqual(str(self.config.validate()[1]), "[myconfig] %s: option 'opt_13' of section 'section1': not in default" % cfg_file)
+
+
+class TestConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.cache = myconfig.ConfigCache(join(self.config_dir, 'cache'))
+        with open(join(self.config_dir, 'cached.default'), 'w') as fp:
+            fp.write("[section]\nopt = default\nopt2 = %(opt)s_2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def test_cache(self):
+        config = myconfig.MyConfigParser("cached", self.config_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        config = myconfig.MyConfigParser("cached", self.config_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(config.get("section", "opt2"), "default_2")
+
+        # new user file invalidates cache
+        with open(join(self.config_dir, 'cached.cfg'), 'w') as fp:
+            fp.write("[section]\nopt = user\n")
+        config.reload()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        self.assertEqual(config.get("section", "opt2"), "user_2")
+        config.reload()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual(config.get("section", "opt2"), "user_2")
+
+
+class TestTypedValues(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        with open(join(self.config_dir, 'typed.default'), 'w') as fp:
+            fp.write("[DEFAULT]\nbase = 2\n[section]\nint = %(base)s0\nfloat = 1.5\nbool = yes\nopt-name = value\n")
+        self.config = myconfig.MyConfigParser("typed", self.config_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def test_cached_values(self):
+        self.assertEqual(self.config.getint("section", "int"), 20)
+        self.assertEqual(self.config.getint("section", "int"), 20)
+        self.assertEqual(self.config.getfloat("section", "float"), 1.5)
+        self.assertTrue(self.config.getboolean("section", "bool"))
+        self.assertEqual(self.config.get("section", "int", raw=True), "%(base)s0")
+        self.assertEqual(self.config.get("section", "missing", fallback="fallback"), "fallback")
+        self.assertEqual(self.config.getint("section", "missing", fallback=None), None)
+
+    def test_invalidation(self):
+        self.assertEqual(self.config.getint("section", "int"), 20)
+        self.config.set("DEFAULT", "base", "3")
+        self.assertEqual(self.config.getint("section", "int"), 30)
+        self.config.remove_option("section", "int")
+        self.assertRaises(myconfig.NoOptionError, self.config.getint, "section", "int")
+        self.config.reload()
+        self.assertEqual(self.config["section"]["int"], "20")
+        self.config.remove_section("section")
+        self.assertEqual(self.config.get("section", "int", fallback=None), None)
+
+    def test_snapshot(self):
+        snapshot = self.config.snapshot()
+        self.assertEqual(snapshot.section.int, "20")
+        self.assertEqual(snapshot.section.base, "2")
+        self.assertEqual(snapshot["section"]["opt-name"], "value")
+        self.assertEqual(snapshot.DEFAULT.base, "2")
+        self.assertRaises(AttributeError, setattr, snapshot.section, "int", "30")
+
+    def test_items(self):
+        self.config.set("section", "base", "2")
+        expected = [("int", "20"), ("float", "1.5"), ("bool", "yes"), ("opt-name", "value"), ("base", "2")]
+        self.assertEqual(self.config.items("section"), expected)
+        self.assertEqual(list(self.config.iter_items("section")), expected)
+        self.assertEqual(dict(self.config.items("section", with_default=True)), dict(expected))
+        self.assertEqual(self.config.items("DEFAULT"), [])
+        self.assertRaises(myconfig.NoSectionError, self.config.items, "missing")
+        self.assertEqual(self.config.inherited_options("section"), [])
+        self.config.remove_option("section", "base")
+        self.assertEqual(self.config.inherited_options("section"), ["base"])
+        self.assertEqual([option for option, _ in self.config.iter_items("section")], ["int", "float", "bool", "opt-name"])
+
+
+class TestConfigIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        for path, filenames in zip(self.paths, [['indexed.cfg'], ['indexed.default', 'indexed.cfg', 'other.default']]):
+            for filename in filenames:
+                with open(join(path, filename), 'w') as fp:
+                    fp.write("[section]\nopt = %s\n" % join(path, filename))
+        self.index = myconfig.ConfigIndex(self.paths + ['/missing/path'])
+
+    def tearDown(self):
+        for path in self.paths:
+            shutil.rmtree(path)
+
+    def test_index(self):
+        self.assertEqual(self.index.names(), ['indexed', 'other'])
+        self.assertEqual(self.index.default_file('indexed'), join(self.paths[1], 'indexed.default'))
+        self.assertEqual(self.index.cfg_files('indexed'), [join(self.paths[0], 'indexed.cfg'), join(self.paths[1], 'indexed.cfg')])
+        self.assertEqual(self.index.default_file('missing'), None)
+
+    def test_config(self):
+        config = myconfig.MyConfigParser('indexed', index=self.index)
+        # first path is the most important
+        self.assertEqual(config.get('section', 'opt'), join(self.paths[0], 'indexed.cfg'))
+        self.assertRaises(myconfig.MyConfigParserException, myconfig.MyConfigParser, 'missing', index=self.index)
+
+    def test_refresh(self):
+        with open(join(self.paths[0], 'new.default'), 'w') as fp:
+            fp.write("")
+        self.assertNotIn('new', self.index.names())
+        self.index.refresh()
+        self.assertIn('new', self.index.names())
+
+
+class TestMyConfigs(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        for i in range(10):
+            with open(join(self.config_dir, 'config%d.default' % i), 'w') as fp:
+                fp.write("[section]\nopt = %d\n" % i)
+        self.index = myconfig.ConfigIndex(self.config_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def configs(self):
+        configs = myconfig.MyConfigs(index=self.index)
+        for name in self.index.names():
+            configs.add(name)
+        return configs
+
+    def test_parallel_load(self):
+        serial = self.configs().load_all()
+        parallel = self.configs().load_all(workers=4)
+        self.assertEqual(list(serial), list(parallel))
+        self.assertEqual([str(config) for config in serial.values()], [str(config) for config in parallel.values()])
+
+    def test_parallel_errors(self):
+        for name in ('config3', 'config7'):
+            with open(join(self.config_dir, name + '.cfg'), 'w') as fp:
+                fp.write("no section header\n")
+        self.index.refresh()
+        configs = self.configs()
+        try:
+            configs.load_all(workers=4)
+        except configparser.MissingSectionHeaderError as e:
+            self.assertIn('config3.cfg', e.source)
+        else:
+            self.fail("Should raise MissingSectionHeaderError")
+        self.assertEqual([name for name in configs if configs.is_loaded(name)], ['config%d' % i for i in range(10) if i not in (3, 7)])
+
+
+class TestConfigValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.write('defaults', 'app.default', "[DEFAULT]\nroot = /\n[section]\nopt = default\n")
+        self.write('defaults', 'app.cfg', "[section]\nopt = user\nroot = /var\n")
+        self.write('host1', 'app.cfg', "[section]\nopt = host1\nextra = 1\n[extra]\nopt = 1\n")
+        self.write('host2', 'app.cfg', "[DEFAULT]\nextra = 1\n")
+        self.write('host2', 'other.cfg', "[section]\n")
+        self.write('host2', 'broken.cfg', "no section header\n")
+        self.validator = myconfig.ConfigValidator(join(self.config_dir, 'defaults'))
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def write(self, folder, filename, content):
+        os.makedirs(join(self.config_dir, folder), exist_ok=True)
+        with open(join(self.config_dir, folder, filename), 'w') as fp:
+            fp.write(content)
+
+    def test_validate_path(self):
+        self.assertEqual(self.validator.validate_path(), [])
+
+    def test_validate_folders(self):
+        host1 = join(self.config_dir, 'host1', 'app.cfg')
+        self.assertEqual(self.validator.validate_folder(join(self.config_dir, 'host1')), [
+            myconfig.ConfigProblem("app", host1, "section", "extra", "not in default"),
+            myconfig.ConfigProblem("app", host1, "extra", None, "not in default")])
+        problems = self.validator.validate_folder(join(self.config_dir, 'host2'))
+        self.assertEqual([(problem.name, problem.section, problem.option) for problem in problems],
+                         [("app", "DEFAULT", "extra"), ("broken", None, None), ("other", None, None)])
+        self.assertIn("no default configuration", problems[2].message)
+        # default files are parsed once
+        self.assertEqual(list(self.validator._defaults), ["app", "broken", "other"])
+
+    def test_command(self):
+        from myPyApps import __main__
+        args = ["check-config", "-c", join(self.config_dir, 'defaults')]
+        self.assertEqual(__main__.main(args + [join(self.config_dir, 'defaults')]), 0)
+        self.assertEqual(__main__.main(args + [join(self.config_dir, 'defaults'), join(self.config_dir, 'host1')]), 1)
+
+
+class CountingConfigParser(myconfig.MyConfigParser):
+    def _parse_file(self, full_path):
+        self.parsed.append(os.path.basename(full_path))
+        return myconfig.MyConfigParser._parse_file(self, full_path)
+
+
+class TestSharedSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.filename = join(self.config_dir, 'snapshot')
+        with open(join(self.config_dir, 'shared.default'), 'w') as fp:
+            fp.write("[section]\nopt = default\nopt2 = %(opt)s_2\n")
+        self.config = myconfig.MyConfigParser("shared", self.config_dir)
+        CountingConfigParser.parsed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.config_dir)
+
+    def test_snapshot(self):
+        self.assertEqual(myconfig.SharedSnapshot.write(self.filename, [self.config]), 1)
+        snapshot = myconfig.SharedSnapshot(self.filename)
+        config = CountingConfigParser("shared", self.config_dir, cache=snapshot)
+        self.assertEqual(config.parsed, [])
+        self.assertEqual((snapshot.hits, snapshot.misses), (1, 0))
+        self.assertEqual(config.get("section", "opt2"), "default_2")
+
+        # new generation is only used once refreshed
+        self.config.set("section", "opt", "parent")
+        self.assertFalse(snapshot.changed())
+        self.assertEqual(myconfig.SharedSnapshot.write(self.filename, [self.config]), 2)
+        self.assertTrue(snapshot.changed())
+        self.assertEqual(config.reload(), {})
+        self.assertTrue(snapshot.refresh())
+        self.assertFalse(snapshot.refresh())
+        self.assertEqual(config.reload(), {'section': {'opt'}})
+        self.assertEqual(config.get("section", "opt2"), "parent_2")
+
+        # changed files are parsed
+        with open(join(self.config_dir, 'shared.cfg'), 'w') as fp:
+            fp.write("[section]\nopt = user\n")
+        config.reload()
+        self.assertEqual(config.parsed, ['shared.default', 'shared.cfg'])
+        self.assertEqual(config.get("section", "opt2"), "user_2")
+
+    def test_invalid(self):
+        with open(self.filename, 'w') as fp:
+            fp.write("[section]\n")
+        self.assertRaises(myconfig.MyConfigParserException, myconfig.SharedSnapshot, self.filename)
+        self.assertRaises(myconfig.MyConfigParserException, myconfig.SharedSnapshot, join(self.config_dir, 'missing'))
+
+
+class TestReload(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        self.write('watched.default', "[section]\nopt = default\nopt2 = default\n")
+        CountingConfigParser.parsed = []
+        self.config = CountingConfigParser("watched", self.config_dir)
+
+    def tearDown(self):
+        self.config.stop_watching()
+        shutil.rmtree(self.config_dir)
+
+    def write(self, filename, content):
+        with open(join(self.config_dir, filename), 'w') as fp:
+            fp.write(content)
+
+    def test_incremental_reload(self):
+        self.assertEqual(self.config.reload(), {})
+        self.write('watched.cfg', "[section]\nopt = user\n[new]\nopt = new\n")
+        self.assertEqual(self.config.reload(), {'section': {'opt'}, 'new': {'opt'}})
+        # default file isn't parsed again
+        self.assertEqual(self.config.parsed, ['watched.default', 'watched.cfg'])
+        self.assertEqual(self.config.get("section", "opt"), "user")
+        os.remove(join(self.config_dir, 'watched.cfg'))
+        self.assertEqual(self.config.reload(), {'section': {'opt'}, 'new': {'opt'}})
+        self.assertFalse(self.config.has_section("new"))
+
+    def _test_watch(self, inotify):
+        changed = threading.Event()
+        changes = []
+        def callback(config, config_changes):
+            changes.append(config_changes)
+            changed.set()
+        self.config.watch(callback, interval=0.05, inotify=inotify)
+        self.write('watched.cfg', "[section]\nopt2 = user\n")
+        self.assertTrue(changed.wait(5))
+        self.assertEqual(changes, [{'section': {'opt2'}}])
+        self.assertEqual(self.config.get("section", "opt2"), "user")
+
+    def test_watch_polling(self):
+        self._test_watch(False)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "inotify is Linux only")
+    def test_watch_inotify(self):
+        self._test_watch(True)
+
     
 if __name__ == "__main__":
     unittest.main()    
\ No newline at end of file
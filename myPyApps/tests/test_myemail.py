@@ -0,0 +1,280 @@
+import unittest
+import os, sys, ssl, time, shutil, socket, logging, tempfile, email, asyncio
+
+import smtpserver
+
+from myPyApps import myconfig, mylogging
+from myPyApps.helpers import myemail
+
+
+class TestMyEmail(unittest.TestCase):
+
+    def setUp(self):
+        self.server = smtpserver.SMTPServer().start()
+        self.pool = myemail.SMTPPool()
+        config = myconfig.MyConfigParser('logging')
+        config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject')" % self.server.port)
+        self.default_config = getattr(mylogging.MyLogger, 'default_config', None)
+        mylogging.MyLogger.default_config = config
+
+    def tearDown(self):
+        mylogging.MyLogger.default_config = self.default_config
+        self.pool.close()
+        self.server.stop()
+
+    def test_smtp_config(self):
+        config = myemail.get_smtp_config()
+        self.assertEqual((config.host, config.port, config.from_addr), ('localhost', self.server.port, 'from@abc'))
+        self.assertEqual(config.username, None)
+
+    def test_send_email(self):
+        self.assertEqual(myemail.send_email("user1@abc, user2@abc", "subject", text_body="body", pool=self.pool), {})
+        mail_from, rcpt_tos, data = self.server.messages[0]
+        self.assertEqual(rcpt_tos, ['TO:<user1@abc>', 'TO:<user2@abc>'])
+        self.assertIn(b"Subject: subject", data)
+
+    def test_send_emails(self):
+        messages = [dict(to_addrs="user%d@abc" % i, subject="subject %d" % i, text_body="body") for i in range(10)]
+        messages.append(dict(to_addrs="user@abc", subject="missing attachment", attachements=["missing.txt"]))
+        results = myemail.send_emails(messages, pool=self.pool)
+        self.assertEqual(results[:10], [{}] * 10)
+        self.assertIsInstance(results[10], IOError)
+        self.assertEqual(len(self.server.messages), 10)
+        # all messages sent over a single connection
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect(self):
+        self.server.close_after = 1
+        results = myemail.send_emails([dict(to_addrs="user@abc", subject="subject")] * 3, pool=self.pool)
+        self.assertEqual(results, [{}] * 3)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_idle_timeout(self):
+        self.pool.idle_timeout = 0
+        myemail.send_emails([dict(to_addrs="user@abc", subject="subject")] * 2, pool=self.pool)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_send_email_stream(self):
+        content = os.urandom(200000)
+        with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as fp:
+            fp.write(content)
+        try:
+            myemail.send_email("user@abc", "subject", text_body=".line starting with a dot", attachements=[fp.name], 
+                               pool=self.pool, stream=True)
+        finally:
+            os.remove(fp.name)
+        message = email.message_from_bytes(self.server.messages[0][2])
+        body, attachement = message.get_payload()
+        self.assertEqual(body.get_payload(decode=True), b".line starting with a dot")
+        self.assertEqual(attachement.get_filename(), os.path.basename(fp.name))
+        self.assertEqual(attachement.get_payload(decode=True), content)
+
+
+class TestAsyncEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = await smtpserver.AsyncSMTPServer().start()
+        config = myconfig.MyConfigParser('logging')
+        config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject')" % self.server.port)
+        self.default_config = getattr(mylogging.MyLogger, 'default_config', None)
+        mylogging.MyLogger.default_config = config
+
+    async def asyncTearDown(self):
+        mylogging.MyLogger.default_config = self.default_config
+        await self.server.stop()
+
+    async def test_send_email(self):
+        self.assertEqual(await myemail.send_email_async("user1@abc, user2@abc", "subject", text_body=".body"), {})
+        mail_from, rcpt_tos, data = self.server.messages[0]
+        self.assertEqual(rcpt_tos, ['TO:<user1@abc>', 'TO:<user2@abc>'])
+        self.assertIn(b"Subject: subject", data)
+        self.assertEqual(email.message_from_bytes(data).get_payload()[0].get_payload(decode=True), b".body")
+
+    async def test_send_emails(self):
+        self.server.delay = 0.01
+        messages = [dict(to_addrs="user%d@abc" % i, subject="subject %d" % i, text_body="body") for i in range(20)]
+        messages.insert(5, dict(to_addrs="user@abc", subject="missing attachment", attachements=["missing.txt"]))
+        results = await myemail.send_emails_async(messages, concurrency=3)
+        self.assertEqual(results[:5] + results[6:], [{}] * 20)
+        self.assertIsInstance(results[5], IOError)
+        self.assertEqual(len(self.server.messages), 20)
+        # each sender reuses its connection
+        self.assertEqual((self.server.connections, self.server.max_sessions), (3, 3))
+
+    async def test_pool(self):
+        pool = myemail.AsyncSMTPPool(concurrency=2)
+        try:
+            results = await asyncio.gather(*[myemail.send_email_async("user@abc", "subject %d" % i, pool=pool) for i in range(6)])
+        finally:
+            await pool.close()
+        self.assertEqual(results, [{}] * 6)
+        self.assertLessEqual(self.server.max_sessions, 2)
+
+    async def test_timeout(self):
+        self.server.delay = 1
+        results = await myemail.send_emails_async([dict(to_addrs="user@abc", subject="subject")] * 2, timeout=0.1)
+        self.assertEqual([type(result) for result in results], [asyncio.TimeoutError] * 2)
+
+    async def test_reconnect(self):
+        self.server.close_after = 1
+        results = await myemail.send_emails_async([dict(to_addrs="user@abc", subject="subject")] * 3, concurrency=1)
+        self.assertEqual(results, [{}] * 3)
+        self.assertEqual(self.server.connections, 3)
+
+
+class TestSecureEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = smtpserver.SMTPServer(certfile=smtpserver.CERTFILE).start()
+        self.async_server = await smtpserver.AsyncSMTPServer(certfile=smtpserver.CERTFILE).start()
+        self.pool = myemail.SMTPPool()
+        self.default_config = getattr(mylogging.MyLogger, 'default_config', None)
+
+    async def asyncTearDown(self):
+        mylogging.MyLogger.default_config = self.default_config
+        self.pool.close()
+        self.server.stop()
+        await self.async_server.stop()
+
+    def use_server(self, server, secure, verify=False):
+        config = myconfig.MyConfigParser('logging')
+        config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject', ('user', 'password'), %r)" 
+                   % (server.port, secure))
+        config.set('handler_mail', 'kwargs', "{'verify': %r}" % verify)
+        mylogging.MyLogger.default_config = config
+
+    async def test_starttls(self):
+        # self-signed server certificate, without and with a client certificate: same result in both APIs
+        for secure in ((), (smtpserver.CERTFILE, smtpserver.CERTFILE)):
+            self.use_server(self.server, secure)
+            self.assertEqual(myemail.send_email("user@abc", "subject", pool=self.pool), {})
+            self.use_server(self.async_server, secure)
+            self.assertEqual(await myemail.send_email_async("user@abc", "subject"), {})
+        for server in (self.server, self.async_server):
+            self.assertEqual(len(server.messages), 2)
+            self.assertEqual(len(server.logins), 2)
+            self.assertEqual(server.server_names, ['localhost'] * 2)
+
+    async def test_verify(self):
+        # the self-signed server certificate isn't trusted
+        self.use_server(self.server, (), verify=True)
+        self.assertTrue(myemail.get_smtp_config().verify)
+        self.assertRaises(ssl.SSLCertVerificationError, myemail.send_email, "user@abc", "subject", pool=self.pool)
+        self.use_server(self.async_server, (), verify=True)
+        with self.assertRaises(ssl.SSLCertVerificationError):
+            await myemail.send_email_async("user@abc", "subject")
+        self.assertEqual(self.server.messages + self.async_server.messages, [])
+
+    async def test_handler_verify(self):
+        handler = mylogging.MySMTPHandler(('localhost', self.server.port), 'from@abc', ['to@abc'], 'subject', 
+                                          ('user', 'password'), (), verify=True)
+        errors = []
+        handler.handleError = lambda record: errors.append(sys.exc_info()[0])
+        handler.handle(logging.LogRecord("test", logging.ERROR, None, None, "alert", None, None))
+        self.assertEqual(errors, [ssl.SSLCertVerificationError])
+        self.assertEqual(self.server.messages, [])
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.server = smtpserver.SMTPServer().start()
+        self.folder = tempfile.mkdtemp()
+        self.pool = myemail.SMTPPool()
+        self.config = myemail.SMTPConfig('localhost', self.server.port, 'from@abc', None, None, None, 5.0)
+        self.outbox = myemail.Outbox(os.path.join(self.folder, 'outbox'), self.config, self.pool, max_attempts=2, backoff=0)
+        logging_config = myconfig.MyConfigParser('logging')
+        logging_config.set('handler_mail', 'args', "(('localhost', %d), 'from@abc', ['to@abc'], 'subject')" % self.server.port)
+        self.default_config = getattr(mylogging.MyLogger, 'default_config', None)
+        mylogging.MyLogger.default_config = logging_config
+
+    def tearDown(self):
+        mylogging.MyLogger.default_config = self.default_config
+        self.outbox.stop()
+        self.pool.close()
+        self.server.stop()
+        shutil.rmtree(self.folder)
+
+    def wait_messages(self, count, timeout=5):
+        limit = time.time() + timeout
+        while len(self.server.messages) < count and time.time() < limit:
+            time.sleep(0.01)
+        return len(self.server.messages)
+
+    def test_deliver(self):
+        name = myemail.send_email("user@abc", "subject", text_body=".body", outbox=self.outbox)
+        self.assertEqual(self.outbox.pending(), [name])
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(self.outbox.deliver(), 1)
+        mail_from, rcpt_tos, data = self.server.messages[0]
+        self.assertEqual(rcpt_tos, ['TO:<user@abc>'])
+        self.assertEqual(email.message_from_bytes(data).get_payload()[0].get_payload(decode=True), b".body")
+        metrics = self.outbox.metrics()
+        self.assertEqual((metrics['pending'], metrics['sent'], metrics['dead']), (0, 1, 0))
+        self.assertGreater(metrics['latency_max'], 0)
+
+    def test_deliver_stream(self):
+        content = os.urandom(100000)
+        filename = os.path.join(self.folder, 'attachment.bin')
+        with open(filename, 'wb') as fp:
+            fp.write(content)
+        myemail.send_email("user@abc", "subject", text_body="body", attachements=[filename], stream=True, outbox=self.outbox)
+        self.assertEqual(self.outbox.deliver(), 1)
+        attachement = email.message_from_bytes(self.server.messages[0][2]).get_payload()[1]
+        self.assertEqual(attachement.get_payload(decode=True), content)
+
+    def test_retry(self):
+        # nothing listens to this port
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            port = sock.getsockname()[1]
+        self.outbox.config = self.config._replace(port=port)
+        self.outbox.backoff = 60
+        myemail.send_email("user@abc", "subject", text_body="body", outbox=self.outbox)
+        self.assertEqual(self.outbox.deliver(), 0)
+        queued, attempts, next_attempt = myemail.Outbox.parse_name(self.outbox.pending()[0])
+        self.assertEqual(attempts, 1)
+        self.assertAlmostEqual(next_attempt, time.time() + 60, delta=5)
+        # not due yet
+        self.assertEqual(self.outbox.deliver(), 0)
+        self.assertEqual(self.outbox.metrics()['retried'], 1)
+        # last attempt moves it to dead letters
+        name = self.outbox.pending()[0]
+        os.rename(os.path.join(self.outbox.directory, 'new', name), os.path.join(self.outbox.directory, 'new', name.rsplit('#', 1)[0] + '#0'))
+        self.assertEqual(self.outbox.deliver(), 0)
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(len(self.outbox.dead_letters()), 1)
+        self.assertEqual(self.outbox.metrics()['dead'], 1)
+
+    def test_sender_thread(self):
+        self.outbox.start(interval=10)
+        for i in range(3):
+            myemail.send_email("user@abc", "subject %d" % i, text_body="body", outbox=self.outbox)
+        self.assertEqual(self.wait_messages(3), 3)
+
+    def test_handler(self):
+        handler = mylogging.MySMTPHandler(('localhost', self.server.port), 'from@abc', ['to@abc'], 'subject',
+                                          outbox=os.path.join(self.folder, 'handler'))
+        try:
+            # no sender thread until the first email
+            self.assertIsNone(handler.outbox._thread)
+            handler.handle(logging.LogRecord("test", logging.ERROR, None, None, "alert é\n.dot", None, None))
+            self.assertEqual(self.wait_messages(1), 1)
+        finally:
+            handler.close()
+        data = self.server.messages[0][2]
+        # 7bit clean, whatever the server supports
+        self.assertTrue(data.isascii())
+        self.assertEqual(email.message_from_bytes(data).get_payload(decode=True), "alert é\r\n.dot\r\n".encode('utf_8'))
+
+    def test_drain_command(self):
+        from myPyApps import __main__
+        with open(os.path.join(self.folder, 'logging.cfg'), 'w') as fp:
+            fp.write("[handler_mail]\nargs=(('localhost', %d), 'from@abc', ['to@abc'], 'subject')\n" % self.server.port)
+        myemail.send_email("user@abc", "subject", text_body="body", outbox=self.outbox)
+        self.assertEqual(__main__.main(["drain-outbox", "-c", self.folder, self.outbox.directory]), 0)
+        self.assertEqual(len(self.server.messages), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,423 @@
+import unittest
+import logging, logging.config, io, os, sys, gc, time, json, gzip, shutil, tempfile, weakref, multiprocessing
+from os.path import join
+
+from myPyApps import mylogging, myconfig
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_record(level, msg):
+    return logging.LogRecord("test", level, None, None, msg, None, None)
+
+
+class TestOverflowQueue(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        q = mylogging.OverflowQueue(2, mylogging.DROP_OLDEST)
+        for msg in ("a", "b", "c"):
+            q.put(make_record(logging.INFO, msg))
+        self.assertEqual([r.msg for r in q.queue], ["b", "c"])
+        self.assertEqual(q.dropped, 1)
+        self.assertEqual(q.unfinished_tasks, 2)
+
+    def test_drop_debug_first(self):
+        q = mylogging.OverflowQueue(2, mylogging.DROP_DEBUG_FIRST)
+        q.put(make_record(logging.INFO, "info"))
+        q.put(make_record(logging.DEBUG, "debug"))
+        q.put(make_record(logging.ERROR, "error"))
+        self.assertEqual([r.msg for r in q.queue], ["info", "error"])
+        # new record has the lowest level: it is the one dropped
+        q.put(make_record(logging.DEBUG, "debug"))
+        self.assertEqual([r.msg for r in q.queue], ["info", "error"])
+        self.assertEqual(q.dropped, 2)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, mylogging.OverflowQueue, 1, "unknown")
+
+
+class TestQueueListener(unittest.TestCase):
+
+    def test_stop_handles_all_records(self):
+        handler = ListHandler()
+        q = mylogging.OverflowQueue(10, mylogging.BLOCK)
+        listener = mylogging.MyQueueListener(q, handler, respect_handler_level=True)
+        queue_handler = mylogging.MyQueueHandler(q)
+        listener.start()
+        for i in range(100):
+            queue_handler.handle(make_record(logging.INFO, "msg %d" % i))
+        listener.stop()
+        self.assertEqual(len(handler.records), 100)
+
+    def test_flush(self):
+        handler = ListHandler()
+        q = mylogging.OverflowQueue(10, mylogging.BLOCK)
+        listener = mylogging.MyQueueListener(q, handler, respect_handler_level=True)
+        queue_handler = mylogging.MyQueueHandler(q)
+        # not started: the timeout expires
+        queue_handler.handle(make_record(logging.INFO, "msg"))
+        self.assertFalse(listener.flush(0.1))
+        listener.start()
+        for i in range(100):
+            queue_handler.handle(make_record(logging.INFO, "msg %d" % i))
+        self.assertTrue(listener.flush())
+        self.assertEqual(handler.records[-1].getMessage(), "msg 99")
+        self.assertEqual(listener.flushes, {})
+        listener.stop()
+
+
+class TestBufferedStreamHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = mylogging.BufferedStreamHandler(self.stream, logging.INFO, buffer_size=30, flush_interval=0)
+
+    def test_buffer_size(self):
+        self.handler.handle(make_record(logging.INFO, "0123456789"))
+        self.handler.handle(make_record(logging.INFO, "0123456789"))
+        self.assertEqual(self.stream.getvalue(), "")
+        self.handler.handle(make_record(logging.INFO, "0123456789"))
+        self.assertEqual(self.stream.getvalue(), "0123456789\n" * 3)
+
+    def test_flush_level(self):
+        self.handler.flush_level = logging.INFO
+        self.handler.handle(make_record(logging.INFO, "info"))
+        self.assertEqual(self.stream.getvalue(), "info\n")
+
+    def test_max_level(self):
+        self.handler.handle(make_record(logging.ERROR, "error"))
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), "")
+
+    def test_flush_interval(self):
+        self.handler.flush_interval = 0.01
+        self.handler.handle(make_record(logging.INFO, "info"))
+        for _ in range(100):
+            if self.stream.getvalue():
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.stream.getvalue(), "info\n")
+        self.handler.close()
+        self.handler.flush_thread.join(1)
+        self.assertFalse(self.handler.flush_thread.is_alive())
+
+    def test_close(self):
+        self.handler.handle(make_record(logging.INFO, "info"))
+        self.handler.close()
+        self.assertEqual(self.stream.getvalue(), "info\n")
+
+
+class TestBufferedRotatingFileHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.filename = join(self.log_dir, 'test.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def test_rotation(self):
+        handler = mylogging.BufferedRotatingFileHandler(self.filename, maxBytes=100, backupCount=2, flush_interval=0)
+        for i in range(20):
+            handler.handle(make_record(logging.INFO, "record %02d" % i + "." * 40))
+        handler.close()
+        rotated = handler.get_rotated_files()
+        self.assertEqual(len(rotated), 2)
+        self.assertTrue(all(f.endswith(".gz") for f in rotated))
+        with gzip.open(rotated[-1], 'rt') as fp:
+            self.assertTrue(fp.read().startswith("record 16"))
+        with open(self.filename) as fp:
+            self.assertTrue(fp.read().startswith("record 18"))
+
+    def test_rollover_empty_file(self):
+        handler = mylogging.BufferedRotatingFileHandler(self.filename, backupCount=2)
+        handler.doRollover()
+        handler.close()
+        self.assertEqual(os.listdir(self.log_dir), ['test.log'])
+
+    def test_interval(self):
+        handler = mylogging.BufferedRotatingFileHandler(self.filename, interval=3600, compress=False)
+        handler.handle(make_record(logging.INFO, "first"))
+        self.assertFalse(handler.shouldRollover())
+        handler.rollover_at = time.time()
+        handler.handle(make_record(logging.INFO, "second"))
+        handler.close()
+        rotated = handler.get_rotated_files()
+        self.assertEqual(len(rotated), 1)
+        with open(rotated[0]) as fp:
+            self.assertEqual(fp.read(), "first\n")
+
+
+def log_records(count):
+    logger = mylogging.getLogger("worker")
+    for i in range(count):
+        logger.info("record %d", i)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+class TestCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.handlers = logging.root.handlers
+        self.level = logging.root.level
+        self.handler = ListHandler()
+        # only gets emails
+        self.mail_handler = DigestSMTPHandler()
+        self.mail_handler.setLevel(logging.CRITICAL + 1)
+        logging.root.handlers = [self.handler, self.mail_handler]
+        logging.root.setLevel(logging.INFO)
+        mylogging._start_collector()
+
+    def tearDown(self):
+        mylogging._stop_queue()
+        logging.root.handlers = self.handlers
+        logging.root.setLevel(self.level)
+
+    def records(self, name):
+        return [r for r in self.handler.records if r.name == name]
+
+    def test_forked_workers(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=log_records, args=(10,)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        mylogging.flush_logging()
+        records = self.records("worker")
+        self.assertEqual(len(records), 30)
+        self.assertEqual(set(r.process for r in records), set(w.pid for w in workers))
+        self.assertEqual(records[0].getMessage(), "record 0")
+
+    def test_send_email(self):
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=mylogging.getLogger("worker").send_email, args=("worker message", "worker subject"))
+        worker.start()
+        worker.join()
+        mylogging.getLogger("parent").send_email("parent message", "parent subject")
+        mylogging.flush_logging()
+        self.assertEqual(sorted(self.mail_handler.emails), [("parent subject", "parent message"), ("worker subject", "worker message")])
+        self.assertEqual(self.records("worker"), [])
+
+    def test_dead_worker(self):
+        context = multiprocessing.get_context('fork')
+        # dies right after queuing records, before they are all sent
+        worker = context.Process(target=lambda: (log_records(1000), os._exit(1)))
+        worker.start()
+        worker.join()
+        start = time.time()
+        mylogging.flush_logging(1)
+        mylogging._stop_queue(1)
+        self.assertLess(time.time() - start, 5)
+
+    def test_stop(self):
+        mylogging.getLogger("parent").info("parent record")
+        mylogging._stop_queue()
+        self.assertEqual(logging.root.handlers, [self.handler, self.mail_handler])
+        self.assertEqual(len(self.records("parent")), 1)
+        self.assertIsNone(mylogging.get_collector_queue())
+
+
+class DigestSMTPHandler(mylogging.MySMTPHandler):
+    """
+    Record emails instead of sending them
+    """
+    def __init__(self, *args, **kwargs):
+        mylogging.MySMTPHandler.__init__(self, 'localhost', 'from@abc', ['to@abc'], 'subject', *args, **kwargs)
+        self.emails = []
+    def emit_email(self, record, subject=None):
+        self.emails.append((subject, record.getMessage()))
+
+
+class TestSMTPDigest(unittest.TestCase):
+
+    def test_digest_size(self):
+        handler = DigestSMTPHandler(digest_size=3)
+        handler.handle(make_record(logging.ERROR, "error 1"))
+        handler.handle(make_record(logging.ERROR, "error 1"))
+        self.assertEqual(handler.emails, [])
+        handler.handle(make_record(logging.ERROR, "error 2"))
+        self.assertEqual(len(handler.emails), 1)
+        subject, body = handler.emails[0]
+        self.assertEqual(subject, "subject (digest of 3 records)")
+        self.assertTrue(body.startswith("2 occurrence(s) from "))
+        self.assertIn("1 occurrence(s) from ", body)
+
+    def test_digest_flush(self):
+        handler = DigestSMTPHandler(digest_interval=3600)
+        handler.handle(make_record(logging.ERROR, "error"))
+        self.assertIsNotNone(handler.digest_timer)
+        handler.flush()
+        self.assertEqual(len(handler.emails), 1)
+        self.assertIsNone(handler.digest_timer)
+        # nothing pending
+        handler.flush()
+        self.assertEqual(len(handler.emails), 1)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        self.filter = mylogging.RateLimitFilter(rate=0, burst=3, max_keys=2, summary_interval=0)
+        self.filter.attach(self.handler)
+
+    def test_rate_limit(self):
+        for i in range(10):
+            self.handler.handle(make_record(logging.ERROR, "error"))
+        self.handler.handle(make_record(logging.ERROR, "other error"))
+        self.assertEqual([r.getMessage() for r in self.handler.records], ["error"] * 3 + ["other error"])
+        self.filter.flush()
+        self.assertEqual(self.handler.records[-1].getMessage(), "Suppressed 7 similar messages: error")
+        self.assertEqual(self.handler.records[-1].levelno, logging.ERROR)
+        # nothing else suppressed
+        self.filter.flush()
+        self.assertEqual(len(self.handler.records), 5)
+
+    def test_refill(self):
+        self.filter.rate = 1000
+        for i in range(10):
+            self.handler.handle(make_record(logging.ERROR, "error"))
+            time.sleep(0.002)
+        self.assertEqual(len(self.handler.records), 10)
+
+    def test_max_keys(self):
+        for msg in ("a", "a", "a", "a", "b", "c"):
+            self.handler.handle(make_record(logging.INFO, msg))
+        self.assertEqual(len(self.filter.buckets), 2)
+        # without summary interval, forgotten keys are reported at once
+        self.assertEqual([r.getMessage() for r in self.handler.records][3:], ["b", "Suppressed 1 similar messages: a", "c"])
+        self.assertEqual(self.filter.forgotten, [])
+        self.filter.summary_interval = 3600
+        for msg in ("d", "d", "d", "d", "e", "f"):
+            self.handler.handle(make_record(logging.INFO, msg))
+        self.assertEqual(len(self.filter.forgotten), 1)
+        self.filter.flush()
+        self.assertEqual(self.handler.records[-1].getMessage(), "Suppressed 1 similar messages: d")
+
+    def test_release(self):
+        rate_filter = mylogging.RateLimitFilter(rate=0, burst=1)
+        rate_filter.attach(ListHandler())
+        for i in range(2):
+            rate_filter.handlers[0].handle(make_record(logging.ERROR, "error"))
+        self.assertTrue(rate_filter.summary_thread.is_alive())
+        self.assertIn(rate_filter, mylogging._rate_limit_filters)
+        # neither the summary thread nor exit flush keep the filter alive
+        ref = weakref.ref(rate_filter)
+        del rate_filter
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_queue_mode(self):
+        queue_handler = mylogging.MyQueueHandler(None)
+        for i in range(10):
+            record = logging.LogRecord("test", logging.ERROR, None, None, "error %d", (i,), None)
+            self.handler.handle(queue_handler.prepare(record))
+        self.assertEqual([r.getMessage() for r in self.handler.records], ["error 0", "error 1", "error 2"])
+        self.filter.flush()
+        self.assertEqual(self.handler.records[-1].getMessage(), "Suppressed 7 similar messages: error %d")
+
+
+class TestFormatters(unittest.TestCase):
+
+    FORMATS = ["%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s",
+               "%(levelname)-8s %(process)5d %(relativeCreated).1f 100%% %(message)r",
+               "%(message)s"]
+
+    def setUp(self):
+        self.record = logging.LogRecord("test.formatters", logging.INFO, "test.py", 12, "record %d of %s", (1, "test"), None)
+
+    def test_same_output(self):
+        for fmt in self.FORMATS:
+            for datefmt in (None, "%H:%M:%S"):
+                self.assertEqual(mylogging.FastFormatter(fmt, datefmt).format(self.record),
+                                 logging.Formatter(fmt, datefmt).format(self.record))
+
+    def test_exception(self):
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            record = logging.LogRecord("test", logging.ERROR, "test.py", 1, "boom", None, sys.exc_info())
+        self.assertEqual(mylogging.FastFormatter(self.FORMATS[0]).format(record),
+                         logging.Formatter(self.FORMATS[0]).format(logging.makeLogRecord(dict(record.__dict__, exc_text=None))))
+
+    def test_missing_field(self):
+        self.assertRaises(ValueError, mylogging.FastFormatter("%(missing)s").format, self.record)
+
+    def test_other_style(self):
+        self.assertEqual(mylogging.FastFormatter("{levelname}:{message}", style='{').format(self.record), "INFO:record 1 of test")
+
+    def test_json(self):
+        formatter = mylogging.JsonFormatter("%(asctime)s %(levelname)s %(lineno)d %(message)s %(missing)s")
+        data = json.loads(formatter.format(self.record))
+        self.assertEqual(list(data), ['asctime', 'levelname', 'lineno', 'message', 'missing'])
+        self.assertEqual(data['asctime'], logging.Formatter().formatTime(self.record))
+        self.assertEqual((data['levelname'], data['lineno'], data['message'], data['missing']), ("INFO", 12, "record 1 of test", None))
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            record = logging.LogRecord("test", logging.ERROR, "test.py", 1, "boom\nline", None, sys.exc_info())
+        line = formatter.format(record)
+        self.assertNotIn("\n", line)
+        self.assertIn("ZeroDivisionError", json.loads(line)['exc_info'])
+
+    def test_config(self):
+        config = myconfig.MyConfigParser('logging')
+        config.set('formatter_myformatter', 'class', 'myPyApps.mylogging.JsonFormatter')
+        formatter = logging.config.DictConfigurator({}).configure_formatter(
+            mylogging.config_to_dict(config)['formatters']['myformatter'])
+        self.assertIsInstance(formatter, mylogging.JsonFormatter)
+        self.assertEqual(formatter.fields, ['asctime', 'levelname', 'name', 'lineno', 'message'])
+
+
+class TestDictConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.config = myconfig.MyConfigParser('logging')
+
+    def test_config_to_dict(self):
+        result = mylogging.config_to_dict(self.config)
+        self.assertEqual(result['root'], {'level': 'NOTSET', 'handlers': ['stdout', 'stderr', 'file', 'mail']})
+        self.assertEqual(result['formatters']['myformatter']['format'], 
+                         "%(asctime)s:%(levelname)s:%(name)s:%(lineno)d:%(message)s")
+        stdout = result['handlers']['stdout']
+        self.assertEqual(stdout['klass'], 'myPyApps.mylogging.StreamMaxLevelHandler')
+        self.assertEqual((stdout['level'], stdout['formatter']), ('INFO', 'myformatter'))
+        handler = stdout['()'](stdout['klass'], stdout['args'], stdout['kwargs'])
+        self.assertIsInstance(handler, mylogging.StreamMaxLevelHandler)
+
+    def test_target_not_supported(self):
+        self.config.set('handler_stdout', 'target', 'stderr')
+        self.assertRaises(ValueError, mylogging.config_to_dict, self.config)
+
+    def test_filters(self):
+        self.config.add_section('filters')
+        self.config.set('filters', 'keys', 'ratelimit')
+        self.config.add_section('filter_ratelimit')
+        self.config.set('filter_ratelimit', 'class', 'myPyApps.mylogging.RateLimitFilter')
+        self.config.set('filter_ratelimit', 'kwargs', "{'burst': 5}")
+        self.config.set('handler_mail', 'filters', 'ratelimit')
+        result = mylogging.config_to_dict(self.config)
+        self.assertEqual(result['handlers']['mail']['filters'], ['ratelimit'])
+        self.assertNotIn('filters', result['handlers']['stdout'])
+        factory = result['filters']['ratelimit']
+        rate_limit = factory['()'](factory['klass'], factory['args'], factory['kwargs'])
+        self.assertEqual(rate_limit.burst, 5)
+
+    def test_get_dict_config(self):
+        first = mylogging.get_dict_config(self.config)
+        # dictConfig modifies it, the cached translation must not be
+        first['handlers'].clear()
+        self.assertEqual(len(mylogging.get_dict_config(self.config)['handlers']), 4)
+        self.config.set('handler_stdout', 'level', 'DEBUG')
+        self.assertEqual(mylogging.get_dict_config(self.config)['handlers']['stdout']['level'], 'DEBUG')
+
+
+if __name__ == "__main__":
+    unittest.main()